@@ -0,0 +1,237 @@
+import os
+import re
+import sys
+import json
+import time
+import random
+import logging
+import argparse
+import platform
+import tracemalloc
+
+import numpy as np
+from bs4 import BeautifulSoup
+
+from listing_parser import (
+    lxml,
+    to_snake_case,
+    extract_estate_info,
+    transactions_data,
+    extract_property_data_bs4,
+    extract_property_data_lxml,
+    parse_property_page,
+)
+from geolocation import find_geolocation
+
+# Saved property pages the benchmark runs over, and the results it is compared with
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BENCH_PAGES_DIR = os.path.join(BENCH_DIR, "bench_pages")
+BENCH_BASELINE_PATH = os.path.join(BENCH_DIR, "bench_baseline.json")
+
+# Slowdown (or memory growth) over the baseline above which a benchmark fails
+REGRESSION_TOLERANCE = float(os.environ.get("CRAWLER_BENCH_TOLERANCE", 0.3))
+
+_DIGIT_RE = re.compile(rb"\d")
+
+def load_pages(directory=BENCH_PAGES_DIR):
+    """
+    Reads the saved property pages of a directory.
+
+    Parameters:
+        directory (str): Directory of <property_id>.html files.
+
+    Returns:
+        list: (property_id, content) pairs, sorted by file name.
+    """
+    pages = []
+    for filename in sorted(os.listdir(directory)):
+        if filename.endswith(".html"):
+            with open(os.path.join(directory, filename), 'rb') as f:
+                pages.append((filename[:-len(".html")], f.read()))
+    return pages
+
+def scale_pages(pages, size, seed=0):
+    """
+    Builds a larger corpus from saved pages by cycling through them with every digit
+    replaced, so rents, areas, dates and coordinates differ while the markup does not.
+
+    Parameters:
+        pages (list): (property_id, content) pairs.
+        size (int): Number of pages wanted.
+        seed (int): Seed of the digit replacement, for repeatable corpora.
+
+    Returns:
+        list: size (property_id, content) pairs.
+    """
+    rng = random.Random(seed)
+    scaled = []
+    for i in range(size):
+        property_id, content = pages[i % len(pages)]
+        if i >= len(pages):
+            property_id = str(int(property_id) + i)
+            content = _DIGIT_RE.sub(lambda m: str(rng.randrange(10)).encode(), content)
+        scaled.append((property_id, content))
+    return scaled
+
+def workloads(pages):
+    """
+    Prepares the extraction functions benchmarked over a corpus.
+
+    Soups, labels and scripts are built up front so that only the function itself
+    is timed.
+
+    Parameters:
+        pages (list): (property_id, content) pairs.
+
+    Returns:
+        dict: (function, items) by name; the function is called with each item unpacked.
+    """
+    soups = [BeautifulSoup(content, 'html.parser') for _, content in pages]
+    labels = [label.get_text(strip=True) for soup in soups for label in soup.find_all(class_="table_left")]
+    scripts = [[script.string for script in soup.find_all('script')] for soup in soups]
+    selected = {
+        "parse_property_page": (parse_property_page, pages),
+        "extract_property_data_bs4": (extract_property_data_bs4, [(content,) for _, content in pages]),
+        "transactions_data": (transactions_data, [(soup,) for soup in soups]),
+        "extract_estate_info": (extract_estate_info, [(soup,) for soup in soups]),
+        "to_snake_case": (to_snake_case, [(label,) for label in labels]),
+        "find_geolocation": (find_geolocation, [(page_scripts,) for page_scripts in scripts]),
+    }
+    if lxml is not None:
+        selected["extract_property_data_lxml"] = (extract_property_data_lxml, [(content,) for _, content in pages])
+    return selected
+
+def run_benchmark(function, items, repeat):
+    """
+    Times a function over every item after a warm-up pass, then measures its peak
+    memory in a separate pass.
+
+    Parameters:
+        function (callable): The function, called as function(*item).
+        items (list): Argument tuples.
+        repeat (int): Number of timed passes over the items.
+
+    Returns:
+        dict: items, per-item latency percentiles (p50_us, p90_us, p99_us),
+        records_per_sec and peak_kib, the most memory allocated at once while
+        going over the items.
+    """
+    # One untimed pass, so lazily compiled patterns and caches are not counted
+    for item in items:
+        function(*item)
+
+    timings = np.empty(len(items) * repeat)
+    n = 0
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for item in items:
+            t0 = time.perf_counter_ns()
+            function(*item)
+            timings[n] = time.perf_counter_ns() - t0
+            n += 1
+    elapsed = time.perf_counter() - started
+
+    # tracemalloc slows every allocation down, so memory is measured on its own pass
+    tracemalloc.start()
+    for item in items:
+        function(*item)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    p50, p90, p99 = np.percentile(timings, [50, 90, 99]) / 1e3
+    return {
+        "items": len(items),
+        "p50_us": round(float(p50), 2),
+        "p90_us": round(float(p90), 2),
+        "p99_us": round(float(p99), 2),
+        "records_per_sec": round(len(items) * repeat / elapsed, 1),
+        "peak_kib": round(peak / 1024, 1),
+    }
+
+def compare(results, baseline, tolerance=REGRESSION_TOLERANCE):
+    """
+    Compares results with a baseline taken on the same machine.
+
+    Parameters:
+        results (dict): Results of main, with "benchmarks".
+        baseline (dict): The same, as stored by --save-baseline.
+        tolerance (float): Allowed relative slowdown or memory growth.
+
+    Returns:
+        list: A message for every regression; empty if there is none.
+    """
+    regressions = []
+    for name, expected in baseline["benchmarks"].items():
+        actual = results["benchmarks"].get(name)
+        if actual is None:
+            continue
+        # The median is the least noisy of the percentiles
+        for metric in ("p50_us", "peak_kib"):
+            limit = expected[metric] * (1 + tolerance)
+            if actual[metric] > limit:
+                regressions.append(f"{name}: {metric} {actual[metric]} > {limit:.2f} (baseline {expected[metric]})")
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the extraction path over saved property pages.")
+    parser.add_argument("--pages", default=BENCH_PAGES_DIR, help="directory of saved <property_id>.html pages")
+    parser.add_argument("--scale", type=int, default=0, help="build a synthetic corpus of this many pages from the saved ones")
+    parser.add_argument("--repeat", type=int, default=20, help="timed passes over the corpus")
+    parser.add_argument("--only", default="", help="comma-separated benchmarks to run")
+    parser.add_argument("--baseline", default=BENCH_BASELINE_PATH, help="stored results to compare with")
+    parser.add_argument("--save-baseline", action="store_true", help="store the results as the new baseline")
+    args = parser.parse_args(argv)
+
+    # Pages without a position or listing log a warning on every pass
+    logging.disable(logging.WARNING)
+
+    pages = load_pages(args.pages)
+    if args.scale:
+        pages = scale_pages(pages, args.scale)
+    selected = workloads(pages)
+    if args.only:
+        selected = {name: selected[name] for name in args.only.split(",")}
+
+    results = {
+        "pages": len(pages),
+        "repeat": args.repeat,
+        "python": platform.python_version(),
+        "machine": platform.node(),
+        "benchmarks": {},
+    }
+    print(f"{len(pages)} pages, {args.repeat} passes")
+    print(f"{'benchmark':28} {'items':>6} {'p50 us':>10} {'p90 us':>10} {'p99 us':>10} {'records/s':>11} {'peak KiB':>9}")
+    for name, (function, items) in selected.items():
+        stats = run_benchmark(function, items, args.repeat)
+        results["benchmarks"][name] = stats
+        print(f"{name:28} {stats['items']:>6} {stats['p50_us']:>10} {stats['p90_us']:>10} {stats['p99_us']:>10} {stats['records_per_sec']:>11} {stats['peak_kib']:>9}")
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(results, f, indent=4)
+        print(f"Baseline saved to {args.baseline}.")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print("No baseline to compare with; run with --save-baseline to store one.")
+        return 0
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    if (baseline["pages"], baseline["repeat"]) != (results["pages"], results["repeat"]):
+        print(f"Baseline was run over {baseline['pages']} pages x {baseline['repeat']} passes; not comparing.")
+        return 0
+    if baseline.get("machine") != results["machine"]:
+        # Timings only compare on the same hardware; store a baseline per machine with --baseline
+        print(f"Baseline was taken on {baseline.get('machine')}, not {results['machine']}; timings may not compare.")
+    regressions = compare(results, baseline)
+    for message in regressions:
+        print(f"REGRESSION {message}")
+    print(f"{len(regressions)} regression(s) against {args.baseline}.")
+    return 1 if regressions else 0
+
+if __name__ == '__main__':
+    # Offline benchmark of the extraction path, failing on regressions:
+    #   python benchmark.py                  # the saved pages in bench_pages/
+    #   python benchmark.py --scale 2000     # a synthetic corpus built from them
+    #   python benchmark.py --save-baseline  # after an intended change
+    sys.exit(main())
@@ -0,0 +1,154 @@
+import sys
+import json
+import time
+import struct
+import logging
+import argparse
+import datetime
+
+import numpy as np
+
+from snapshot_sink import SnapshotSink, infer_schema, read_snapshot
+from storage import open_storage
+
+# Name of the compiled snapshot file in the folder of a snapshot
+COMPILED_NAME = "snapshot.bin"
+
+# Numeric columns the backend sorts listings by; their sort orders are stored
+# too, so the backend does not have to sort them when it starts
+SORTED_COLUMNS = ("rent_hkd", "saleable_area_sqft")
+
+# File layout: a header holding the magic, the format version and the (offset,
+# size) of a JSON directory at the end of the file, then sections starting at
+# multiples of 8 bytes, listed in the directory:
+#   strings          string table shared by every text column, as uint64[count + 1]
+#                    offsets into UTF-8 data (so repeated values are stored once)
+#   columns          one per column of the manifest schema: "float64" (numbers and
+#                    booleans, NaN when missing) or "string" (uint32 IDs into the
+#                    string table, MISSING when missing; dates and JSON as text)
+#   orders           for SORTED_COLUMNS, uint32 row IDs by ascending and by
+#                    descending value, missing values last and ties in row order
+# The backend reads it with app/compiled.py; keep both in step.
+MAGIC = b"HKCS"
+VERSION = 1
+HEADER = struct.Struct("<4sIQQ")
+MISSING = 0xFFFFFFFF
+
+def _floats(values):
+    return np.array([
+        float(v) if isinstance(v, (int, float)) else np.nan
+        for v in values
+    ], dtype=np.float64)
+
+def _text(value):
+    if value is None or isinstance(value, str):
+        return value
+    if isinstance(value, (list, dict)):
+        return json.dumps(value, ensure_ascii=False, default=str)
+    return str(value)
+
+def _orders(column):
+    # Same orders as the backend's ListingIndex computes when there are none stored
+    order = np.argsort(column, kind="stable")
+    valid = int(np.count_nonzero(~np.isnan(column)))
+    descending = np.concatenate([order[:valid][np.argsort(-column[order[:valid]], kind="stable")], order[valid:]])
+    return order.astype(np.uint32), descending.astype(np.uint32)
+
+def compile_snapshot(records, schema=None):
+    """
+    Compiles the listings of a snapshot into one file the backend can memory-map.
+
+    Parameters:
+        records (list): The listing dicts, in snapshot order.
+        schema (dict): Column types, see snapshot_sink.infer_schema; inferred from
+            the records if None.
+
+    Returns:
+        bytes: The compiled snapshot, see the layout above.
+    """
+    schema = schema if schema is not None else infer_schema(records)
+    body = bytearray(HEADER.size)
+
+    def add(data):
+        body.extend(b"\0" * (-len(body) % 8))
+        offset = len(body)
+        body.extend(data)
+        return offset
+
+    strings = {}
+    columns = {}
+    for name, column_type in schema.items():
+        values = [record.get(name) for record in records]
+        if column_type in ("int64", "float64", "bool"):
+            column = _floats(values)
+            columns[name] = {"type": "float64", "offset": add(column.tobytes())}
+        else:
+            ids = [MISSING if v is None else strings.setdefault(v, len(strings)) for v in map(_text, values)]
+            columns[name] = {"type": "string", "offset": add(np.array(ids, dtype=np.uint32).tobytes())}
+
+    orders = {}
+    for name in SORTED_COLUMNS:
+        if columns.get(name, {}).get("type") == "float64":
+            ascending, descending = _orders(_floats([record.get(name) for record in records]))
+            orders[name] = {"ascending": add(ascending.tobytes()), "descending": add(descending.tobytes())}
+
+    encoded = [s.encode('utf-8') for s in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.uint64)
+    np.cumsum([len(b) for b in encoded], out=offsets[1:])
+    data = b"".join(encoded)
+    directory = {
+        "rows": len(records),
+        "strings": {"count": len(encoded), "offsets": add(offsets.tobytes()), "data": add(data), "size": len(data)},
+        "columns": columns,
+        "orders": orders,
+    }
+    directory = json.dumps(directory).encode('utf-8')
+    HEADER.pack_into(body, 0, MAGIC, VERSION, add(directory), len(directory))
+    return bytes(body)
+
+def store_compiled_snapshot(storage, date, snapshot=None):
+    """
+    Compiles a daily snapshot and stores it next to the snapshot.
+
+    Parameters:
+        storage (Storage): Where the snapshot is stored.
+        date (str): The date of the snapshot.
+        snapshot (tuple): (manifest, records) as returned by read_snapshot, if
+            already read.
+
+    Returns:
+        dict: Description of the file for the manifest (key relative to the
+        snapshot folder, records compiled, size, build time), or None if there is
+        no snapshot for the date.
+    """
+    prefix = f"snapshots/{date}/"
+    manifest, records = snapshot if snapshot is not None else read_snapshot(storage, prefix)
+    if manifest is None:
+        return None
+    started = time.perf_counter()
+    body = compile_snapshot(records, manifest.get("schema") or None)
+    storage.put(f"{prefix}{COMPILED_NAME}", body)
+    logging.info(f"Compiled {len(records)} listings of {date} in {time.perf_counter() - started:.2f}s ({len(body)} bytes)")
+    return {"key": COMPILED_NAME, "records": len(records), "bytes": len(body), "built_at": time.time()}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compile a daily snapshot for the backend.")
+    parser.add_argument("--storage", default="s3://housing-listing-bucket", help="where the snapshots are: s3://<bucket> or a local directory")
+    parser.add_argument("--region", default="ap-east-1", help="region of the S3 bucket")
+    parser.add_argument("--date", default=datetime.date.today().strftime("%Y-%m-%d"), help="date of the snapshot")
+    args = parser.parse_args(argv)
+
+    storage = open_storage(args.storage, args.region)
+    info = store_compiled_snapshot(storage, args.date)
+    if info is None:
+        logging.error(f"No snapshot for {args.date} in {args.storage}")
+        return 1
+    # Lets the backend know there is a (new) compiled snapshot
+    SnapshotSink(storage, f"snapshots/{args.date}/").annotate("compiled", info)
+    return 0
+
+if __name__ == '__main__':
+    # Compile the snapshot of a day, e.g. one crawled before compiling was added:
+    #   python compiled_snapshot.py --storage ./housing_data --date 2024-11-20
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    sys.exit(main())
@@ -0,0 +1,161 @@
+import os
+import time
+import sqlite3
+import threading
+
+# Where the journal is kept
+JOURNAL_PATH = os.environ.get("CRAWLER_JOURNAL_PATH", "crawl_journal.sqlite")
+
+# A property is given up on for the run after this many failed attempts
+MAX_ATTEMPTS = int(os.environ.get("CRAWLER_MAX_ATTEMPTS", 3))
+
+class CrawlJournal:
+    """
+    Durable record of a crawl, so a retry or a later run resumes where it stopped.
+
+    For every run (identified by its date) the journal stores whether discovery
+    finished and, for every property ID found, its status ("pending", "done" or
+    "failed"), the number of attempts and when it was first and last tried.
+    """
+
+    def __init__(self, path=JOURNAL_PATH):
+        """
+        Parameters:
+            path (str): The SQLite file holding the journal; created if missing.
+        """
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        # WAL keeps every status update durable without a full sync per write
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS runs ("
+            " run_date TEXT PRIMARY KEY, discovered_at REAL, completed_at REAL)"
+        )
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS properties ("
+            " run_date TEXT NOT NULL, property_id TEXT NOT NULL, status TEXT NOT NULL,"
+            " attempts INTEGER NOT NULL DEFAULT 0, first_attempt_at REAL, last_attempt_at REAL, error TEXT,"
+            " PRIMARY KEY (run_date, property_id))"
+        )
+        self._db.commit()
+
+    def is_resumable(self, run_date):
+        """
+        Tells whether a run finished discovery but not the crawl itself.
+
+        Parameters:
+            run_date (str): The date of the run.
+
+        Returns:
+            bool: True if the run can be resumed without a new discovery pass.
+        """
+        with self._lock:
+            row = self._db.execute(
+                "SELECT discovered_at, completed_at FROM runs WHERE run_date = ?", (run_date,)
+            ).fetchone()
+        return row is not None and row[0] is not None and row[1] is None
+
+    def record_discovery(self, run_date, property_ids, done_ids=()):
+        """
+        Records the outcome of discovery: the IDs to crawl in this run.
+
+        IDs already known to the run keep their status.
+
+        Parameters:
+            run_date (str): The date of the run.
+            property_ids (iterable): The property IDs to crawl.
+            done_ids (iterable): IDs found to be already crawled (e.g. already in storage).
+
+        Returns:
+            None
+        """
+        with self._lock:
+            self._db.executemany(
+                "INSERT OR IGNORE INTO properties (run_date, property_id, status) VALUES (?, ?, 'pending')",
+                ((run_date, str(property_id)) for property_id in property_ids),
+            )
+            self._db.executemany(
+                "INSERT OR REPLACE INTO properties (run_date, property_id, status) VALUES (?, ?, 'done')",
+                ((run_date, str(property_id)) for property_id in done_ids),
+            )
+            self._db.execute(
+                "INSERT INTO runs (run_date, discovered_at) VALUES (?, ?)"
+                " ON CONFLICT (run_date) DO UPDATE SET discovered_at = excluded.discovered_at, completed_at = NULL",
+                (run_date, time.time()),
+            )
+            self._db.commit()
+
+    def pending_ids(self, run_date, max_attempts=MAX_ATTEMPTS):
+        """
+        Returns the IDs of a run that still need to be crawled.
+
+        Parameters:
+            run_date (str): The date of the run.
+            max_attempts (int): IDs that failed this many times are left out.
+
+        Returns:
+            list: The property IDs.
+        """
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT property_id FROM properties"
+                " WHERE run_date = ? AND status != 'done' AND attempts < ?",
+                (run_date, max_attempts),
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def record_result(self, run_date, property_id, status, error=None):
+        """
+        Records an attempt at crawling a property.
+
+        Parameters:
+            run_date (str): The date of the run.
+            property_id (str): The ID of the property.
+            status (str): "done" or "failed".
+            error (str): What went wrong, for failed attempts.
+
+        Returns:
+            None
+        """
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO properties (run_date, property_id, status, attempts, first_attempt_at, last_attempt_at, error)"
+                " VALUES (?, ?, ?, 1, ?, ?, ?)"
+                " ON CONFLICT (run_date, property_id) DO UPDATE SET"
+                " status = excluded.status, attempts = attempts + 1, last_attempt_at = excluded.last_attempt_at,"
+                " first_attempt_at = COALESCE(first_attempt_at, excluded.first_attempt_at), error = excluded.error",
+                (run_date, str(property_id), status, now, now, error),
+            )
+            self._db.commit()
+
+    def mark_completed(self, run_date):
+        """
+        Marks a run as finished, so the next run of the same date starts with discovery.
+
+        Parameters:
+            run_date (str): The date of the run.
+
+        Returns:
+            None
+        """
+        with self._lock:
+            self._db.execute("UPDATE runs SET completed_at = ? WHERE run_date = ?", (time.time(), run_date))
+            self._db.commit()
+
+    def summary(self, run_date):
+        """
+        Counts the properties of a run by status.
+
+        Parameters:
+            run_date (str): The date of the run.
+
+        Returns:
+            dict: Number of properties by status.
+        """
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT status, COUNT(*) FROM properties WHERE run_date = ? GROUP BY status", (run_date,)
+            ).fetchall()
+        return dict(rows)
@@ -0,0 +1,619 @@
+import os
+import time
+import random
+import datetime
+import json
+import logging
+
+from listing_parser import parse_property_page
+from fetcher import fetch_property_page, fetch_stats
+from pipeline import crawl_pipeline, start_parse_pool, close_parse_pool
+from discovery import discover_property_ids
+from driver_pool import DriverPool, fetch_adjacent_facilities
+from facilities import get_facilities
+from crawl_journal import CrawlJournal
+from id_store import IdStore, WrittenIds, list_ids
+from freshness import FreshnessStore, FRESHNESS_PATH
+from snapshot_sink import SnapshotSink, OUTPUT_FORMATS, SNAPSHOT_FORMATS, read_snapshot
+from text_index import store_text_index
+from compiled_snapshot import store_compiled_snapshot
+from storage import LocalStorage, open_storage
+from metrics import count, timed, summary, write_prometheus, start_http_server
+
+from selenium import webdriver
+from selenium.webdriver.common.by import By
+from selenium.webdriver.chrome.options import Options
+
+# Where listings, ID stores and indexes are kept: "s3://<bucket>", "memory://" or a local directory
+STORAGE_URL = os.environ.get("CRAWLER_STORAGE", "s3://housing-listing-bucket")
+S3_BUCKET_REGION = os.environ.get("CRAWLER_S3_REGION", "ap-east-1") # Hong Kong
+
+# How listing IDs are discovered: "http" (Selenium only as a fallback) or "selenium"
+DISCOVERY_MODE = os.environ.get("CRAWLER_DISCOVERY_MODE", "http")
+
+# Number of search result pages to collect; all of them if unset
+MAX_PAGES = int(os.environ["CRAWLER_MAX_PAGES"]) if os.environ.get("CRAWLER_MAX_PAGES") else None
+
+# Whether listings are enriched with nearby facilities (needs Chrome)
+COLLECT_FACILITIES = os.environ.get("CRAWLER_COLLECT_FACILITIES", "0") == "1"
+
+# Whether facilities that cannot be read without a browser are read in one
+FACILITIES_BROWSER_FALLBACK = os.environ.get("CRAWLER_FACILITIES_BROWSER_FALLBACK", "1") == "1"
+
+# Path to the chromedriver binary
+CHROMEDRIVER_PATH = os.environ.get("CRAWLER_CHROMEDRIVER_PATH", "/usr/bin/chromedriver")
+
+# Get current date string; set CRAWLER_RUN_DATE to resume the run of an earlier day
+current_date_str = os.environ.get("CRAWLER_RUN_DATE") or datetime.date.today().strftime("%Y-%m-%d")
+
+# Key of the freshness store when it is kept in remote storage between runs
+FRESHNESS_KEY = "freshness.sqlite"
+
+# Storage backend, opened on first use
+_storage = None
+
+# Browsers used for facility data, created on first use
+_driver_pool = None
+
+# Listings buffered into a few large files per day, created on first use
+_snapshot_sink = None
+
+# Index of the listings stored today, read on first use
+_written_ids = None
+
+# Record of the crawl, created on first use
+_journal = None
+
+# Fingerprints of crawled listings, opened on first use
+_freshness = None
+
+def get_storage():
+    """
+    Returns the storage backend selected by CRAWLER_STORAGE, opening it on first use.
+
+    Returns:
+        Storage: The backend holding every output of the crawler.
+    """
+    global _storage
+    if _storage is None:
+        _storage = open_storage(STORAGE_URL, S3_BUCKET_REGION)
+    return _storage
+
+def get_journal():
+    """
+    Returns the crawl journal, opening it on first use.
+
+    Returns:
+        CrawlJournal: The journal recording the progress of every run.
+    """
+    global _journal
+    if _journal is None:
+        _journal = CrawlJournal()
+    return _journal
+
+def _remote_freshness():
+    # A local directory already holds the SQLite file itself; other backends keep a copy
+    return not isinstance(get_storage(), LocalStorage)
+
+def get_freshness():
+    """
+    Returns the freshness store, copying it from remote storage if there is no local copy.
+
+    Returns:
+        FreshnessStore: The fingerprints and timestamps of every crawled listing.
+    """
+    global _freshness
+    if _freshness is None:
+        if _remote_freshness() and not os.path.exists(FRESHNESS_PATH):
+            data = get_storage().get(FRESHNESS_KEY)
+            if data is None:
+                logging.info(f"{FRESHNESS_KEY} not found in storage. Starting fresh.")
+            else:
+                with open(FRESHNESS_PATH, 'wb') as f:
+                    f.write(data)
+        _freshness = FreshnessStore()
+    return _freshness
+
+def save_freshness():
+    """
+    Copies the freshness store to remote storage for the next run.
+
+    Returns:
+        None
+    """
+    if _freshness is None or not _remote_freshness():
+        return
+    _freshness.checkpoint()
+    try:
+        with open(FRESHNESS_PATH, 'rb') as f:
+            get_storage().put(FRESHNESS_KEY, f.read())
+        logging.info(f"{FRESHNESS_KEY} has been uploaded.")
+    except Exception as e:
+        logging.error(f"Failed to upload {FRESHNESS_KEY}: {e}")
+
+def get_completed_store():
+    """
+    Returns the store of property IDs crawled in earlier runs.
+
+    Returns:
+        IdStore: The completed IDs.
+    """
+    return IdStore(get_storage())
+
+def get_snapshot_sink():
+    """
+    Returns the sink writing the snapshot of the day, creating it on first use.
+
+    Returns:
+        SnapshotSink: The sink, or None if CRAWLER_OUTPUT_FORMATS has no snapshot format.
+    """
+    global _snapshot_sink
+    if _snapshot_sink is None and any(name in SNAPSHOT_FORMATS for name in OUTPUT_FORMATS):
+        _snapshot_sink = SnapshotSink(get_storage(), f"snapshots/{current_date_str}/")
+    return _snapshot_sink
+
+def get_written_ids():
+    """
+    Returns the index of the listings stored today, reading it on first use.
+
+    Returns:
+        WrittenIds: The IDs stored under today's date.
+    """
+    global _written_ids
+    if _written_ids is None:
+        _written_ids = WrittenIds(get_storage(), f"written/{current_date_str}.ids")
+    return _written_ids
+
+def get_driver_pool():
+    """
+    Returns the pool of browsers used for facility data, creating it on first use.
+
+    Returns:
+        DriverPool: The shared browser pool.
+    """
+    global _driver_pool
+    if _driver_pool is None:
+        _driver_pool = DriverPool(CHROMEDRIVER_PATH)
+    return _driver_pool
+
+def get_adjacent_facilities(property_id):
+    """
+    Retrieves adjacent facilities data from the property page using a pooled Selenium browser.
+
+    Parameters:
+        property_id (str): The ID of the property to retrieve data for.
+
+    Returns:
+        dict: A dictionary containing information about nearby facilities (e.g., MTR, Bus, Mall, etc.).
+    """
+    return fetch_adjacent_facilities(get_driver_pool(), property_id)
+
+def add_adjacent_facilities(property_id, data):
+    """
+    Adds the adjacent facilities to the listing data, leaving it as is if they cannot be read.
+
+    Facilities are shared by every listing in the same building and read from the
+    page already fetched (or CRAWLER_FACILITIES_URL) when possible; a browser is
+    only used as a fallback.
+
+    Parameters:
+        property_id (str): The ID of the property.
+        data (dict): The listing data.
+
+    Returns:
+        dict: The listing data.
+    """
+    fallback = get_adjacent_facilities if FACILITIES_BROWSER_FALLBACK else None
+    try:
+        facilities = get_facilities(property_id, data, fallback)
+        if facilities is not None:
+            data.update(facilities)
+    except Exception as e:
+        logging.warning(f"Could not collect facilities for property {property_id}: {e}")
+    return data
+
+def write_data(data, index):
+    """
+    Queues the collected data to be written to storage.
+
+    Depending on CRAWLER_OUTPUT_FORMATS the listing goes into the snapshot of the
+    day (see get_snapshot_sink) and/or its own JSON file. Writes happen in the
+    background; flush the snapshot sink, then call get_storage().flush() to wait
+    for them. Once the property is stored it is marked as done in the crawl journal,
+    added to the index of the listings stored today and its fingerprint is recorded
+    in the freshness store; a write that fails leaves it to be crawled again.
+
+    Parameters:
+        data (dict): The data dictionary to write.
+        index (str): The property ID used as the filename.
+
+    Returns:
+        None
+    """
+    def on_success():
+        get_journal().record_result(current_date_str, index, "done")
+        get_written_ids().add(index)
+        get_freshness().observe(index, data)
+
+    sink = get_snapshot_sink()
+    if sink is not None:
+        # The listing counts as stored once the part holding it is
+        sink.add(index, data, on_success)
+        on_success = None
+
+    if "json" in OUTPUT_FORMATS:
+        # Convert data dictionary to JSON string
+        json_data = json.dumps(data, indent=4)
+
+        # Queue the JSON string to be written as json-files/<date>/<id>.json
+        get_storage().submit(f"json-files/{current_date_str}/{index}.json", json_data, on_success)
+
+def discover_property_ids_selenium():
+    """
+    Collects listed property IDs by clicking through the search results in headless Chrome.
+
+    This is the slow path, used only when discover_property_ids cannot fetch the
+    search results over plain HTTP.
+
+    Returns:
+        list: The unique property IDs found.
+    """
+    # Set up ChromeDriver
+    options = Options()
+    options.add_argument('--headless')
+
+    # Initialize the driver
+    driver = webdriver.Chrome(executable_path=CHROMEDRIVER_PATH, options=options)
+
+    # URL of the first page to scrape
+    base_url = "https://www.28hse.com/en/rent"
+    driver.get(base_url)
+
+    time.sleep(3)
+
+    # Locate all pagination links
+    pagination_items = driver.find_elements(By.CSS_SELECTOR, ".ui.menu.pagination a.item:not(.disabled)")
+
+    # Extract the page numbers
+    page_numbers = []
+    for item in pagination_items:
+        attr_value = item.get_attribute("attr1")
+        if attr_value and attr_value.isdigit():
+            page_numbers.append(int(attr_value))
+
+    # Get the maximum page number
+    max_page = max(page_numbers) if page_numbers else None
+    if max_page is None:
+        logging.info("No page numbers found.")
+    if MAX_PAGES is not None:
+        max_page = min(max_page or MAX_PAGES, MAX_PAGES)
+    property_ids = []
+    logging.info(f"Extracted maximum page number: {max_page}")
+
+    page_count = 0
+    while True:
+        # Wait for the page to load
+        time.sleep(random.randint(3, 4))
+        try:
+            # Find all property elements on the current page
+            properties = driver.find_elements(By.CLASS_NAME, "detail_page")
+
+            # Extract the 'attr1' property IDs
+            for prop in properties:
+                property_id = prop.get_attribute("attr1")
+                if property_id:
+                    property_ids.append(property_id)
+            page_count += 1
+            logging.info(f"Collected {page_count} pages so far...")
+
+            if page_count == max_page:
+                break
+
+        except Exception as e:
+            logging.error(f"An error occurred on this page: {e}")
+            # If error occurs during scraping, do nothing and move to checking next button
+
+        # Always check and attempt to click the "Next" button
+        try:
+            # Try to find the 'Next' button for pagination
+            next_button = driver.find_element(By.CSS_SELECTOR, 'a.item[attr1="plus"]')
+            driver.execute_script("arguments[0].scrollIntoView();", next_button)
+
+            # If the 'Next' button is found and clickable, click it
+            if next_button.is_enabled():
+                next_button.click()
+                logging.info("Moving to the next page...")
+            else:
+                logging.info("No more pages. Scraping complete.")
+                break
+
+        except Exception as e:
+            # If 'Next' button is not found or any error occurs, stop scraping (no more pages)
+            logging.info(f"No more pages or error with Next button ({e}). Scraping complete.")
+            break
+
+    # Close the browser after scraping
+    driver.quit()
+
+    # Removing Duplicates
+    return list(set(property_ids))
+
+def generate_need_update():
+    """
+    Generates the list of property IDs that need to be updated by scraping the website.
+
+    Returns:
+        None
+    """
+    property_ids = None
+    with timed("discovery"):
+        if DISCOVERY_MODE == "http":
+            property_ids = discover_property_ids(max_pages=MAX_PAGES)
+            if property_ids is None:
+                logging.warning("HTTP discovery failed, falling back to Selenium.")
+                count("discovery_fallbacks_total")
+        if property_ids is None:
+            property_ids = discover_property_ids_selenium()
+    count("listed_ids_total", len(property_ids))
+
+    logging.info(f"Total Number of {len(property_ids)} IDs are Found")
+
+    completed_ids = get_completed_store().load()
+    logging.info(f"{len(completed_ids)} IDs already completed")
+
+    unique_ids = completed_ids.exclude_from(property_ids)
+    logging.info(f"{len(unique_ids)} new IDs")
+
+    # Crawled listings still on the site are fetched again once they are due
+    freshness = get_freshness()
+    freshness.mark_listed(property_ids)
+    listed_ids = [estate_id for estate_id in property_ids if estate_id in completed_ids]
+    recrawl_ids = freshness.due_ids(listed_ids)
+    logging.info(f"{len(recrawl_ids)} of {len(listed_ids)} crawled IDs are due for a re-crawl")
+    unique_ids += recrawl_ids
+
+    logging.info(f"Total Number of {len(unique_ids)} IDs need to be scraped")
+
+    # Write need_update.txt
+    try:
+        get_storage().put('need_update.txt', "\n".join(unique_ids))
+        logging.info("need_update.txt has been written.")
+    except Exception as e:
+        logging.error(f"Failed to write need_update.txt: {e}")
+
+def merge_ids():
+    """
+    Merges IDs from need_update.txt into the completed ID store.
+
+    Returns:
+        None
+    """
+    storage = get_storage()
+
+    # Read need_update.txt
+    try:
+        need_update = storage.get('need_update.txt')
+    except Exception as e:
+        logging.error(f"Error reading need_update.txt: {e}")
+        return
+    if need_update is None:
+        logging.info("need_update.txt does not exist. No IDs to merge.")
+        return
+    need_update_ids = set(need_update.decode('utf-8').splitlines())
+
+    # Record the IDs as completed; only the new ones are written
+    try:
+        with timed("merge_ids"):
+            get_completed_store().add(need_update_ids)
+        logging.info(f"Merged {len(need_update_ids)} IDs into the completed ID store.")
+    except Exception as e:
+        logging.error(f"Failed to update the completed ID store: {e}")
+        return
+
+    # Delete need_update.txt
+    try:
+        storage.delete('need_update.txt')
+        logging.info("need_update.txt has been deleted.")
+    except Exception as e:
+        logging.error(f"Failed to delete need_update.txt: {e}")
+
+def discover_work():
+    """
+    Runs discovery and records the IDs to crawl today in the crawl journal.
+
+    Returns:
+        set: The property IDs that still need to be scraped, or None if there is nothing to do.
+    """
+    # Generate the need_update.txt file
+    generate_need_update()
+
+    # Read need_update.txt
+    storage = get_storage()
+    need_update = storage.get('need_update.txt')
+    if need_update is None:
+        logging.info("need_update.txt not found.")
+        return None
+    ids = need_update.decode('utf-8').splitlines()
+    logging.info(f"{len(ids)} IDs read from need_update.txt")
+
+    # IDs already stored today: a single read of the index, or, if there is no
+    # index yet, a parallel listing of today's JSON files
+    written = get_written_ids()
+    existing_files = written.ids()
+    if not written.found:
+        try:
+            existing_files |= list_ids(storage, f"json-files/{current_date_str}/")
+        except Exception as e:
+            logging.error(f"Error listing stored listings: {e}")
+    logging.info(f"{len(existing_files)} IDs already stored today")
+
+    unique_ids = set(ids) - existing_files
+    logging.info(f"{len(unique_ids)} unique IDs to process")
+
+    # From here on, a retry resumes from the journal instead of repeating discovery
+    get_journal().record_discovery(current_date_str, unique_ids, existing_files & set(ids))
+    return unique_ids
+
+def main():
+    """
+    Main function that runs the data collection process.
+
+    Returns:
+        bool: True if the process completed successfully, False otherwise.
+    """
+    journal = get_journal()
+    if journal.is_resumable(current_date_str):
+        # Discovery already ran; pick up the IDs that are not done yet
+        unique_ids = journal.pending_ids(current_date_str)
+        logging.info(f"Resuming from the crawl journal {journal.summary(current_date_str)}: {len(unique_ids)} IDs to process")
+    else:
+        unique_ids = discover_work()
+        if unique_ids is None:
+            return True  # Considered success since there's nothing to process
+
+    # Look up nearby facilities in pooled browsers once a page is parsed
+    enrich = add_adjacent_facilities if COLLECT_FACILITIES else None
+
+    # Fetch pages on threads, parse them on every core and write the results
+    unchanged = 0
+    for property_id, future in crawl_pipeline(unique_ids, fetch_property_page, parse_property_page, enrich):
+        try:
+            data = future.result()
+            if data is None:
+                logging.warning(f"Failed to read property {property_id}")
+                journal.record_result(current_date_str, property_id, "failed", "no data")
+                count("listings_total", outcome="failed")
+                count("listing_failures_total", cause="no data")
+                continue
+            freshness = get_freshness()
+            if not freshness.changed(property_id, data):
+                # A re-crawled listing that did not change is not stored again
+                freshness.observe(property_id, data)
+                unchanged += 1
+                journal.record_result(current_date_str, property_id, "done")
+                count("listings_total", outcome="unchanged")
+                continue
+            with timed("write"):
+                write_data(data, property_id)
+            count("listings_total", outcome="written")
+        except Exception as e:
+            logging.error(f"An error occurred while processing property {property_id}: {e}")
+            journal.record_result(current_date_str, property_id, "failed", str(e))
+            count("listings_total", outcome="failed")
+            count("listing_failures_total", cause=type(e).__name__)
+            raise e
+    logging.info(f"HTTP stats: {fetch_stats()}")
+    logging.info(f"{unchanged} re-crawled listings were unchanged")
+
+    # Write the last, partial snapshot part, then wait for the background writes
+    # so merge_ids only runs once all data is stored
+    with timed("flush"):
+        if _snapshot_sink is not None:
+            _snapshot_sink.flush()
+        failures = get_storage().flush()
+    get_written_ids().save()
+    if failures:
+        raise RuntimeError(f"{len(failures)} writes to storage failed")
+    return True
+
+def index_snapshot():
+    """
+    Builds the files the backend loads from the day's snapshot and records them in
+    the manifest: the text index of listing titles and descriptions, and the
+    compiled snapshot it memory-maps instead of reading the parts. A failure is
+    logged but does not fail the run.
+
+    Returns:
+        None
+    """
+    sink = get_snapshot_sink()
+    if sink is None:
+        return
+    try:
+        snapshot = read_snapshot(get_storage(), sink.prefix)
+        with timed("text_index"):
+            info = store_text_index(get_storage(), current_date_str, snapshot)
+        if info is not None:
+            sink.annotate("text_index", info)
+        with timed("compile"):
+            info = store_compiled_snapshot(get_storage(), current_date_str, snapshot)
+        if info is not None:
+            sink.annotate("compiled", info)
+    except Exception as e:
+        logging.error(f"Failed to index the snapshot: {e}")
+        count("index_failures_total")
+
+def save_metrics():
+    """
+    Stores the metrics of the run as metrics/<date>.json, and in the Prometheus
+    text format under CRAWLER_METRICS_PATH if set.
+
+    The JSON summary holds per-stage latency percentiles (discovery, fetch, parse,
+    enrich, write, upload, flush, merge_ids, text_index, compile), HTTP latencies, statuses, bytes
+    downloaded and uploaded, listings by outcome, retries and failures by cause,
+    and the rate of every counter over the run.
+
+    Returns:
+        dict: The summary.
+    """
+    report = summary()
+    report["date"] = current_date_str
+    try:
+        get_storage().put(f"metrics/{current_date_str}.json", json.dumps(report, indent=4))
+        write_prometheus()
+    except Exception as e:
+        logging.error(f"Failed to store the metrics: {e}")
+    logging.info(f"Metrics: {json.dumps(report)}")
+    return report
+
+def run(max_retries=3):
+    """
+    Runs the crawl, retrying failed attempts, and records the run as complete.
+
+    Parameters:
+        max_retries (int): Number of attempts before giving up.
+
+    Returns:
+        bool: True if the run completed, False if every attempt failed.
+    """
+    # Fork the parse workers while this is the only thread; every attempt reuses them
+    start_parse_pool()
+
+    # Serve the metrics at /metrics while the run goes on, if CRAWLER_METRICS_PORT is set
+    start_http_server()
+
+    retries = 0
+    completed = False
+    while retries < max_retries:
+        try:
+            logging.info("Starting the data collection process...")
+            main()
+            logging.info("Data collection completed successfully.")
+
+            # Merge IDs from need_update.txt into the completed ID store
+            merge_ids()
+            save_freshness()
+            index_snapshot()
+            get_journal().mark_completed(current_date_str)
+
+            completed = True
+            break
+        except Exception as e:
+            retries += 1
+            count("run_retries_total")
+            logging.error(f"An error occurred during data collection: {e}")
+            # Listings still buffered are not stored; the next attempt crawls them again
+            if _snapshot_sink is not None:
+                _snapshot_sink.discard()
+            logging.info(f"Retrying... ({retries}/{max_retries})")
+            if retries == max_retries:
+                logging.error("Maximum retries reached. Exiting.")
+
+    # Make sure no write is left behind, stop the parse workers and quit the
+    # browsers used for facility data
+    get_storage().close()
+    close_parse_pool()
+    if _driver_pool is not None:
+        _driver_pool.close()
+    save_metrics()
+    return completed
@@ -0,0 +1,105 @@
+import os
+import logging
+
+from bs4 import BeautifulSoup
+
+from fetcher import fetch_url
+from pipeline import crawl_concurrently
+
+# Paginated search results, the same pages the "Next" button navigates to
+SEARCH_PAGE_URL = os.environ.get("CRAWLER_SEARCH_PAGE_URL", "https://www.28hse.com/en/rent/page-{page}")
+
+# Number of result pages fetched concurrently
+DISCOVERY_WORKERS = int(os.environ.get("CRAWLER_DISCOVERY_WORKERS", 8))
+
+# Give up on HTTP discovery (and let the caller fall back) above this share of failed pages
+MAX_FAILED_PAGE_RATIO = 0.5
+
+def parse_listing_page(content):
+    """
+    Extracts the property IDs and the highest page number from a search results page.
+
+    Parameters:
+        content (bytes): The HTML of the search results page.
+
+    Returns:
+        tuple: (list of property IDs on the page, highest page number in the pagination menu or None).
+    """
+    soup = BeautifulSoup(content, 'html.parser')
+
+    property_ids = []
+    for prop in soup.select(".detail_page[attr1]"):
+        property_ids.append(prop["attr1"])
+
+    page_numbers = []
+    for item in soup.select(".ui.menu.pagination a.item[attr1]"):
+        attr_value = item["attr1"]
+        if attr_value.isdigit():
+            page_numbers.append(int(attr_value))
+
+    return property_ids, max(page_numbers) if page_numbers else None
+
+def fetch_listing_page(page):
+    """
+    Downloads and parses one page of search results.
+
+    Parameters:
+        page (int): The page number, starting at 1.
+
+    Returns:
+        tuple: See parse_listing_page.
+    """
+    response = fetch_url(SEARCH_PAGE_URL.format(page=page))
+    response.raise_for_status()
+    return parse_listing_page(response.content)
+
+def discover_property_ids(max_pages=None, max_workers=DISCOVERY_WORKERS):
+    """
+    Collects every listed property ID by fetching the search result pages over plain HTTP.
+
+    The first page gives the number of pages; the remaining pages are then fetched
+    concurrently.
+
+    Parameters:
+        max_pages (int): Stop after this many pages, or None for all of them.
+        max_workers (int): Number of pages fetched concurrently.
+
+    Returns:
+        list: The unique property IDs found, or None if the pages could not be fetched
+        or did not look like search results (the caller should fall back to Selenium).
+    """
+    try:
+        property_ids, max_page = fetch_listing_page(1)
+    except Exception as e:
+        logging.error(f"Could not fetch the first search results page: {e}")
+        return None
+
+    if not property_ids or max_page is None:
+        logging.warning("The first search results page has no listings or pagination.")
+        return None
+
+    if max_pages is not None:
+        max_page = min(max_page, max_pages)
+    logging.info(f"Extracted maximum page number: {max_page}")
+
+    all_ids = set(property_ids)
+    failed_pages = []
+    page_count = 1
+    for page, future in crawl_concurrently(range(2, max_page + 1), fetch_listing_page, max_workers):
+        try:
+            page_ids, _ = future.result()
+            all_ids.update(page_ids)
+            page_count += 1
+            if page_count % 100 == 0:
+                logging.info(f"Collected {page_count} pages so far...")
+        except Exception as e:
+            logging.error(f"An error occurred on page {page}: {e}")
+            failed_pages.append(page)
+
+    if len(failed_pages) > max_page * MAX_FAILED_PAGE_RATIO:
+        logging.error(f"{len(failed_pages)} of {max_page} search results pages failed.")
+        return None
+    if failed_pages:
+        logging.warning(f"Skipped {len(failed_pages)} search results pages that failed: {sorted(failed_pages)}")
+
+    return list(all_ids)
@@ -0,0 +1,172 @@
+import os
+import queue
+import atexit
+import logging
+import threading
+from contextlib import contextmanager
+
+from selenium import webdriver
+from selenium.webdriver.common.by import By
+from selenium.webdriver.chrome.options import Options
+from selenium.webdriver.support import expected_conditions as EC
+from selenium.webdriver.support.ui import WebDriverWait
+
+from fetcher import property_url
+from facilities import FACILITY_GLOBALS
+
+# Number of long-lived browsers
+DRIVER_POOL_SIZE = int(os.environ.get("CRAWLER_DRIVER_POOL_SIZE", 4))
+
+# A browser is replaced after this many pages to keep its memory in check
+DRIVER_MAX_USES = int(os.environ.get("CRAWLER_DRIVER_MAX_USES", 200))
+
+# Seconds to wait for the map link, then for the facility data behind it
+PAGE_LOAD_TIMEOUT = 15
+FACILITIES_TIMEOUT = 15
+
+# True once every facility global is defined
+_FACILITIES_READY_SCRIPT = "return " + " && ".join(
+    f"typeof {name} !== 'undefined'" for name in FACILITY_GLOBALS.values()
+) + ";"
+
+# All eight datasets in a single round trip
+_FACILITIES_SCRIPT = "return {" + ", ".join(
+    f"{key}: (typeof {name} === 'undefined' ? null : {name})" for key, name in FACILITY_GLOBALS.items()
+) + "};"
+
+def create_driver(executable_path):
+    """
+    Starts a headless Chrome.
+
+    Parameters:
+        executable_path (str): Path to the chromedriver binary.
+
+    Returns:
+        webdriver.Chrome: The browser.
+    """
+    options = Options()
+    options.add_argument("--headless")  # Run in headless mode (no GUI)
+    options.add_argument("--no-sandbox")
+    options.add_argument("--disable-dev-shm-usage")
+    driver = webdriver.Chrome(executable_path=executable_path, options=options)
+    driver.set_page_load_timeout(PAGE_LOAD_TIMEOUT * 2)
+    return driver
+
+class DriverPool:
+    """
+    A fixed set of long-lived headless browsers shared between threads.
+
+    Browsers are started on first use and reused across pages. Before a browser is
+    handed out it is health-checked, and it is replaced if it stopped responding,
+    raised during its last use, or has served DRIVER_MAX_USES pages.
+    """
+
+    def __init__(self, executable_path, size=DRIVER_POOL_SIZE, max_uses=DRIVER_MAX_USES):
+        """
+        Parameters:
+            executable_path (str): Path to the chromedriver binary.
+            size (int): Number of browsers.
+            max_uses (int): Pages served by a browser before it is recycled.
+        """
+        self.executable_path = executable_path
+        self.max_uses = max_uses
+        self._idle = queue.Queue()
+        self._lock = threading.Lock()
+        self._closed = False
+        # Slots hold (driver or None, uses); None means the browser is not started yet
+        for _ in range(size):
+            self._idle.put((None, 0))
+        atexit.register(self.close)
+
+    @staticmethod
+    def _healthy(driver):
+        try:
+            return driver.execute_script("return 1;") == 1
+        except Exception:
+            return False
+
+    @staticmethod
+    def _quit(driver):
+        try:
+            driver.quit()
+        except Exception as e:
+            logging.warning(f"Failed to quit browser: {e}")
+
+    @contextmanager
+    def driver(self):
+        """
+        Borrows a browser for the duration of a with block, blocking until one is free.
+
+        Yields:
+            webdriver.Chrome: A healthy browser.
+        """
+        if self._closed:
+            raise RuntimeError("DriverPool is closed")
+        driver, uses = self._idle.get()
+        try:
+            if driver is not None and (uses >= self.max_uses or not self._healthy(driver)):
+                logging.info(f"Recycling browser after {uses} pages.")
+                self._quit(driver)
+                driver = None
+            if driver is None:
+                driver, uses = create_driver(self.executable_path), 0
+            yield driver
+            uses += 1
+        except Exception:
+            # The browser may be in an unknown state; start a fresh one next time
+            if driver is not None:
+                self._quit(driver)
+            driver, uses = None, 0
+            raise
+        finally:
+            if self._closed and driver is not None:
+                self._quit(driver)
+                driver = None
+            self._idle.put((driver, uses))
+
+    def close(self):
+        """
+        Quits every idle browser. Safe to call more than once.
+
+        Returns:
+            None
+        """
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+        while True:
+            try:
+                driver, _ = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            if driver is not None:
+                self._quit(driver)
+        atexit.unregister(self.close)
+
+def fetch_adjacent_facilities(pool, property_id):
+    """
+    Retrieves adjacent facilities data from the property page with a pooled browser.
+
+    Opens the map modal and waits until the map_data_* globals are defined, instead
+    of sleeping a fixed time, then reads all of them with a single script call.
+
+    Parameters:
+        pool (DriverPool): The browsers to use.
+        property_id (str): The ID of the property to retrieve data for.
+
+    Returns:
+        dict: A dictionary containing information about nearby facilities (e.g., MTR, Bus, Mall, etc.).
+    """
+    with pool.driver() as driver:
+        driver.get(property_url(property_id))
+
+        # Click the "Google Map" link once it is there
+        google_map_link = WebDriverWait(driver, PAGE_LOAD_TIMEOUT).until(
+            EC.element_to_be_clickable((By.CLASS_NAME, "googleMap"))
+        )
+        google_map_link.click()
+
+        # Wait for the modal to populate the facility data
+        WebDriverWait(driver, FACILITIES_TIMEOUT).until(lambda d: d.execute_script(_FACILITIES_READY_SCRIPT))
+        return driver.execute_script(_FACILITIES_SCRIPT)
@@ -0,0 +1,169 @@
+import os
+import re
+import json
+import logging
+import threading
+from collections import OrderedDict
+
+from fetcher import fetch_url
+from page_cache import get_page_cache
+
+# JS globals holding the facility data, by output key
+FACILITY_GLOBALS = {
+    "mtr": "map_data_MTRItems",
+    "bus": "map_data_BusItems",
+    "mall": "map_data_MallItems",
+    "restaurant": "map_data_RestaurantItems",
+    "school": "map_data_SchoolItems",
+    "bank": "map_data_BankItems",
+    "hospital": "map_data_HospitalItems",
+    "estate": "map_data_EstateItems",
+}
+
+# Resource assigning the map_data_* globals, fetched over plain HTTP, as a URL
+# template with a {property_id} placeholder. If unset, the globals are read from
+# the property page the crawler already fetched, through the page cache, so no
+# page is downloaded twice.
+FACILITIES_URL = os.environ.get("CRAWLER_FACILITIES_URL", "")
+
+# Number of estates whose facilities are kept in memory
+FACILITIES_CACHE_SIZE = int(os.environ.get("CRAWLER_FACILITIES_CACHE_SIZE", 10000))
+
+# Cached property pages read without finding any map_data_* global before the
+# page cache is no longer tried; 28hse loads them when the map is opened, so the
+# static page usually has none
+STATIC_PAGE_PROBES = 20
+
+# Start of an assignment such as "var map_data_MTRItems = [...]"
+_ASSIGNMENT_RE = re.compile(r"\b(" + "|".join(FACILITY_GLOBALS.values()) + r")\s*=\s*")
+
+_json_decoder = json.JSONDecoder()
+
+# Facilities by estate, least recently used first
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+# Cached property pages read, and those assigning the globals
+_static_reads = 0
+_static_hits = 0
+_static_lock = threading.Lock()
+
+def parse_facilities(text):
+    """
+    Reads the map_data_* assignments out of a page or script.
+
+    Only values written as JSON literals can be read; anything else (for example a
+    function call) is left out.
+
+    Parameters:
+        text (str): The HTML page or JavaScript source assigning the globals.
+
+    Returns:
+        dict: The facility lists by key (e.g. "mtr", "bus"), with None for globals
+        that are not assigned, or None if none of them could be read.
+    """
+    facilities = {key: None for key in FACILITY_GLOBALS}
+    keys_by_global = {name: key for key, name in FACILITY_GLOBALS.items()}
+    found = False
+    for match in _ASSIGNMENT_RE.finditer(text):
+        try:
+            value, _ = _json_decoder.raw_decode(text, match.end())
+        except ValueError:
+            continue
+        facilities[keys_by_global[match.group(1)]] = value
+        found = True
+    return facilities if found else None
+
+def fetch_facilities(property_id):
+    """
+    Reads the facility globals of a property without a browser.
+
+    With CRAWLER_FACILITIES_URL set, the resource assigning them is downloaded;
+    otherwise they are read from the property page in the page cache, where the
+    crawler stored it when fetching the listing. If none of the first
+    STATIC_PAGE_PROBES cached pages assigns them, the static pages are taken not to
+    have them: this is logged once and the page cache is no longer read.
+
+    Parameters:
+        property_id (str): The ID of the property.
+
+    Returns:
+        dict: See parse_facilities; None if nothing could be fetched or read.
+    """
+    global _static_reads, _static_hits
+    if not FACILITIES_URL:
+        with _static_lock:
+            if not _static_hits and _static_reads >= STATIC_PAGE_PROBES:
+                return None
+        cache = get_page_cache()
+        entry = cache.get(str(property_id)) if cache is not None else None
+        if entry is None:
+            return None
+        facilities = parse_facilities(entry["content"].decode('utf-8', errors='replace'))
+        with _static_lock:
+            _static_reads += 1
+            _static_hits += facilities is not None
+            if not _static_hits and _static_reads == STATIC_PAGE_PROBES:
+                logging.warning(f"None of the first {STATIC_PAGE_PROBES} property pages assigns the map_data_* globals, "
+                                "so facilities are not read from them any more; set CRAWLER_FACILITIES_URL to the "
+                                "resource the map loads them from to avoid the browser fallback.")
+        return facilities
+
+    url = FACILITIES_URL.format(property_id=property_id)
+    try:
+        response = fetch_url(url)
+        response.raise_for_status()
+    except Exception as e:
+        logging.warning(f"Failed to fetch facilities of property {property_id}: {e}")
+        return None
+    return parse_facilities(response.text)
+
+def estate_key(data):
+    """
+    Identifies the building of a listing, so listings in the same building share facilities.
+
+    Parameters:
+        data (dict): The listing data.
+
+    Returns:
+        tuple: The listing coordinates, or None if the listing has none.
+    """
+    if data.get("latitude") and data.get("longitude"):
+        return data["latitude"], data["longitude"]
+    return None
+
+def get_facilities(property_id, data, fallback=None):
+    """
+    Returns the facilities around a listing, without a browser whenever possible.
+
+    Looks up the facilities of the listing's building in the cache first, then
+    reads them without a browser (see fetch_facilities), and only then calls the
+    fallback (typically the Selenium path).
+
+    Parameters:
+        property_id (str): The ID of the property.
+        data (dict): The parsed listing data, used to identify the building.
+        fallback (callable): Called as fallback(property_id) when the facilities
+            cannot be read without a browser.
+
+    Returns:
+        dict: The facility lists by key, or None if they could not be found.
+    """
+    key = estate_key(data)
+    if key is not None:
+        with _cache_lock:
+            facilities = _cache.get(key)
+            if facilities is not None:
+                _cache.move_to_end(key)
+                return facilities
+
+    facilities = fetch_facilities(property_id)
+    if facilities is None and fallback is not None:
+        facilities = fallback(property_id)
+
+    if facilities is not None and key is not None:
+        with _cache_lock:
+            _cache[key] = facilities
+            while len(_cache) > FACILITIES_CACHE_SIZE:
+                _cache.popitem(last=False)
+    return facilities
@@ -0,0 +1,261 @@
+import os
+import time
+import random
+import logging
+import threading
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from page_cache import get_page_cache, OFFLINE
+from rate_limiter import host_rate_limiter, current_rates
+from metrics import count, observe
+
+# Base URL of a single 28hse rental listing
+PROPERTY_URL = "https://www.28hse.com/en/rent/residential/property-"
+
+# Maximum number of requests allowed in flight against a single host
+MAX_REQUESTS_PER_HOST = int(os.environ.get("CRAWLER_MAX_PER_HOST", 8))
+
+# (connect, read) timeouts in seconds
+REQUEST_TIMEOUT = (
+    float(os.environ.get("CRAWLER_CONNECT_TIMEOUT", 5)),
+    float(os.environ.get("CRAWLER_READ_TIMEOUT", 20)),
+)
+
+# Retry policy for transient failures
+MAX_RETRIES = int(os.environ.get("CRAWLER_MAX_RETRIES", 4))
+BACKOFF_BASE = float(os.environ.get("CRAWLER_BACKOFF_BASE", 0.5))
+BACKOFF_MAX = 30.0
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# One semaphore per host, created lazily
+_host_semaphores = {}
+_host_semaphores_lock = threading.Lock()
+
+# Shared session, created lazily
+_session = None
+_session_lock = threading.Lock()
+
+# Request counters, see fetch_stats()
+_stats = {"requests": 0, "retries": 0, "failures": 0, "cache_hits": 0, "cache_revalidated": 0}
+_stats_lock = threading.Lock()
+
+def property_url(property_id):
+    """
+    Builds the 28hse listing URL for a property ID.
+
+    Parameters:
+        property_id (str): The ID of the property.
+
+    Returns:
+        str: The URL of the property page.
+    """
+    return PROPERTY_URL + str(property_id)
+
+def host_semaphore(url):
+    """
+    Returns the semaphore capping concurrent requests to the host of the given URL.
+
+    Parameters:
+        url (str): The URL about to be requested.
+
+    Returns:
+        threading.BoundedSemaphore: The semaphore shared by every request to that host.
+    """
+    host = urlparse(url).netloc
+    with _host_semaphores_lock:
+        semaphore = _host_semaphores.get(host)
+        if semaphore is None:
+            semaphore = threading.BoundedSemaphore(MAX_REQUESTS_PER_HOST)
+            _host_semaphores[host] = semaphore
+    return semaphore
+
+def get_session():
+    """
+    Returns the shared HTTP session, creating it on first use.
+
+    The session keeps connections alive between requests and its pool is sized so
+    every concurrent request to a host can hold its own connection.
+
+    Returns:
+        requests.Session: The shared session.
+    """
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            # Retries are handled in fetch_url so they can be counted and jittered
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=MAX_REQUESTS_PER_HOST, max_retries=0)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            session.headers.update({
+                "Accept-Encoding": "gzip, deflate",
+                "Connection": "keep-alive",
+            })
+            _session = session
+    return _session
+
+def _count(key, amount=1):
+    with _stats_lock:
+        _stats[key] += amount
+
+def _retry_after(response):
+    # Seconds asked for by a numeric Retry-After header, if any
+    retry_after = response.headers.get("Retry-After", "")
+    return float(retry_after) if retry_after.isdigit() else None
+
+def _backoff_delay(attempt, response=None):
+    """
+    Computes how long to wait before the next attempt.
+
+    Uses exponential backoff with full jitter, unless the server sent a numeric
+    Retry-After header, in which case that is honoured.
+
+    Parameters:
+        attempt (int): The number of the attempt that just failed, starting at 0.
+        response (requests.Response): The failed response, if any.
+
+    Returns:
+        float: The delay in seconds.
+    """
+    retry_after = _retry_after(response) if response is not None else None
+    if retry_after is not None:
+        return min(retry_after, BACKOFF_MAX)
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * (2 ** attempt)))
+
+def fetch_url(url, headers=None):
+    """
+    Performs a GET request through the shared session, retrying transient failures.
+
+    Connection errors, timeouts and 429/5xx responses are retried up to MAX_RETRIES
+    times with exponential backoff and jitter. The per-host concurrency cap is only
+    held while a request is actually in flight, not while backing off. Every attempt
+    waits for the adaptive rate limiter of the host, and reports back how it went.
+    Latencies, statuses, bytes downloaded, and retries and failures by cause are
+    recorded in the metrics.
+
+    Parameters:
+        url (str): The URL to fetch.
+        headers (dict): Extra request headers, if any.
+
+    Returns:
+        requests.Response: The HTTP response. After the last retry the final
+        response is returned even if its status is still retryable.
+
+    Raises:
+        requests.RequestException: If the last attempt failed without a response.
+    """
+    session = get_session()
+    limiter = host_rate_limiter(url)
+    attempt = 0
+    while True:
+        _count("requests")
+        response = None
+        limiter.acquire()
+        try:
+            with host_semaphore(url):
+                started = time.monotonic()
+                response = session.get(url, headers=headers, timeout=REQUEST_TIMEOUT)
+            latency = time.monotonic() - started
+            limiter.record(response.status_code, latency, _retry_after(response))
+            observe("http_request_seconds", latency)
+            count("http_responses_total", status=response.status_code)
+            count("bytes_downloaded_total", len(response.content))
+            if response.status_code not in RETRY_STATUSES or attempt >= MAX_RETRIES:
+                if response.status_code in RETRY_STATUSES:
+                    count("http_failures_total", cause=f"HTTP {response.status_code}")
+                return response
+            logging.warning(f"Got HTTP {response.status_code} for {url}, retrying ({attempt + 1}/{MAX_RETRIES})")
+            cause = f"HTTP {response.status_code}"
+        except (requests.ConnectionError, requests.Timeout) as e:
+            limiter.record(None, time.monotonic() - started)
+            cause = type(e).__name__
+            if attempt >= MAX_RETRIES:
+                _count("failures")
+                count("http_failures_total", cause=cause)
+                raise
+            logging.warning(f"{cause} for {url}, retrying ({attempt + 1}/{MAX_RETRIES})")
+
+        _count("retries")
+        count("http_retries_total", cause=cause)
+        time.sleep(_backoff_delay(attempt, response))
+        attempt += 1
+
+def fetch_property_page(property_id):
+    """
+    Downloads the page of a property, going through the page cache.
+
+    Fresh cached pages are served without a request. Stale ones are re-validated
+    with a conditional request and served from the cache on 304 Not Modified. In
+    offline mode only the cache is used.
+
+    Parameters:
+        property_id (str): The ID of the property.
+
+    Returns:
+        bytes: The raw HTML of the page, or None if it could not be fetched.
+    """
+    property_id = str(property_id)
+    cache = get_page_cache()
+    entry = cache.get(property_id) if cache is not None else None
+    if entry is not None and (entry["fresh"] or OFFLINE):
+        _count("cache_hits")
+        count("page_cache_total", result="hit")
+        return entry["content"]
+    if OFFLINE:
+        logging.error(f"Property {property_id} is not in the page cache (offline mode)")
+        return None
+
+    headers = {}
+    if entry is not None:
+        if entry["etag"]:
+            headers["If-None-Match"] = entry["etag"]
+        if entry["last_modified"]:
+            headers["If-Modified-Since"] = entry["last_modified"]
+
+    url = property_url(property_id)
+    try:
+        response = fetch_url(url, headers=headers)
+    except Exception as e:
+        logging.error(f"Failed to fetch property {property_id} ({type(e).__name__}: {e})")
+        logging.error(f"Property URL: {url}")
+        return None
+
+    if response.status_code == 304 and entry is not None:
+        _count("cache_revalidated")
+        count("page_cache_total", result="revalidated")
+        cache.touch(property_id)
+        return entry["content"]
+    if cache is not None and response.status_code == 200:
+        cache.put(property_id, response.content, response.headers.get("ETag"), response.headers.get("Last-Modified"))
+    return response.content
+
+def fetch_stats():
+    """
+    Returns the request, retry and connection reuse counters of this process.
+
+    Returns:
+        dict: Counts of requests sent, retries, requests that failed for good,
+        pages served from the page cache (fresh or re-validated with a 304),
+        connections opened, requests served over an already open connection and
+        the current request rate of every host.
+    """
+    with _stats_lock:
+        stats = dict(_stats)
+
+    opened = 0
+    served = 0
+    if _session is not None:
+        for adapter in set(_session.adapters.values()):
+            pools = adapter.poolmanager.pools
+            for key in pools.keys():
+                pool = pools.get(key)
+                if pool is not None:
+                    opened += pool.num_connections
+                    served += pool.num_requests
+    stats["connections_opened"] = opened
+    stats["connections_reused"] = max(served - opened, 0)
+    stats["request_rates"] = current_rates()
+    return stats
@@ -0,0 +1,209 @@
+import os
+import json
+import time
+import hashlib
+import sqlite3
+import threading
+
+from facilities import FACILITY_GLOBALS
+
+# Where the freshness of every listing is kept
+FRESHNESS_PATH = os.environ.get("CRAWLER_FRESHNESS_PATH", "freshness.sqlite")
+
+# Re-crawl interval of listings that change on every visit, and of listings that never change
+MIN_RECRAWL_INTERVAL = float(os.environ.get("CRAWLER_RECRAWL_MIN_INTERVAL", 24 * 60 * 60))
+MAX_RECRAWL_INTERVAL = float(os.environ.get("CRAWLER_RECRAWL_MAX_INTERVAL", 7 * 24 * 60 * 60))
+
+# Maximum number of already crawled listings fetched again in a run
+RECRAWL_BUDGET = int(os.environ.get("CRAWLER_RECRAWL_BUDGET", 2000))
+
+# Seconds a listing can be missing from the search results before it is taken as
+# delisted and no longer re-crawled
+DELISTED_AFTER = float(os.environ.get("CRAWLER_DELISTED_AFTER", 3 * 24 * 60 * 60))
+
+# Runs do not start at exactly the same time every day; a listing due a few hours
+# from now is re-crawled in this run rather than skipped until the next one
+_SCHEDULE_SLACK = 4 * 60 * 60
+
+def fingerprint(data):
+    """
+    Hashes the content of a listing, ignoring the nearby facilities.
+
+    Parameters:
+        data (dict): The listing data.
+
+    Returns:
+        str: A hex digest that changes whenever the listing changes.
+    """
+    listing = {key: value for key, value in data.items() if key not in FACILITY_GLOBALS}
+    canonical = json.dumps(listing, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+def recrawl_interval(checks, changes):
+    """
+    Estimates how long a listing can go without being fetched again.
+
+    The change rate is the share of visits that found the listing changed, smoothed
+    so that a listing seen once is neither hot nor stale. A listing that changes on
+    every visit is re-crawled every MIN_RECRAWL_INTERVAL, one that never changes
+    every MAX_RECRAWL_INTERVAL.
+
+    Parameters:
+        checks (int): Number of times the listing was fetched.
+        changes (int): Number of those times it had changed since the previous fetch.
+
+    Returns:
+        float: The interval in seconds.
+    """
+    change_rate = (changes + 1) / (checks + 1)
+    return min(max(MIN_RECRAWL_INTERVAL / change_rate, MIN_RECRAWL_INTERVAL), MAX_RECRAWL_INTERVAL)
+
+class FreshnessStore:
+    """
+    Content fingerprints and timestamps of every listing crawled, used to schedule re-crawls.
+
+    For every property ID the store keeps the fingerprint of its last fetched
+    content, when it was first and last fetched, when it last changed and when it
+    was last listed in the search results, plus how many fetches found it changed.
+    """
+
+    def __init__(self, path=FRESHNESS_PATH):
+        """
+        Parameters:
+            path (str): The SQLite file holding the store; created if missing.
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS listings ("
+            " property_id TEXT PRIMARY KEY, fingerprint TEXT NOT NULL,"
+            " first_checked REAL NOT NULL, last_checked REAL NOT NULL, last_changed REAL NOT NULL,"
+            " last_seen REAL, checks INTEGER NOT NULL, changes INTEGER NOT NULL)"
+        )
+        self._db.commit()
+
+    def changed(self, property_id, data):
+        """
+        Compares a fetched listing with the content last recorded by observe, without
+        recording anything.
+
+        Parameters:
+            property_id (str): The ID of the property.
+            data (dict): The listing data that was fetched.
+
+        Returns:
+            bool: True if the listing is new or changed since it was last recorded.
+        """
+        with self._lock:
+            row = self._db.execute(
+                "SELECT fingerprint FROM listings WHERE property_id = ?", (str(property_id),)
+            ).fetchone()
+        return row is None or row[0] != fingerprint(data)
+
+    def observe(self, property_id, data):
+        """
+        Records a fetch of a listing.
+
+        Only record listings that are stored (or unchanged since they were): a
+        listing whose fingerprint is recorded counts as unchanged on its next fetch
+        and is not stored again.
+
+        Parameters:
+            property_id (str): The ID of the property.
+            data (dict): The listing data that was fetched.
+
+        Returns:
+            bool: True if the listing is new or changed since it was last fetched.
+        """
+        digest = fingerprint(data)
+        now = time.time()
+        with self._lock:
+            row = self._db.execute(
+                "SELECT fingerprint FROM listings WHERE property_id = ?", (str(property_id),)
+            ).fetchone()
+            changed = row is None or row[0] != digest
+            if row is None:
+                self._db.execute(
+                    "INSERT INTO listings VALUES (?, ?, ?, ?, ?, ?, 1, 0)",
+                    (str(property_id), digest, now, now, now, now),
+                )
+            else:
+                self._db.execute(
+                    "UPDATE listings SET fingerprint = ?, last_checked = ?, last_seen = ?, checks = checks + 1,"
+                    " changes = changes + ?, last_changed = CASE WHEN ? THEN ? ELSE last_changed END"
+                    " WHERE property_id = ?",
+                    (digest, now, now, int(changed), changed, now, str(property_id)),
+                )
+            self._db.commit()
+        return changed
+
+    def mark_listed(self, property_ids):
+        """
+        Records that listings are still in the search results.
+
+        Parameters:
+            property_ids (iterable): The IDs found by discovery.
+
+        Returns:
+            None
+        """
+        now = time.time()
+        with self._lock:
+            self._db.executemany(
+                "UPDATE listings SET last_seen = ? WHERE property_id = ?",
+                ((now, str(property_id)) for property_id in property_ids),
+            )
+            self._db.commit()
+
+    def due_ids(self, candidates, budget=RECRAWL_BUDGET):
+        """
+        Picks the listings to fetch again in this run.
+
+        A listing is due once its re-crawl interval has elapsed since it was last
+        fetched. Due listings are ranked by how many intervals they are overdue, so
+        hot listings go first, and at most budget of them are returned. Listings
+        mark_listed has not seen for DELISTED_AFTER are delisted and never due.
+        Candidates the store has never fetched are due with the lowest priority, so
+        listings crawled before the store existed are picked up as the budget allows.
+
+        Parameters:
+            candidates (iterable): The already crawled IDs that may be re-crawled,
+                typically those still listed.
+            budget (int): Maximum number of IDs to return.
+
+        Returns:
+            list: The property IDs, most overdue first.
+        """
+        candidates = {str(property_id) for property_id in candidates}
+        now = time.time()
+        with self._lock:
+            rows = self._db.execute("SELECT property_id, last_checked, last_seen, checks, changes FROM listings").fetchall()
+
+        overdue = []
+        for property_id, last_checked, last_seen, checks, changes in rows:
+            if property_id not in candidates:
+                continue
+            candidates.discard(property_id)
+            if last_seen is not None and now - last_seen > DELISTED_AFTER:
+                continue
+            elapsed = now - last_checked + _SCHEDULE_SLACK
+            interval = recrawl_interval(checks, changes)
+            if elapsed >= interval:
+                overdue.append((elapsed / interval, property_id))
+        overdue.sort(reverse=True)
+
+        due = [property_id for _, property_id in overdue] + sorted(candidates)
+        return due[:budget]
+
+    def checkpoint(self):
+        """
+        Writes every pending change into the database file, so it can be copied.
+
+        Returns:
+            None
+        """
+        with self._lock:
+            self._db.execute("PRAGMA wal_checkpoint(TRUNCATE)")
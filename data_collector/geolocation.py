@@ -0,0 +1,105 @@
+import os
+import re
+import sys
+import time
+
+# The page sets the listing position in an else branch, e.g.
+#   else { lat_o = '22.2830'; lng_o = '114.1371'; }
+# Whitespace is matched in place instead of stripping it from the whole script first.
+GEOLOCATION_RE = re.compile(
+    r"else\s*\{\s*lat_o\s*=\s*'([^']+)'\s*;\s*lng_o\s*=\s*'([^']+)'\s*;\s*\}"
+)
+
+# Original pattern, matched against a script with all whitespace removed
+LEGACY_GEOLOCATION_PATTERN = r"else\s*\{lat_o='([^']+)';lng_o='([^']+)';\}"
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+def find_geolocation(script_contents):
+    """
+    Searches script bodies for the latitude/longitude assignment of the listing.
+
+    Scripts that do not mention lat_o are skipped with a plain substring check, and
+    the search stops at the first match.
+
+    Parameters:
+        script_contents (iterable): The text of each <script> tag, in document order.
+
+    Returns:
+        tuple: (latitude, longitude) as strings, or (None, None) if not found.
+    """
+    for script_content in script_contents:
+        if not script_content or "lat_o" not in script_content:
+            continue
+        match = GEOLOCATION_RE.search(script_content)
+        if match:
+            # The original extractor dropped all whitespace, including inside the values
+            return _WHITESPACE_RE.sub("", match.group(1)), _WHITESPACE_RE.sub("", match.group(2))
+    return None, None
+
+def find_coordinates(script_contents):
+    """
+    Same as find_geolocation, but returns the position as floats.
+
+    Parameters:
+        script_contents (iterable): The text of each <script> tag, in document order.
+
+    Returns:
+        tuple: (latitude, longitude) as floats, or None if not found or not numeric.
+    """
+    lat_o, lng_o = find_geolocation(script_contents)
+    if not lat_o or not lng_o:
+        return None
+    try:
+        return float(lat_o), float(lng_o)
+    except ValueError:
+        return None
+
+def find_geolocation_legacy(script_contents):
+    """
+    The original geolocation loop, kept as the reference for the benchmark below.
+
+    Parameters:
+        script_contents (iterable): The text of each <script> tag, in document order.
+
+    Returns:
+        tuple: (latitude, longitude) as strings, or (None, None) if not found.
+    """
+    for script_content in script_contents:
+        if script_content:
+            # Remove spaces and line breaks to ensure matching
+            script_no_space = re.sub(r'\s+', '', script_content)
+            match = re.findall(LEGACY_GEOLOCATION_PATTERN, script_no_space, re.DOTALL)
+
+            if match:
+                return match[0][0], match[0][1]
+    return None, None
+
+def _page_scripts(path):
+    import lxml.html
+
+    with open(path, 'rb') as f:
+        root = lxml.html.fromstring(f.read())
+    return [script.text for script in root.iter("script")]
+
+if __name__ == '__main__':
+    # Microbenchmark over a directory of saved property pages:
+    #   python geolocation.py saved_pages/ [repeat]
+    page_dir = sys.argv[1]
+    repeat = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    pages = [
+        _page_scripts(os.path.join(page_dir, filename))
+        for filename in sorted(os.listdir(page_dir))
+        if filename.endswith(".html")
+    ]
+
+    mismatches = sum(1 for scripts in pages if find_geolocation(scripts) != find_geolocation_legacy(scripts))
+    print(f"{len(pages)} pages, {mismatches} with a different result")
+
+    for name, extractor in [("legacy", find_geolocation_legacy), ("precompiled", find_geolocation)]:
+        start = time.perf_counter()
+        for _ in range(repeat):
+            for scripts in pages:
+                extractor(scripts)
+        elapsed = time.perf_counter() - start
+        print(f"{name:>12}: {elapsed / (repeat * len(pages)) * 1e6:.1f} us/page")
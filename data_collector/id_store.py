@@ -0,0 +1,351 @@
+import os
+import time
+import struct
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+# File header: magic and number of IDs
+_MAGIC = b"IDS1"
+_HEADER = struct.Struct("<4sI")
+
+# Largest ID an IdSet holds
+_MAX_ID = 0xFFFFFFFF
+
+# Delta files are folded into the base file once there are more than this many
+COMPACT_AFTER = int(os.environ.get("CRAWLER_ID_STORE_COMPACT_AFTER", 30))
+
+# The index of the listings stored for a day is saved after this many new ones
+WRITTEN_SAVE_EVERY = int(os.environ.get("CRAWLER_WRITTEN_INDEX_SAVE_EVERY", 200))
+
+def _as_id(property_id):
+    # A property ID (int or numeric string) as an int, or -1 if it is not a number
+    # that fits in 32 bits, e.g. "abc"; such IDs are never in an IdSet
+    try:
+        value = int(property_id)
+    except (TypeError, ValueError):
+        return -1
+    return value if 0 <= value <= _MAX_ID else -1
+
+def _id_values(ids):
+    # Property IDs as an int64 array, in their order, -1 where _as_id gives -1
+    return np.fromiter((_as_id(i) for i in ids), dtype=np.int64)
+
+def _id_array(ids):
+    # Property IDs as a uint32 array, in their order, without those that cannot be held
+    values = _id_values(ids)
+    valid = values >= 0
+    if not valid.all():
+        logging.warning(f"Skipping {len(values) - int(valid.sum())} property IDs that are not 32-bit numbers")
+        values = values[valid]
+    return values.astype(np.uint32)
+
+def _sorted_unique(values):
+    # Same as np.unique, but a plain sort is much faster on large ID arrays
+    values = np.sort(values)
+    return values[np.concatenate([[True], values[1:] != values[:-1]])] if len(values) else values
+
+class IdSet:
+    """
+    An immutable set of property IDs stored as a sorted NumPy array of 32-bit integers.
+
+    Takes 4 bytes per ID in memory, answers membership by binary search, and
+    serialises to a compact binary format: the sorted IDs are delta-encoded as
+    LEB128 varints, so the typical gap between two listing IDs fits in one or two
+    bytes. Unions, serialisation and lookups of many IDs run in NumPy, without a
+    Python object per ID.
+    """
+
+    def __init__(self, ids=()):
+        """
+        Parameters:
+            ids (iterable): Property IDs, as ints or numeric strings; others are
+                skipped with a warning.
+        """
+        self._ids = _sorted_unique(_id_array(ids))
+
+    @classmethod
+    def _from_sorted(cls, ids):
+        id_set = cls.__new__(cls)
+        id_set._ids = ids
+        return id_set
+
+    def __len__(self):
+        return len(self._ids)
+
+    def __iter__(self):
+        return iter(self._ids.tolist())
+
+    def __contains__(self, property_id):
+        property_id = _as_id(property_id)
+        if property_id < 0:
+            return False
+        i = int(np.searchsorted(self._ids, property_id))
+        return i < len(self._ids) and int(self._ids[i]) == property_id
+
+    def union(self, *others):
+        """
+        Returns a new set with the IDs of this set and of the others.
+
+        Parameters:
+            others (IdSet | iterable): The other IDs.
+
+        Returns:
+            IdSet: The union.
+        """
+        arrays = [other._ids if isinstance(other, IdSet) else _id_array(other) for other in others]
+        return IdSet._from_sorted(_sorted_unique(np.concatenate([self._ids, *arrays])))
+
+    def exclude_from(self, property_ids):
+        """
+        Removes the IDs of this set from a list of IDs.
+
+        Parameters:
+            property_ids (iterable): The IDs to filter.
+
+        Returns:
+            list: The given IDs that are not in this set, in their original order and
+            type; IDs that are not 32-bit numbers are never in it, so they are kept.
+        """
+        property_ids = list(property_ids)
+        values = _id_values(property_ids)
+        keep = (values < 0) | ~np.isin(values, self._ids)
+        return [property_id for property_id, kept in zip(property_ids, keep.tolist()) if kept]
+
+    def to_bytes(self):
+        """
+        Serialises the set.
+
+        Returns:
+            bytes: The header followed by the delta-encoded IDs.
+        """
+        deltas = np.diff(self._ids.astype(np.uint64), prepend=np.uint64(0))
+        # Number of 7-bit groups of every delta, and where its varint starts
+        lengths = 1 + sum((deltas >= np.uint64(1 << (7 * k))).astype(np.int64) for k in range(1, 5))
+        starts = np.cumsum(lengths) - lengths
+        out = np.empty(int(lengths.sum()), dtype=np.uint8)
+        for k in range(5):
+            has = lengths > k
+            group = (deltas[has] >> np.uint64(7 * k)) & np.uint64(0x7F)
+            # Every byte but the last of a varint has the continuation bit set
+            out[starts[has] + k] = group | np.where(lengths[has] > k + 1, np.uint64(0x80), np.uint64(0))
+        return _HEADER.pack(_MAGIC, len(self._ids)) + out.tobytes()
+
+    @classmethod
+    def from_bytes(cls, data):
+        """
+        Reads a set written by to_bytes.
+
+        Parameters:
+            data (bytes): The serialised set.
+
+        Returns:
+            IdSet: The set.
+        """
+        magic, count = _HEADER.unpack_from(data)
+        if magic != _MAGIC:
+            raise ValueError("Not an ID set file")
+        body = np.frombuffer(data, dtype=np.uint8, offset=_HEADER.size)
+        last = body < 0x80
+        ends = np.flatnonzero(last)
+        if len(ends) != count or (len(body) and not last[-1]):
+            raise ValueError(f"ID set file is truncated ({len(ends)} of {count} IDs)")
+        if count == 0:
+            return cls()
+        starts = np.concatenate([[0], ends[:-1] + 1])
+        # Varint of every byte, and its position in the varint
+        varint = np.concatenate([[0], np.cumsum(last[:-1])])
+        shifts = (7 * (np.arange(len(body)) - starts[varint])).astype(np.uint64)
+        groups = (body & 0x7F).astype(np.uint64) << shifts
+        ids = np.cumsum(np.add.reduceat(groups, starts))
+        if ids[-1] > _MAX_ID:
+            raise ValueError("ID set file holds IDs above 32 bits")
+        return cls._from_sorted(ids.astype(np.uint32))
+
+    @classmethod
+    def from_text(cls, text):
+        """
+        Reads the legacy newline-separated ID list, skipping non-numeric lines.
+
+        Parameters:
+            text (str): One property ID per line.
+
+        Returns:
+            IdSet: The set.
+        """
+        return cls(line for line in (line.strip() for line in text.splitlines()) if line.isdigit())
+
+class IdStore:
+    """
+    A growing set of property IDs persisted as a base file plus small delta files.
+
+    Adding IDs writes only the new ones, as a delta file <name>-deltas/<timestamp>.ids,
+    instead of rewriting the whole set. Once more than COMPACT_AFTER deltas exist
+    they are merged into the base file <name>.ids. A legacy <name>.txt is imported
+    the first time the store is read.
+    """
+
+    def __init__(self, storage, name="completed"):
+        """
+        Parameters:
+            storage (Storage): Where the files live.
+            name (str): Name of the set, used as the file prefix.
+        """
+        self.storage = storage
+        self.base_key = f"{name}.ids"
+        self.delta_prefix = f"{name}-deltas/"
+        self.legacy_key = f"{name}.txt"
+
+    def _delta_keys(self):
+        return sorted(key for key in self.storage.list(self.delta_prefix) if key.endswith(".ids"))
+
+    def load(self):
+        """
+        Reads the whole set: the base file and every delta.
+
+        Returns:
+            IdSet: The IDs.
+        """
+        data = self.storage.get(self.base_key)
+        if data is not None:
+            ids = IdSet.from_bytes(data)
+        else:
+            legacy = self.storage.get(self.legacy_key)
+            ids = IdSet.from_text(legacy.decode('utf-8')) if legacy is not None else IdSet()
+            if legacy is not None:
+                logging.info(f"Imported {len(ids)} IDs from {self.legacy_key}.")
+                self.storage.put(self.base_key, ids.to_bytes())
+
+        deltas = [IdSet.from_bytes(self.storage.get(key)) for key in self._delta_keys()]
+        return ids.union(*deltas) if deltas else ids
+
+    def add(self, property_ids):
+        """
+        Persists new IDs as a delta file, compacting the deltas when there are too many.
+
+        Parameters:
+            property_ids (iterable): The IDs to add.
+
+        Returns:
+            None
+        """
+        delta = IdSet(property_ids)
+        if len(delta) == 0:
+            return
+        self.storage.put(f"{self.delta_prefix}{time.time_ns()}.ids", delta.to_bytes())
+        if len(self._delta_keys()) > COMPACT_AFTER:
+            self.compact()
+
+    def compact(self):
+        """
+        Folds every delta file into the base file.
+
+        Returns:
+            IdSet: The IDs.
+        """
+        delta_keys = self._delta_keys()
+        ids = self.load()
+        self.storage.put(self.base_key, ids.to_bytes())
+        for key in delta_keys:
+            self.storage.delete(key)
+        logging.info(f"Compacted {len(delta_keys)} delta files into {self.base_key} ({len(ids)} IDs).")
+        return ids
+
+class WrittenIds:
+    """
+    Index of the listings already stored for a day, kept as a single small object.
+
+    IDs are added as their uploads complete and the whole set is saved every
+    save_every additions (and on save()), so finding out what is already done is
+    one read instead of a listing of every object written that day.
+    """
+
+    def __init__(self, storage, key, save_every=WRITTEN_SAVE_EVERY):
+        """
+        Parameters:
+            storage (Storage): Where the index lives.
+            key (str): The key of the index, e.g. "written/2024-11-20.ids".
+            save_every (int): Number of additions between two saves.
+        """
+        self.storage = storage
+        self.key = key
+        self.save_every = save_every
+        self._lock = threading.Lock()
+        self._unsaved = 0
+        data = storage.get(key)
+        self.found = data is not None
+        self._ids = set(IdSet.from_bytes(data)) if data is not None else set()
+
+    def ids(self):
+        """
+        Returns every ID added so far, including those found in the saved index.
+
+        Returns:
+            set: The property IDs, as strings.
+        """
+        with self._lock:
+            return {str(property_id) for property_id in self._ids}
+
+    def add(self, property_id):
+        """
+        Records a stored listing, saving the index every save_every additions.
+
+        Parameters:
+            property_id (str): The ID of the property.
+
+        Returns:
+            None
+        """
+        if _as_id(property_id) < 0:
+            logging.warning(f"Not recording property ID {property_id!r}: it is not a 32-bit number")
+            return
+        with self._lock:
+            self._ids.add(_as_id(property_id))
+            self._unsaved += 1
+            if self._unsaved >= self.save_every:
+                self._save()
+
+    def save(self):
+        """
+        Writes the index if anything was added since it was last saved.
+
+        Returns:
+            None
+        """
+        with self._lock:
+            if self._unsaved:
+                self._save()
+
+    def _save(self):
+        # The caller holds the lock
+        self.storage.put(self.key, IdSet(self._ids).to_bytes())
+        self._unsaved = 0
+
+def list_ids(storage, prefix, suffix=".json", max_workers=10):
+    """
+    Lists the IDs of the objects named <prefix><id><suffix>.
+
+    Property IDs are numeric, so the listing is split into one prefix per leading
+    digit and the ten listings run in parallel.
+
+    Parameters:
+        storage (Storage): Where the objects live.
+        prefix (str): The common key prefix, e.g. "json-files/2024-11-20/".
+        suffix (str): The extension of the objects.
+        max_workers (int): Number of listings run at once.
+
+    Returns:
+        set: The property IDs, as strings.
+    """
+    with ThreadPoolExecutor(max_workers) as pool:
+        listings = list(pool.map(lambda digit: storage.list(f"{prefix}{digit}"), "0123456789"))
+
+    ids = set()
+    for keys in listings:
+        for key in keys:
+            name = key[len(prefix):]
+            if name.endswith(suffix) and name[:-len(suffix)].isdigit():
+                ids.add(name[:-len(suffix)])
+    return ids
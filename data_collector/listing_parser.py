@@ -0,0 +1,380 @@
+import os
+import re
+import sys
+import logging
+
+from bs4 import BeautifulSoup
+from bs4.dammit import UnicodeDammit
+
+from geolocation import find_geolocation
+
+try:
+    import lxml.etree
+    import lxml.html
+except ImportError:
+    lxml = None
+
+# Which extractor extract_property_data uses: "lxml" (default when installed) or "bs4"
+PARSER_ENGINE = os.environ.get("CRAWLER_PARSER_ENGINE", "lxml" if lxml else "bs4")
+
+def to_snake_case(s):
+    """
+    Converts a given string to snake_case.
+
+    Parameters:
+        s (str): The string to convert.
+
+    Returns:
+        str: The converted snake_case string.
+    """
+    s = s.strip()
+    # Replace special characters with spaces
+    s = re.sub(r'[\s\-]+', ' ', s)
+    # Remove any character that is not alphanumeric or space
+    s = re.sub(r'[^A-Za-z0-9 ]+', '', s)
+    # Convert to lowercase
+    s = s.lower()
+    # Replace spaces with underscores
+    s = s.replace(' ', '_')
+    return s
+
+def extract_estate_info(soup):
+    """
+    Extracts the estate entry date or building age (if available) from a BeautifulSoup object.
+
+    Parameters:
+        soup (BeautifulSoup): A BeautifulSoup object containing the parsed HTML of the 28hse property page.
+
+    Returns:
+        dict: A dictionary containing the estate entry date and/or building age, if available.
+    """
+    # Extracting the estate entry date
+    entry_date_tag = soup.find("td", string="Estate Entry Date")
+
+    # Extracting the building age from the specified div
+    building_age_div = soup.find("div", class_="pairSubValue", string=lambda x: x and "Building age" in x)
+
+    # Initialize data dictionary
+    data = {}
+
+    # Check and add entry date if available
+    if entry_date_tag:
+        entry_date = entry_date_tag.find_next_sibling("td").get_text(strip=True)
+        if entry_date:
+            data["estate_entry_date"] = entry_date
+
+    # Check and add building age if available
+    if building_age_div:
+        building_age = building_age_div.get_text(strip=True).replace("Building age: ", "")
+        if building_age:
+            data["building_age"] = building_age
+
+    return data
+
+def transactions_data(soup):
+    """
+    Extracts transaction data from the property page.
+
+    Parameters:
+        soup (BeautifulSoup): A BeautifulSoup object containing the parsed HTML of the 28hse property page.
+
+    Returns:
+        dict: A dictionary containing a list of transactions with details such as header, size, rental, date, etc.
+    """
+    transactions = []
+
+    # Find the main container holding the transactions
+    transaction_elements = soup.find_all('div', class_='mobile_alt latest_3months_or_landreg_result')
+
+    for element in transaction_elements:
+        # Find individual content inside each transaction block
+        content_elements = element.find_all('div', class_='content')
+
+        for content in content_elements:
+            transaction = {}
+
+            # Extract the relevant parts of the transaction
+            header = content.find('div', class_='header')
+            description = content.find('div', class_='description')
+            rental_price = content.find('div', class_='transaction_detail_price_rent')
+            extra = content.find_all('div', class_="extra")
+            logging.debug(extra[0])
+            extra = extra[0].find_all('div', class_="ui label")
+            logging.debug(extra)
+
+            transaction['header'] = header.get_text(strip=True) if header else 'N/A'
+            transaction['size'] = description.get_text(strip=True) if description else 'N/A'
+            transaction['rental'] = rental_price.get_text(strip=True) if rental_price else 'N/A'
+            if len(extra) != 0:
+                transaction['date'] = extra[0].get_text(strip=True) if extra[0] else 'N/A'
+                transaction['source'] = extra[1].get_text(strip=True) if extra[1] else 'N/A'
+                transaction['number_of_rooms'] = extra[2].get_text(strip=True) if extra[2] else 'N/A'
+
+            # Convert transaction keys to snake_case
+            transaction = {to_snake_case(k): v for k, v in transaction.items()}
+
+            transactions.append(transaction)
+    return {"transactions": transactions}
+
+def extract_property_data_bs4(content):
+    """
+    Extracts the listing data from a property page with BeautifulSoup.
+
+    This is the original extractor; extract_property_data_lxml must produce the
+    same output.
+
+    Parameters:
+        content (bytes): The HTML of the 28hse property page.
+
+    Returns:
+        dict: The listing data, or None if the page is not a valid property.
+    """
+    data = {}
+    soup = BeautifulSoup(content, 'html.parser')
+    title_and_description = soup.find_all(class_="ui large message")
+    if len(title_and_description) == 0:
+        return None
+
+    # Find the header
+    header = title_and_description[0].find('div', class_='header')
+    description = title_and_description[0].find(id='desc_normal')
+
+    # Get the text from the header
+    header_text = header.get_text(separator=" ", strip=True)
+    description_text = description.get_text(separator=" ", strip=True)
+    data.update({"title": header_text})
+    data.update({"description": description_text})
+
+    # Extract the <script> content where lat/lng might be
+    lat_o, lng_o = find_geolocation(script.string for script in soup.find_all('script'))
+    if not lat_o or not lng_o:
+        logging.warning("No Geolocation Data")
+
+    # Exclude script from soup content
+    for script in soup.find_all('script'):
+        script.extract()
+
+    # Extract relevant property data
+    main_table = soup.find_all(class_="tablePair")
+
+    for table in main_table:
+        # Extract data from each table pair
+        left = table.find_all(class_='table_left')
+        right = table.find_all(class_='table_right')
+
+        left_list = [i.get_text(strip=True) for i in left]
+        right_list = [i.get_text(strip=True) for i in right]
+
+        # Convert keys to snake_case
+        left_list = [to_snake_case(key) for key in left_list]
+
+        # Add to the main data dictionary
+        data.update(dict(zip(left_list, right_list)))
+
+    # Add latitude and longitude to the data
+    if lat_o and lng_o:
+        data['latitude'] = lat_o
+        data['longitude'] = lng_o
+
+    # transaction = transactions_data(soup)
+    # data.update(transaction)
+    building_age = extract_estate_info(soup)
+    if len(building_age) != 0:
+        data.update(building_age)
+    return data
+
+# Tags whose text BeautifulSoup's get_text() leaves out
+_NON_TEXT_TAGS = {"script", "style", "template", "rt", "rp"}
+
+def _classes(element):
+    return element.get("class", "").split()
+
+def _has_class(element, class_name):
+    # Same rule as BeautifulSoup's class_ filter: a single class, or the whole attribute
+    classes = _classes(element)
+    return class_name in classes or " ".join(classes) == class_name
+
+def _strings(element):
+    """Yields the text nodes under an element that BeautifulSoup's get_text() would return."""
+    if element.text:
+        yield element.text
+    for child in element:
+        if isinstance(child.tag, str) and child.tag not in _NON_TEXT_TAGS:
+            yield from _strings(child)
+        if child.tail:
+            yield child.tail
+
+def _get_text(element, separator=""):
+    # Equivalent of BeautifulSoup's get_text(separator, strip=True)
+    return separator.join(s.strip() for s in _strings(element) if s.strip())
+
+def _string(element):
+    """Equivalent of BeautifulSoup's .string: the text of an element with a single child."""
+    children = len(element) + (1 if element.text else 0) + sum(1 for child in element if child.tail)
+    if children != 1:
+        return None
+    if element.text:
+        return element.text
+    child = element[0]
+    if not isinstance(child.tag, str):
+        return child.text
+    return _string(child)
+
+def extract_property_data_lxml(content):
+    """
+    Extracts the listing data from a property page with lxml in a single pass over the tree.
+
+    Produces the same output as extract_property_data_bs4 while walking the document
+    once to collect the title block, scripts, tablePair rows and estate info.
+
+    Parameters:
+        content (bytes): The HTML of the 28hse property page.
+
+    Returns:
+        dict: The listing data, or None if the page is not a valid property.
+    """
+    if isinstance(content, bytes):
+        # lxml assumes Latin-1 without a charset declaration; 28hse serves UTF-8
+        try:
+            content = content.decode("utf-8")
+        except UnicodeDecodeError:
+            content = UnicodeDammit(content, is_html=True).unicode_markup
+    if not content.strip():
+        return None
+    try:
+        root = lxml.html.fromstring(content)
+    except lxml.etree.ParserError:
+        # e.g. a page holding only a comment: there is no element to parse
+        return None
+
+    message = None
+    scripts = []
+    tables = []
+    entry_date_tag = None
+    building_age_div = None
+
+    for element in root.iter():
+        tag = element.tag
+        if not isinstance(tag, str):
+            continue
+        if tag == "script":
+            scripts.append(element.text)
+            continue
+        if "class" in element.attrib:
+            if message is None and " ".join(_classes(element)) == "ui large message":
+                message = element
+            if _has_class(element, "tablePair"):
+                tables.append(element)
+            if building_age_div is None and tag == "div" and _has_class(element, "pairSubValue"):
+                string = _string(element)
+                if string and "Building age" in string:
+                    building_age_div = element
+        if entry_date_tag is None and tag == "td" and _string(element) == "Estate Entry Date":
+            entry_date_tag = element
+
+    if message is None:
+        return None
+
+    data = {}
+
+    # Find the header and description
+    header = next((e for e in message.iterdescendants("div") if _has_class(e, "header")), None)
+    description = next((e for e in message.iterdescendants() if e.get("id") == "desc_normal"), None)
+    data["title"] = _get_text(header, " ")
+    data["description"] = _get_text(description, " ")
+
+    lat_o, lng_o = find_geolocation(scripts)
+    if not lat_o or not lng_o:
+        logging.warning("No Geolocation Data")
+
+    for table in tables:
+        left_list = []
+        right_list = []
+        for element in table.iterdescendants():
+            if not isinstance(element.tag, str) or "class" not in element.attrib:
+                continue
+            if _has_class(element, "table_left"):
+                left_list.append(to_snake_case(_get_text(element)))
+            if _has_class(element, "table_right"):
+                right_list.append(_get_text(element))
+        data.update(dict(zip(left_list, right_list)))
+
+    if lat_o and lng_o:
+        data['latitude'] = lat_o
+        data['longitude'] = lng_o
+
+    if entry_date_tag is not None:
+        entry_date = _get_text(next(entry_date_tag.itersiblings("td")))
+        if entry_date:
+            data["estate_entry_date"] = entry_date
+    if building_age_div is not None:
+        building_age = _get_text(building_age_div).replace("Building age: ", "")
+        if building_age:
+            data["building_age"] = building_age
+    return data
+
+def extract_property_data(content):
+    """
+    Extracts the listing data from a property page with the configured PARSER_ENGINE.
+
+    Parameters:
+        content (bytes): The HTML of the 28hse property page.
+
+    Returns:
+        dict: The listing data, or None if the page is not a valid property.
+    """
+    if PARSER_ENGINE == "lxml":
+        return extract_property_data_lxml(content)
+    return extract_property_data_bs4(content)
+
+def parse_property_page(property_id, content):
+    """
+    Extracts the listing data of a property, logging pages that are not valid listings.
+
+    This is the parse stage of the crawl pipeline and runs in a worker process.
+
+    Parameters:
+        property_id (str): The ID of the property.
+        content (bytes): The HTML of the 28hse property page.
+
+    Returns:
+        dict: The listing data, or None if the page is not a valid property.
+    """
+    data = extract_property_data(content)
+    if data is None:
+        logging.warning(f"Not a valid property ID, ID: {property_id}")
+    return data
+
+def compare_extractors(content):
+    """
+    Runs both extractors on a page and reports where their output differs.
+
+    Parameters:
+        content (bytes): The HTML of the 28hse property page.
+
+    Returns:
+        dict: {key: (bs4 value, lxml value)} for every differing key; empty when identical.
+    """
+    expected = extract_property_data_bs4(content)
+    actual = extract_property_data_lxml(content)
+    if expected is None or actual is None:
+        return {} if expected is actual else {None: (expected, actual)}
+    keys = list(expected) + [k for k in actual if k not in expected]
+    return {k: (expected.get(k), actual.get(k)) for k in keys if expected.get(k) != actual.get(k)}
+
+if __name__ == '__main__':
+    # Parity check over a directory of saved property pages, e.g. pages kept by the
+    # page cache; the pages in test_pages/ are checked by test_listing_parser.py:
+    #   python listing_parser.py saved_pages/
+    page_dir = sys.argv[1]
+    mismatches = 0
+    for filename in sorted(os.listdir(page_dir)):
+        if not filename.endswith(".html"):
+            continue
+        with open(os.path.join(page_dir, filename), 'rb') as f:
+            diff = compare_extractors(f.read())
+        if diff:
+            mismatches += 1
+            print(f"{filename}: {diff}")
+    print(f"{mismatches} page(s) differ.")
+    sys.exit(1 if mismatches else 0)
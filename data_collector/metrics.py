@@ -0,0 +1,272 @@
+import os
+import time
+import bisect
+import threading
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Port serving the metrics in the Prometheus text format at /metrics; 0 disables it
+METRICS_PORT = int(os.environ.get("CRAWLER_METRICS_PORT", 0))
+
+# File the metrics are written to in the Prometheus text format at the end of a run
+# (e.g. for the node_exporter textfile collector); empty disables it
+METRICS_PATH = os.environ.get("CRAWLER_METRICS_PATH", "")
+
+# Upper bounds in seconds of the latency histogram buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+# Prefix of every metric name in the Prometheus output
+PREFIX = "crawler_"
+
+class Histogram:
+    """
+    Counts observations into fixed buckets, as a Prometheus histogram does.
+
+    Percentiles are estimated from the buckets by linear interpolation, so they are
+    only as precise as the bucket bounds; the exact maximum is kept as well.
+    """
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        """
+        Parameters:
+            buckets (tuple): Sorted upper bounds of the buckets; a last, unbounded one is added.
+        """
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        """
+        Records an observation.
+
+        Parameters:
+            value (float): The observed value, e.g. seconds.
+
+        Returns:
+            None
+        """
+        with self._lock:
+            self.counts[bisect.bisect_left(self.buckets, value)] += 1
+            self.count += 1
+            self.sum += value
+            self.max = max(self.max, value)
+
+    def percentile(self, q):
+        """
+        Estimates a percentile of the observations.
+
+        Parameters:
+            q (float): The percentile, between 0 and 100.
+
+        Returns:
+            float: The estimate, or None if nothing was observed.
+        """
+        with self._lock:
+            if not self.count:
+                return None
+            rank = q / 100 * self.count
+            seen = 0
+            for i, bucket_count in enumerate(self.counts):
+                if bucket_count and seen + bucket_count >= rank:
+                    lower = self.buckets[i - 1] if i > 0 else 0.0
+                    upper = self.buckets[i] if i < len(self.buckets) else self.max
+                    return min(lower + (upper - lower) * (rank - seen) / bucket_count, self.max)
+                seen += bucket_count
+            return self.max
+
+    def summary(self):
+        """
+        Returns the count, sum, mean, estimated p50/p90/p99 and maximum.
+
+        Returns:
+            dict: The statistics, rounded to the microsecond.
+        """
+        stats = {"count": self.count, "sum": self.sum, "mean": self.sum / self.count if self.count else None}
+        for q in (50, 90, 99):
+            stats[f"p{q}"] = self.percentile(q)
+        stats["max"] = self.max
+        return {key: round(value, 6) if isinstance(value, float) else value for key, value in stats.items()}
+
+# Metrics of this process by (name, labels), created lazily
+_counters = {}
+_histograms = {}
+_metrics_lock = threading.Lock()
+
+# When this process started recording, for rates
+_started_at = time.time()
+
+def _key(name, labels):
+    return name, tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+def count(name, amount=1, **labels):
+    """
+    Adds to a counter.
+
+    Parameters:
+        name (str): The counter, e.g. "http_retries_total".
+        amount (float): How much to add.
+        **labels: Labels telling apart the series of the counter, e.g. cause="HTTP 503".
+
+    Returns:
+        None
+    """
+    key = _key(name, labels)
+    with _metrics_lock:
+        _counters[key] = _counters.get(key, 0) + amount
+
+def observe(name, value, **labels):
+    """
+    Records an observation in a histogram.
+
+    Parameters:
+        name (str): The histogram, e.g. "stage_seconds".
+        value (float): The observed value.
+        **labels: Labels telling apart the series of the histogram, e.g. stage="fetch".
+
+    Returns:
+        None
+    """
+    key = _key(name, labels)
+    with _metrics_lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = Histogram()
+            _histograms[key] = histogram
+    histogram.observe(value)
+
+@contextmanager
+def timed(stage):
+    """
+    Records how long the enclosed block takes in the stage_seconds histogram,
+    whether it returns or raises.
+
+    Parameters:
+        stage (str): The pipeline stage, e.g. "fetch", "parse" or "upload".
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe("stage_seconds", time.perf_counter() - started, stage=stage)
+
+def _format_labels(labels, extra=()):
+    labels = tuple(labels) + tuple(extra)
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{value}"' for key, value in labels) + "}"
+
+def render_prometheus():
+    """
+    Renders every metric in the Prometheus text exposition format.
+
+    Returns:
+        str: The exposition, one sample per line.
+    """
+    with _metrics_lock:
+        counters = sorted(_counters.items())
+        histograms = sorted(_histograms.items(), key=lambda item: item[0])
+
+    lines = []
+    typed = set()
+    for (name, labels), value in counters:
+        if name not in typed:
+            lines.append(f"# TYPE {PREFIX}{name} counter")
+            typed.add(name)
+        lines.append(f"{PREFIX}{name}{_format_labels(labels)} {value}")
+    for (name, labels), histogram in histograms:
+        if name not in typed:
+            lines.append(f"# TYPE {PREFIX}{name} histogram")
+            typed.add(name)
+        with histogram._lock:
+            cumulative = 0
+            for bound, bucket_count in zip(histogram.buckets + ("+Inf",), histogram.counts):
+                cumulative += bucket_count
+                lines.append(f"{PREFIX}{name}_bucket{_format_labels(labels, [('le', bound)])} {cumulative}")
+            lines.append(f"{PREFIX}{name}_sum{_format_labels(labels)} {histogram.sum}")
+            lines.append(f"{PREFIX}{name}_count{_format_labels(labels)} {histogram.count}")
+    return "\n".join(lines) + "\n"
+
+def summary():
+    """
+    Summarises the metrics of the run so far, for the JSON report of a run.
+
+    Returns:
+        dict: elapsed_seconds; counters, as {name: total} for unlabelled counters
+        and {name: {labels: total}} otherwise; histograms, as {name: {labels: stats}}
+        (see Histogram.summary); and per_second, the rate of every counter total
+        over the elapsed time.
+    """
+    elapsed = time.time() - _started_at
+    with _metrics_lock:
+        counters = dict(_counters)
+        histograms = dict(_histograms)
+
+    report = {"elapsed_seconds": round(elapsed, 3), "counters": {}, "histograms": {}, "per_second": {}}
+    totals = {}
+    for (name, labels), value in sorted(counters.items()):
+        totals[name] = totals.get(name, 0) + value
+        if labels:
+            report["counters"].setdefault(name, {})[",".join(f"{k}={v}" for k, v in labels)] = value
+        else:
+            report["counters"][name] = value
+    for (name, labels), histogram in sorted(histograms.items(), key=lambda item: item[0]):
+        label = ",".join(f"{k}={v}" for k, v in labels) or "all"
+        report["histograms"].setdefault(name, {})[label] = histogram.summary()
+    for name, total in totals.items():
+        report["per_second"][name] = round(total / elapsed, 3) if elapsed > 0 else None
+    return report
+
+def write_prometheus(path=METRICS_PATH):
+    """
+    Writes the Prometheus exposition to a file, atomically so a collector never reads half of it.
+
+    Parameters:
+        path (str): The file; nothing is written if empty.
+
+    Returns:
+        None
+    """
+    if not path:
+        return
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        f.write(render_prometheus())
+    os.replace(tmp_path, path)
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path != "/metrics":
+            self.send_error(404)
+            return
+        body = render_prometheus().encode('utf-8')
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Scrapes are not worth a line in the crawl log
+        pass
+
+# Server of the /metrics endpoint, started on first use
+_server = None
+
+def start_http_server(port=METRICS_PORT):
+    """
+    Serves the metrics at http://<host>:<port>/metrics on a background thread.
+
+    Parameters:
+        port (int): The port; nothing is started if 0 or if the server already runs.
+
+    Returns:
+        None
+    """
+    global _server
+    if not port or _server is not None:
+        return
+    _server = ThreadingHTTPServer(("", port), _MetricsHandler)
+    threading.Thread(target=_server.serve_forever, daemon=True).start()
@@ -0,0 +1,209 @@
+import sys
+import json
+import gzip
+
+import numpy as np
+import pandas as pd
+
+# Raw fields each typed field is read from, first one present wins
+RENT_FIELDS = ("rent", "rental", "monthly_rent")
+SALEABLE_AREA_FIELDS = ("saleable_area", "saleable_area_ft")
+GROSS_AREA_FIELDS = ("gross_area", "gross_area_ft")
+
+# Typed fields added by normalize_records, with their column type (see snapshot_sink.infer_schema)
+TYPED_FIELDS = {
+    "rent_hkd": "float64",
+    "saleable_area_sqft": "float64",
+    "gross_area_sqft": "float64",
+    "floor_zone": "string",
+    "floor_number": "float64",
+    "building_age_years": "float64",
+    "estate_entry_month": "date",
+    "latitude": "float64",
+    "longitude": "float64",
+}
+
+# Square feet in a square metre
+SQFT_PER_SQM = 10.7639
+
+# Number followed by an optional thousands/ten thousands suffix, e.g. "18,000", "1.8萬", "18K"
+_NUMBER_RE = r"(\d+(?:\.\d+)?)\s*([kK萬万]?)"
+_MULTIPLIERS = {"": 1, "k": 1e3, "K": 1e3, "萬": 1e4, "万": 1e4}
+
+# Areas given in square metres rather than square feet
+_SQM_RE = r"m²|m2\b|sq\.?\s*m\b|平方米"
+
+# "High Floor", "中層", ... and "12/F"
+_FLOOR_ZONES = {
+    "low": "low", "lower": "low", "低": "low",
+    "middle": "middle", "mid": "middle", "中": "middle",
+    "high": "high", "upper": "high", "高": "high",
+}
+_FLOOR_ZONE_RE = r"(?i)\b(low|lower|middle|mid|high|upper)\b|([低中高])層"
+_FLOOR_NUMBER_RE = r"(?i)(\d+)\s*/?\s*(?:f\b|樓)"
+
+# "2001-05", "2001/5/12", "05/2001"
+_YEAR_MONTH_RE = r"(\d{4})[-/.年](\d{1,2})"
+_MONTH_YEAR_RE = r"\b(\d{1,2})[-/.](\d{4})\b"
+
+def _column(frame, fields):
+    # The first of the fields present, as strings; all missing if none is
+    for field in fields:
+        if field in frame:
+            return frame[field].astype("string")
+    return pd.Series(pd.NA, index=frame.index, dtype="string")
+
+def parse_numbers(values):
+    """
+    Reads the first number out of every string, honouring K and 萬 suffixes.
+
+    Parameters:
+        values (pd.Series): Raw strings, e.g. "HK$ 18,000/month".
+
+    Returns:
+        pd.Series: float64 values, NaN where there is no number.
+    """
+    parts = values.astype("string").str.replace(",", "", regex=False).str.extract(_NUMBER_RE)
+    numbers = pd.to_numeric(parts[0], errors="coerce").astype("float64")
+    multipliers = parts[1].fillna("").map(_MULTIPLIERS).astype("float64").fillna(1.0)
+    return numbers * multipliers
+
+def parse_areas(values):
+    """
+    Converts areas to square feet.
+
+    Parameters:
+        values (pd.Series): Raw strings, e.g. "450 ft²" or "41.8 m²".
+
+    Returns:
+        pd.Series: float64 square feet, NaN where there is no number.
+    """
+    values = values.astype("string")
+    areas = parse_numbers(values)
+    in_sqm = values.str.contains(_SQM_RE, regex=True).fillna(False).astype(bool)
+    return areas.where(~in_sqm, areas * SQFT_PER_SQM)
+
+def parse_floor_zones(values):
+    """
+    Reads the floor zone out of floor descriptions.
+
+    Parameters:
+        values (pd.Series): Raw strings, e.g. "Middle Floor" or "中層".
+
+    Returns:
+        pd.Series: "low", "middle" or "high", missing where unknown.
+    """
+    zones = values.astype("string").str.extract(_FLOOR_ZONE_RE)
+    return zones[0].str.lower().fillna(zones[1]).map(_FLOOR_ZONES).astype("string")
+
+def parse_floor_numbers(values):
+    """
+    Reads the floor number out of floor descriptions, when one is given.
+
+    Parameters:
+        values (pd.Series): Raw strings, e.g. "12/F".
+
+    Returns:
+        pd.Series: float64 floor numbers, NaN where there is none.
+    """
+    return pd.to_numeric(values.astype("string").str.extract(_FLOOR_NUMBER_RE)[0], errors="coerce").astype("float64")
+
+def parse_year_months(values):
+    """
+    Reads year-month dates, as the site gives estate entry dates.
+
+    Parameters:
+        values (pd.Series): Raw strings, e.g. "2001-05", "2001/5/12" or "05/2001".
+
+    Returns:
+        pd.Series: datetime64 values on the first of the month, NaT where unknown.
+    """
+    values = values.astype("string")
+    year_month = values.str.extract(_YEAR_MONTH_RE)
+    month_year = values.str.extract(_MONTH_YEAR_RE)
+    years = pd.to_numeric(year_month[0].fillna(month_year[1]), errors="coerce").astype("float64")
+    months = pd.to_numeric(year_month[1].fillna(month_year[0]), errors="coerce").astype("float64")
+    valid = months.between(1, 12)
+    return pd.to_datetime(
+        pd.DataFrame({"year": years.where(valid), "month": months.where(valid), "day": 1}),
+        errors="coerce",
+    )
+
+def _by_unique(parse, values):
+    # Listings share most raw values (floors, entry dates, ages, round rents), so
+    # parse each distinct value once and spread the results back
+    codes, uniques = pd.factorize(values)
+    parsed = parse(pd.Series(uniques, dtype="string"))
+    return pd.Series(parsed.array.take(codes, allow_fill=True), index=values.index)
+
+def normalize_frame(frame):
+    """
+    Derives typed columns from the raw listing fields, one vectorised pass per column
+    over the distinct raw values.
+
+    Parameters:
+        frame (pd.DataFrame): Raw listings, one row per listing and one column per snake_case key.
+
+    Returns:
+        pd.DataFrame: rent_hkd, saleable_area_sqft, gross_area_sqft, floor_zone,
+        floor_number, building_age_years, estate_entry_month (datetime64),
+        latitude and longitude (float64), on the same index.
+    """
+    typed = pd.DataFrame(index=frame.index)
+    typed["rent_hkd"] = _by_unique(parse_numbers, _column(frame, RENT_FIELDS))
+    typed["saleable_area_sqft"] = _by_unique(parse_areas, _column(frame, SALEABLE_AREA_FIELDS))
+    typed["gross_area_sqft"] = _by_unique(parse_areas, _column(frame, GROSS_AREA_FIELDS))
+    floors = _column(frame, ("floor",))
+    typed["floor_zone"] = _by_unique(parse_floor_zones, floors)
+    typed["floor_number"] = _by_unique(parse_floor_numbers, floors)
+    typed["building_age_years"] = _by_unique(parse_numbers, _column(frame, ("building_age",)))
+    typed["estate_entry_month"] = _by_unique(parse_year_months, _column(frame, ("estate_entry_date",)))
+    for field in ("latitude", "longitude"):
+        typed[field] = pd.to_numeric(_column(frame, (field,)), errors="coerce").astype("float64")
+    return typed
+
+def normalize_records(records):
+    """
+    Adds the typed fields of normalize_frame to a batch of listings.
+
+    Raw fields are kept as they are, except latitude and longitude, which become
+    floats. estate_entry_month is a datetime.date. Typed fields that could not be
+    parsed are set to None.
+
+    Parameters:
+        records (list): The listing dicts; updated in place.
+
+    Returns:
+        list: The same listings.
+    """
+    if not records:
+        return records
+    sources = RENT_FIELDS + SALEABLE_AREA_FIELDS + GROSS_AREA_FIELDS + (
+        "floor", "building_age", "estate_entry_date", "latitude", "longitude")
+    frame = pd.DataFrame({
+        field: [record.get(field) for record in records]
+        for field in sources if any(field in record for record in records)
+    }, index=range(len(records)))
+    typed = normalize_frame(frame)
+
+    # Back to plain Python values, with None for anything missing
+    columns = {}
+    for field in typed.columns:
+        column = typed[field]
+        if field == "estate_entry_month":
+            column = column.dt.date
+        columns[field] = column.astype(object).where(column.notna(), None).tolist()
+    for i, record in enumerate(records):
+        for field, values in columns.items():
+            record[field] = values[i]
+    return records
+
+if __name__ == '__main__':
+    # Report how many values of a snapshot part could be typed:
+    #   python normalize.py housing_data/snapshots/2024-11-20/part-00000.jsonl.gz
+    with gzip.open(sys.argv[1], 'rt', encoding='utf-8') as f:
+        frame = pd.DataFrame([json.loads(line) for line in f])
+    typed = normalize_frame(frame)
+    for field in typed.columns:
+        print(f"{field:20} {typed[field].notna().sum():>7} / {len(typed)}  e.g. {typed[field].dropna().head(3).tolist()}")
+    print(np.round(typed.describe(), 2))
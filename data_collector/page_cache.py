@@ -0,0 +1,227 @@
+import os
+import sys
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+
+# Directory holding the cached pages; an empty value disables the cache
+CACHE_DIR = os.environ.get("CRAWLER_CACHE_DIR", "page_cache")
+
+# Cached pages younger than this are served without touching the network
+CACHE_TTL = float(os.environ.get("CRAWLER_CACHE_TTL", 20 * 60 * 60))
+
+# Least recently used pages are evicted above this size
+CACHE_MAX_BYTES = int(os.environ.get("CRAWLER_CACHE_MAX_BYTES", 2 * 1024 ** 3))
+
+# Serve every page from the cache and never touch the network
+OFFLINE = os.environ.get("CRAWLER_OFFLINE", "0") == "1"
+
+class PageCache:
+    """
+    On-disk cache of raw pages, keyed by property ID and stored by content hash.
+
+    Page bodies are written once under blobs/<sha256>, so identical pages share a
+    file, and an SQLite index maps every property ID to its blob together with the
+    ETag/Last-Modified validators needed for conditional re-fetches. When the cache
+    grows beyond max_bytes the least recently used pages are evicted.
+    """
+
+    def __init__(self, directory, max_bytes=CACHE_MAX_BYTES, ttl=CACHE_TTL):
+        """
+        Parameters:
+            directory (str): Where the cache lives; created if missing.
+            max_bytes (int): Size above which pages are evicted.
+            ttl (float): Age in seconds under which a page is considered fresh.
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        os.makedirs(os.path.join(directory, "blobs"), exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(os.path.join(directory, "index.sqlite"), check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS pages ("
+            " key TEXT PRIMARY KEY, sha256 TEXT NOT NULL, size INTEGER NOT NULL,"
+            " etag TEXT, last_modified TEXT, fetched_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS pages_accessed_at ON pages (accessed_at)")
+        self._db.commit()
+        self._size = self._db.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM (SELECT DISTINCT sha256, size FROM pages)"
+        ).fetchone()[0]
+
+    def _blob_path(self, sha256):
+        return os.path.join(self.directory, "blobs", sha256[:2], sha256)
+
+    def _write_blob(self, path, content):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(content)
+        os.replace(tmp_path, path)
+
+    def get(self, key):
+        """
+        Returns a cached page.
+
+        Parameters:
+            key (str): The property ID.
+
+        Returns:
+            dict: content, etag, last_modified, fetched_at and fresh (younger than
+            the TTL), or None if the page is not cached.
+        """
+        with self._lock:
+            row = self._db.execute(
+                "SELECT sha256, etag, last_modified, fetched_at FROM pages WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            self._db.execute("UPDATE pages SET accessed_at = ? WHERE key = ?", (time.time(), key))
+            self._db.commit()
+        sha256, etag, last_modified, fetched_at = row
+        try:
+            with open(self._blob_path(sha256), 'rb') as f:
+                content = f.read()
+        except FileNotFoundError:
+            return None
+        return {
+            "content": content,
+            "etag": etag,
+            "last_modified": last_modified,
+            "fetched_at": fetched_at,
+            "fresh": time.time() - fetched_at < self.ttl,
+        }
+
+    def put(self, key, content, etag=None, last_modified=None):
+        """
+        Stores a page, replacing any previous version.
+
+        Parameters:
+            key (str): The property ID.
+            content (bytes): The raw page.
+            etag (str): The ETag response header, if any.
+            last_modified (str): The Last-Modified response header, if any.
+
+        Returns:
+            None
+        """
+        sha256 = hashlib.sha256(content).hexdigest()
+        path = self._blob_path(sha256)
+        # Written outside the lock, so other threads are not held up by the I/O
+        if not os.path.exists(path):
+            self._write_blob(path, content)
+
+        now = time.time()
+        with self._lock:
+            previous = self._db.execute("SELECT sha256 FROM pages WHERE key = ?", (key,)).fetchone()
+            shared = self._db.execute("SELECT 1 FROM pages WHERE sha256 = ? LIMIT 1", (sha256,)).fetchone()
+            self._db.execute(
+                "INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, sha256, len(content), etag, last_modified, now, now),
+            )
+            # Blobs are only deleted under the lock, once no row points at them: an
+            # eviction may have deleted this one since it was written (or found),
+            # but cannot any more now that the row exists
+            if not shared and not os.path.exists(path):
+                self._write_blob(path, content)
+            if not shared:
+                self._size += len(content)
+            if previous is not None and previous[0] != sha256:
+                self._release_blob(previous[0])
+            self._db.commit()
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def touch(self, key):
+        """
+        Marks a cached page as fresh again, after the server answered 304 Not Modified.
+
+        Parameters:
+            key (str): The property ID.
+
+        Returns:
+            None
+        """
+        now = time.time()
+        with self._lock:
+            self._db.execute("UPDATE pages SET fetched_at = ?, accessed_at = ? WHERE key = ?", (now, now, key))
+            self._db.commit()
+
+    def keys(self):
+        """
+        Returns every cached property ID.
+
+        Returns:
+            list: The property IDs.
+        """
+        with self._lock:
+            return [row[0] for row in self._db.execute("SELECT key FROM pages")]
+
+    def _release_blob(self, sha256):
+        # Deletes a blob once no key points at it; the caller holds the lock
+        row = self._db.execute("SELECT size FROM pages WHERE sha256 = ? LIMIT 1", (sha256,)).fetchone()
+        if row is not None:
+            return
+        path = self._blob_path(sha256)
+        try:
+            self._size -= os.path.getsize(path)
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def _evict(self):
+        # Drops least recently used pages until the cache is back under 90% of its limit
+        target = self.max_bytes * 0.9
+        rows = self._db.execute("SELECT key, sha256 FROM pages ORDER BY accessed_at").fetchall()
+        evicted = 0
+        for key, sha256 in rows:
+            if self._size <= target:
+                break
+            self._db.execute("DELETE FROM pages WHERE key = ?", (key,))
+            self._release_blob(sha256)
+            evicted += 1
+        self._db.commit()
+        logging.info(f"Evicted {evicted} pages from the page cache.")
+
+# Shared cache, opened on first use
+_page_cache = None
+_page_cache_lock = threading.Lock()
+
+def get_page_cache():
+    """
+    Returns the shared page cache, opening it on first use.
+
+    Returns:
+        PageCache: The cache, or None if CRAWLER_CACHE_DIR is empty.
+    """
+    global _page_cache
+    if not CACHE_DIR:
+        return None
+    with _page_cache_lock:
+        if _page_cache is None:
+            _page_cache = PageCache(CACHE_DIR)
+    return _page_cache
+
+if __name__ == '__main__':
+    # Re-run extraction over every cached page without touching the network:
+    #   python page_cache.py output_dir/
+    from listing_parser import extract_property_data
+
+    output_dir = sys.argv[1]
+    os.makedirs(output_dir, exist_ok=True)
+    cache = get_page_cache()
+    extracted = 0
+    for key in cache.keys():
+        entry = cache.get(key)
+        data = extract_property_data(entry["content"]) if entry else None
+        if data is None:
+            continue
+        with open(os.path.join(output_dir, f"{key}.json"), 'w') as json_file:
+            json.dump(data, json_file, indent=4)
+        extracted += 1
+    print(f"Extracted {extracted} listings into {output_dir}.")
@@ -0,0 +1,206 @@
+import os
+import time
+import logging
+import threading
+import multiprocessing
+from concurrent.futures import Future, ThreadPoolExecutor, ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+from metrics import observe, timed
+
+# Number of properties processed concurrently
+MAX_WORKERS = int(os.environ.get("CRAWLER_MAX_WORKERS", 16))
+
+# Number of processes parsing pages; 0 parses in the fetch threads instead
+PARSE_WORKERS = int(os.environ.get("CRAWLER_PARSE_WORKERS", os.cpu_count() or 1))
+
+# Process pool of the parse stage, started once and shared by every crawl of the process
+_parse_pool = None
+_parse_pool_lock = threading.Lock()
+
+def crawl_concurrently(property_ids, worker, max_workers=MAX_WORKERS):
+    """
+    Runs the worker over every property ID on a bounded thread pool.
+
+    At most a few batches of work are queued ahead of the pool, so memory stays flat
+    regardless of how many IDs are passed in. Results are yielded as soon as each
+    property finishes, in completion order. If the caller stops iterating (for example
+    because a worker raised), pending work is cancelled.
+
+    Parameters:
+        property_ids (iterable): The property IDs to process.
+        worker (callable): Function called with a single property ID.
+        max_workers (int): Number of worker threads.
+
+    Yields:
+        tuple: (property_id, future) for every finished property. Call future.result()
+        to get the worker's return value or re-raise its exception.
+    """
+    max_pending = max_workers * 4
+    ids = iter(property_ids)
+    pending = {}
+
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+    try:
+        while True:
+            # Keep the queue topped up
+            for property_id in ids:
+                pending[executor.submit(worker, property_id)] = property_id
+                if len(pending) >= max_pending:
+                    break
+
+            if not pending:
+                break
+
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield pending.pop(future), future
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+def _noop():
+    return None
+
+def start_parse_pool(parse_workers=PARSE_WORKERS):
+    """
+    Starts the process pool of the parse stage, or returns the one already started.
+
+    Workers are forked so they inherit the crawler's configuration without
+    re-importing the crawler script (which has side effects at import time), and
+    are all started right away. A forked process only gets the thread that forked
+    it, so a lock another thread holds at that moment (logging, boto3, SQLite)
+    would stay locked in the workers for good: call this before any other thread
+    is started (crawler.run does so first thing). The pool is then reused by every
+    crawl of the process, retries included, and never forked again. If other
+    threads are already running when no pool exists, none is started.
+
+    Parameters:
+        parse_workers (int): Number of parse processes, when the pool is started.
+
+    Returns:
+        ProcessPoolExecutor: The pool, or None to parse in threads.
+    """
+    global _parse_pool
+    with _parse_pool_lock:
+        if _parse_pool is not None:
+            return _parse_pool
+        if parse_workers <= 0 or "fork" not in multiprocessing.get_all_start_methods():
+            return None
+        if threading.active_count() > 1:
+            logging.warning("Other threads are running, not forking parse workers; parsing in the fetch threads.")
+            return None
+        executor = ProcessPoolExecutor(max_workers=parse_workers, mp_context=multiprocessing.get_context("fork"))
+        executor.submit(_noop).result()
+        _parse_pool = executor
+        return executor
+
+def close_parse_pool():
+    """
+    Stops the parse processes, if they were started.
+
+    Returns:
+        None
+    """
+    global _parse_pool
+    with _parse_pool_lock:
+        executor, _parse_pool = _parse_pool, None
+    if executor is not None:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+def _run_timed(stage, function, *args):
+    # Runs a stage on a thread, recording its time in the stage_seconds histogram
+    with timed(stage):
+        return function(*args)
+
+def _measure(function, *args):
+    # Runs a stage in a worker process and returns how long it took along with the
+    # result, as metrics recorded there would stay in that process
+    started = time.perf_counter()
+    result = function(*args)
+    return time.perf_counter() - started, result
+
+def _resolved(result):
+    future = Future()
+    future.set_result(result)
+    return future
+
+def crawl_pipeline(property_ids, fetch, parse, enrich=None, max_workers=MAX_WORKERS, parse_workers=PARSE_WORKERS):
+    """
+    Runs a two-stage crawl: pages are fetched on a thread pool and parsed on a process pool.
+
+    Fetching is I/O-bound and parsing is CPU-bound, so the raw page of every property
+    is handed from the fetch threads to a pool of processes that can use every core.
+    An optional enrich stage runs on the fetch threads after parsing, for I/O-bound
+    additions to the parsed record. Results are streamed back as soon as they are ready. As in
+    crawl_concurrently, the amount of queued work is bounded and pending work is
+    cancelled if the caller stops iterating. The time every stage takes is recorded
+    in the stage_seconds histogram of the metrics.
+
+    Parameters:
+        property_ids (iterable): The property IDs to process.
+        fetch (callable): Called as fetch(property_id) in a thread; returns the raw page, or None to skip it.
+        parse (callable): Called as parse(property_id, content) in a worker process; must be picklable.
+        enrich (callable): Called as enrich(property_id, result) in a thread for every non-None parse result; its return value replaces the result.
+        max_workers (int): Number of fetch threads.
+        parse_workers (int): Number of parse processes; 0 parses in the fetch threads.
+            The pool is shared, see start_parse_pool, so this only counts if it
+            is not started yet.
+
+    Yields:
+        tuple: (property_id, future) for every finished property. future.result() is
+        the parse (or enrich) result, None if fetch returned None, or re-raises the exception of
+        whichever stage failed.
+    """
+    max_pending = max_workers * 4
+    ids = iter(property_ids)
+    pending = {}
+
+    parse_executor = start_parse_pool(parse_workers)
+    if parse_executor is None:
+        def fetch_and_parse(property_id):
+            content = _run_timed("fetch", fetch, property_id)
+            if content is None:
+                return None
+            result = _run_timed("parse", parse, property_id, content)
+            if enrich is not None and result is not None:
+                result = _run_timed("enrich", enrich, property_id, result)
+            return result
+
+        yield from crawl_concurrently(property_ids, fetch_and_parse, max_workers)
+        return
+
+    fetch_executor = ThreadPoolExecutor(max_workers=max_workers)
+    try:
+        while True:
+            # Keep the fetch queue topped up
+            for property_id in ids:
+                pending[fetch_executor.submit(_run_timed, "fetch", fetch, property_id)] = (property_id, "fetch")
+                if len(pending) >= max_pending:
+                    break
+
+            if not pending:
+                break
+
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                property_id, stage = pending.pop(future)
+                if future.exception() is not None or stage == "enrich":
+                    yield property_id, future
+                    continue
+                result = future.result()
+                if stage == "parse":
+                    seconds, result = result
+                    observe("stage_seconds", seconds, stage="parse")
+                if result is None:
+                    yield property_id, _resolved(None)
+                elif stage == "fetch":
+                    # Hand the raw page over to the parse stage
+                    pending[parse_executor.submit(_measure, parse, property_id, result)] = (property_id, "parse")
+                elif enrich is not None:
+                    pending[fetch_executor.submit(_run_timed, "enrich", enrich, property_id, result)] = (property_id, "enrich")
+                else:
+                    yield property_id, _resolved(result)
+    finally:
+        fetch_executor.shutdown(wait=True, cancel_futures=True)
+        # The parse pool outlives the crawl; only the work queued for it is dropped
+        for future in pending:
+            future.cancel()
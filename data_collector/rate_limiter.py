@@ -0,0 +1,146 @@
+import os
+import time
+import logging
+import threading
+from urllib.parse import urlparse
+
+# Requests per second a host starts at, and the bounds the rate adapts within
+INITIAL_RATE = float(os.environ.get("CRAWLER_RATE_INITIAL", 4))
+MIN_RATE = float(os.environ.get("CRAWLER_RATE_MIN", 0.2))
+MAX_RATE = float(os.environ.get("CRAWLER_RATE_MAX", 20))
+
+# Requests that may be sent back to back after an idle period
+BURST = int(os.environ.get("CRAWLER_RATE_BURST", 4))
+
+# Smoothed response time above which a host is considered overloaded
+LATENCY_TARGET = float(os.environ.get("CRAWLER_RATE_LATENCY_TARGET", 2.0))
+
+# Additive increase: requests per second gained per second of successful responses
+RATE_INCREASE = 0.5
+
+# Multiplicative decrease on a block (429/403/503, timeout) and on high latency
+BLOCK_DECREASE = 0.5
+LATENCY_DECREASE = 0.9
+
+# Responses to requests sent before a decrease carry no news; ignore their signals for this long
+DECREASE_COOLDOWN = 2.0
+
+# Weight of the latest response time in the smoothed latency
+LATENCY_SMOOTHING = 0.2
+
+# Statuses meaning the host wants us to slow down
+BLOCK_STATUSES = {403, 429, 503}
+
+class RateLimiter:
+    """
+    Token bucket whose rate adapts to how the host responds (AIMD).
+
+    Every successful response raises the rate a little (additive increase); a
+    block signal (429, 403, 503 or a timeout) halves it and a smoothed latency
+    above LATENCY_TARGET lowers it by 10% (multiplicative decrease). A Retry-After
+    header pauses the whole host for the time asked.
+    """
+
+    def __init__(self, rate=INITIAL_RATE, min_rate=MIN_RATE, max_rate=MAX_RATE, burst=BURST):
+        """
+        Parameters:
+            rate (float): Initial requests per second.
+            min_rate (float): Lowest rate the limiter goes down to.
+            max_rate (float): Highest rate the limiter goes up to.
+            burst (int): Size of the bucket.
+        """
+        self.rate = rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.burst = burst
+        self.latency = None
+        self._tokens = float(burst)
+        self._updated_at = time.monotonic()
+        self._paused_until = 0.0
+        self._last_decrease = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """
+        Blocks until a request may be sent.
+
+        Returns:
+            None
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated_at) * self.rate)
+            self._updated_at = now
+            # Take the token now, even if that leaves the bucket in debt; later callers queue behind
+            self._tokens -= 1
+            wait = max(-self._tokens / self.rate, self._paused_until - now, 0)
+        if wait > 0:
+            time.sleep(wait)
+
+    def record(self, status, latency, retry_after=None):
+        """
+        Adapts the rate to the outcome of a request.
+
+        Parameters:
+            status (int): The HTTP status, or None if the request timed out or failed to connect.
+            latency (float): Seconds the request took.
+            retry_after (float): Seconds the server asked us to wait, if any.
+
+        Returns:
+            None
+        """
+        with self._lock:
+            now = time.monotonic()
+            if retry_after:
+                self._paused_until = max(self._paused_until, now + retry_after)
+            if self.latency is None:
+                self.latency = latency
+            else:
+                self.latency += LATENCY_SMOOTHING * (latency - self.latency)
+
+            if status is None or status in BLOCK_STATUSES:
+                self._decrease(now, BLOCK_DECREASE, f"HTTP {status}" if status else "no response")
+            elif self.latency > LATENCY_TARGET:
+                self._decrease(now, LATENCY_DECREASE, f"latency {self.latency:.2f}s")
+            elif status < 400:
+                self.rate = min(self.max_rate, self.rate + RATE_INCREASE / self.rate)
+
+    def _decrease(self, now, factor, reason):
+        # The caller holds the lock
+        if now - self._last_decrease < DECREASE_COOLDOWN:
+            return
+        self._last_decrease = now
+        self.rate = max(self.min_rate, self.rate * factor)
+        logging.info(f"Lowered request rate to {self.rate:.2f}/s ({reason})")
+
+# One limiter per host, created lazily
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+def host_rate_limiter(url):
+    """
+    Returns the rate limiter shared by every request to the host of the given URL.
+
+    Parameters:
+        url (str): The URL about to be requested.
+
+    Returns:
+        RateLimiter: The limiter of that host.
+    """
+    host = urlparse(url).netloc
+    with _limiters_lock:
+        limiter = _limiters.get(host)
+        if limiter is None:
+            limiter = RateLimiter()
+            _limiters[host] = limiter
+    return limiter
+
+def current_rates():
+    """
+    Returns the current request rate of every host contacted so far.
+
+    Returns:
+        dict: Requests per second by host.
+    """
+    with _limiters_lock:
+        return {host: round(limiter.rate, 2) for host, limiter in _limiters.items()}
@@ -0,0 +1,283 @@
+import io
+import os
+import re
+import gzip
+import json
+import time
+import logging
+import datetime
+import threading
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+from normalize import normalize_records, TYPED_FIELDS
+
+# Output written for every listing: "json" (one file per listing, the original
+# layout), "jsonl" (gzip-compressed JSON Lines parts) and/or "parquet" (needs pyarrow)
+OUTPUT_FORMATS = [
+    name.strip() for name in
+    os.environ.get("CRAWLER_OUTPUT_FORMATS", "jsonl,parquet" if pa is not None else "jsonl").split(",")
+    if name.strip()
+]
+
+# Number of listings per part file
+PART_RECORDS = int(os.environ.get("CRAWLER_SNAPSHOT_PART_RECORDS", 5000))
+
+# Formats written by SnapshotSink, as opposed to one file per listing
+SNAPSHOT_FORMATS = ("jsonl", "parquet")
+
+_PART_RE = re.compile(r"part-(\d+)\.")
+
+def _value_type(value):
+    if isinstance(value, bool):
+        return "bool"
+    if isinstance(value, int):
+        return "int64"
+    if isinstance(value, float):
+        return "float64"
+    if isinstance(value, str):
+        return "string"
+    if isinstance(value, datetime.date):
+        return "date"
+    return "json"
+
+def _merge_types(a, b):
+    if a is None or a == b:
+        return b
+    if {a, b} == {"int64", "float64"}:
+        return "float64"
+    # Anything else mixed is kept as text
+    return "json" if "json" in (a, b) else "string"
+
+def infer_schema(records, schema=None):
+    """
+    Derives a column type for every key of the listing data.
+
+    Parameters:
+        records (list): The listing dicts.
+        schema (dict): Types found so far, to extend.
+
+    Returns:
+        dict: Column type ("string", "int64", "float64", "bool", "date" or "json",
+        for lists and dicts) by key, in order of first appearance.
+    """
+    schema = dict(schema or {})
+    for record in records:
+        for key, value in record.items():
+            if value is not None:
+                schema[key] = _merge_types(schema.get(key), _value_type(value))
+            else:
+                schema.setdefault(key, None)
+    return schema
+
+def _column(values, column_type):
+    if column_type == "json":
+        return pa.array([json.dumps(v, ensure_ascii=False) if v is not None else None for v in values], pa.string())
+    if column_type == "string" or column_type is None:
+        return pa.array([v if v is None or isinstance(v, str) else json.dumps(v, ensure_ascii=False, default=str) for v in values], pa.string())
+    return pa.array(values, {"int64": pa.int64(), "float64": pa.float64(), "bool": pa.bool_(), "date": pa.date32()}[column_type])
+
+def encode_jsonl(records):
+    """
+    Serialises listings as gzip-compressed JSON Lines; dates are written as ISO strings.
+
+    Parameters:
+        records (list): The listing dicts.
+
+    Returns:
+        bytes: The compressed file.
+    """
+    lines = "".join(json.dumps(record, ensure_ascii=False, default=str) + "\n" for record in records)
+    return gzip.compress(lines.encode('utf-8'), compresslevel=6)
+
+def encode_parquet(records, schema):
+    """
+    Serialises listings as a zstd-compressed Parquet file with one column per key.
+
+    Columns of type "json" are stored as JSON text.
+
+    Parameters:
+        records (list): The listing dicts.
+        schema (dict): Column types, see infer_schema.
+
+    Returns:
+        bytes: The Parquet file.
+    """
+    columns = {key: _column([record.get(key) for record in records], column_type) for key, column_type in schema.items()}
+    buffer = io.BytesIO()
+    pq.write_table(pa.table(columns), buffer, compression="zstd")
+    return buffer.getvalue()
+
+def read_snapshot(storage, prefix):
+    """
+    Reads back the listings of a snapshot written by SnapshotSink, from its JSON
+    Lines parts or, for parts without one, its Parquet parts.
+
+    Parameters:
+        storage (Storage): Where the snapshot is stored.
+        prefix (str): Key prefix of the snapshot, e.g. "snapshots/2024-11-20/".
+
+    Returns:
+        tuple: (manifest dict or None if there is no snapshot, list of listing dicts).
+    """
+    data = storage.get(f"{prefix}manifest.json")
+    if data is None:
+        return None, []
+    manifest = json.loads(data)
+    records = []
+    for part in manifest["parts"]:
+        jsonl_key = f"{prefix}{part['name']}.jsonl.gz"
+        if jsonl_key in part["files"]:
+            lines = gzip.decompress(storage.get(jsonl_key)).decode('utf-8').splitlines()
+            records.extend(json.loads(line) for line in lines)
+        elif pa is not None:
+            table = pq.read_table(io.BytesIO(storage.get(f"{prefix}{part['name']}.parquet")))
+            records.extend(table.to_pylist())
+        else:
+            logging.warning(f"Skipping {prefix}{part['name']}: it is Parquet only and pyarrow is not installed.")
+    return manifest, records
+
+class SnapshotSink:
+    """
+    Buffers listings and writes them as a few large part files plus a manifest.
+
+    Each part is normalised as a batch first (see normalize.normalize_records), so
+    it carries typed rent, area, floor, age, date and coordinate fields.
+
+    Every PART_RECORDS listings a part is written in each format, e.g.
+    <prefix>part-00000.jsonl.gz and <prefix>part-00000.parquet. Once all formats
+    of a part are stored, <prefix>manifest.json is rewritten to list it and the
+    on_success callbacks of its listings are called, so a listing only counts as
+    stored once it is in a part the manifest knows about. Parts written by an
+    earlier process for the same prefix are kept and numbering continues after them.
+    """
+
+    def __init__(self, storage, prefix, formats=OUTPUT_FORMATS, part_records=PART_RECORDS):
+        """
+        Parameters:
+            storage (Storage): Where the snapshot is stored; parts are written in the background.
+            prefix (str): Key prefix of the snapshot, e.g. "snapshots/2024-11-20/".
+            formats (list): Output formats; only "jsonl" and "parquet" are handled here.
+            part_records (int): Number of listings per part.
+        """
+        self.storage = storage
+        self.prefix = prefix
+        self.formats = [name for name in formats if name in SNAPSHOT_FORMATS]
+        if "parquet" in self.formats and pa is None:
+            logging.warning("pyarrow is not installed, not writing Parquet.")
+            self.formats.remove("parquet")
+        self.part_records = part_records
+        self.manifest_key = f"{prefix}manifest.json"
+        self._records = []
+        self._callbacks = []
+        self._lock = threading.Lock()
+
+        data = storage.get(self.manifest_key)
+        self.manifest = json.loads(data) if data is not None else {"parts": [], "records": 0, "schema": {}}
+        existing = [int(m.group(1)) for m in map(_PART_RE.search, storage.list(f"{prefix}part-")) if m]
+        self._next_part = max(existing, default=-1) + 1
+
+    def add(self, property_id, data, on_success=None):
+        """
+        Buffers a listing, writing a part once enough of them are buffered.
+
+        Parameters:
+            property_id (str): The ID of the property.
+            data (dict): The listing data.
+            on_success (callable): Called without arguments once the listing is stored.
+
+        Returns:
+            None
+        """
+        # The crawler's ID wins over any property_id in the parsed data
+        self._records.append({**data, "property_id": str(property_id)})
+        if on_success is not None:
+            self._callbacks.append(on_success)
+        if len(self._records) >= self.part_records:
+            self.flush()
+
+    def flush(self):
+        """
+        Writes the buffered listings as a part, even if it is not full.
+
+        Returns:
+            None
+        """
+        if not self._records:
+            return
+        records, callbacks = self._records, self._callbacks
+        self._records, self._callbacks = [], []
+        name = f"part-{self._next_part:05d}"
+        self._next_part += 1
+
+        normalize_records(records)
+        # Typed fields keep their type even in a part where none could be parsed
+        schema = {**infer_schema(records), **TYPED_FIELDS}
+        bodies = {}
+        if "jsonl" in self.formats:
+            bodies[f"{self.prefix}{name}.jsonl.gz"] = encode_jsonl(records)
+        if "parquet" in self.formats:
+            bodies[f"{self.prefix}{name}.parquet"] = encode_parquet(records, schema)
+
+        part = {
+            "name": name,
+            "records": len(records),
+            "files": {key: len(body) for key, body in bodies.items()},
+            "written_at": time.time(),
+        }
+        pending = [len(bodies)]
+
+        def stored():
+            with self._lock:
+                pending[0] -= 1
+                if pending[0]:
+                    return
+                self._add_to_manifest(part, schema)
+            for callback in callbacks:
+                callback()
+
+        for key, body in bodies.items():
+            self.storage.submit(key, body, stored)
+
+    def discard(self):
+        """
+        Drops the buffered listings without writing them, e.g. when a crawl attempt
+        fails and its listings are crawled again by the next one; their on_success
+        callbacks are never called.
+
+        Returns:
+            None
+        """
+        self._records, self._callbacks = [], []
+
+    def annotate(self, name, value):
+        """
+        Adds an entry to the manifest, e.g. describing a file built from the
+        snapshot; it is kept when later parts are added.
+
+        Parameters:
+            name (str): The manifest key.
+            value: Its JSON-serialisable value.
+
+        Returns:
+            None
+        """
+        with self._lock:
+            self.manifest[name] = value
+            self.storage.put(self.manifest_key, json.dumps(self.manifest, indent=4))
+
+    def _add_to_manifest(self, part, schema):
+        # The caller holds the lock
+        manifest = self.manifest
+        manifest["parts"].append(part)
+        manifest["records"] += part["records"]
+        merged = dict(manifest["schema"])
+        for key, column_type in schema.items():
+            merged[key] = _merge_types(merged.get(key), column_type) if column_type else merged.get(key)
+        manifest["schema"] = merged
+        manifest["formats"] = self.formats
+        self.storage.put(self.manifest_key, json.dumps(manifest, indent=4))
@@ -0,0 +1,229 @@
+import os
+import threading
+
+from uploader import UploadPipeline, get_s3_client
+
+class Storage:
+    """
+    Base of the storage backends: a flat namespace of objects addressed by key.
+
+    Subclasses implement get, put, list and delete. Every backend gets background
+    writes from here: submit() queues an object on an UploadPipeline and flush()
+    waits for everything queued, so writes overlap crawling the same way whichever
+    backend is used.
+    """
+
+    def __init__(self):
+        self._pipeline = None
+        self._pipeline_lock = threading.Lock()
+
+    def get(self, key):
+        """
+        Reads an object.
+
+        Parameters:
+            key (str): The object key.
+
+        Returns:
+            bytes: The content, or None if there is no such object.
+        """
+        raise NotImplementedError
+
+    def put(self, key, body):
+        """
+        Writes an object, replacing any previous version.
+
+        Parameters:
+            key (str): The object key.
+            body (str | bytes): The content; strings are stored as UTF-8.
+
+        Returns:
+            None
+        """
+        raise NotImplementedError
+
+    def list(self, prefix):
+        """
+        Lists the keys starting with a prefix.
+
+        Parameters:
+            prefix (str): The prefix.
+
+        Returns:
+            list: The keys.
+        """
+        raise NotImplementedError
+
+    def delete(self, key):
+        """
+        Deletes an object, if it exists.
+
+        Parameters:
+            key (str): The object key.
+
+        Returns:
+            None
+        """
+        raise NotImplementedError
+
+    def submit(self, key, body, on_success=None):
+        """
+        Queues an object to be written in the background.
+
+        Parameters:
+            key (str): The object key.
+            body (str | bytes): The content.
+            on_success (callable): Called without arguments once the object is stored.
+
+        Returns:
+            None
+        """
+        with self._pipeline_lock:
+            if self._pipeline is None:
+                self._pipeline = UploadPipeline(self.put)
+        self._pipeline.submit(key, body, on_success)
+
+    def put_many(self, items):
+        """
+        Writes a batch of objects concurrently and waits for them.
+
+        Parameters:
+            items (iterable): (key, body) pairs.
+
+        Returns:
+            list: (key, exception) pairs for the writes that failed.
+        """
+        for key, body in items:
+            self.submit(key, body)
+        return self.flush()
+
+    def flush(self):
+        """
+        Waits until every queued object has been written or has failed.
+
+        Returns:
+            list: (key, exception) pairs for the writes that failed since the previous flush.
+        """
+        return self._pipeline.flush() if self._pipeline is not None else []
+
+    def close(self):
+        """
+        Flushes the queue and stops the background writers. Safe to call more than once.
+
+        Returns:
+            list: (key, exception) pairs for the writes that failed since the previous flush.
+        """
+        return self._pipeline.close() if self._pipeline is not None else []
+
+class S3Storage(Storage):
+    """Objects in an S3 bucket."""
+
+    def __init__(self, bucket, region_name):
+        """
+        Parameters:
+            bucket (str): The bucket name.
+            region_name (str): The AWS region of the bucket.
+        """
+        super().__init__()
+        self.bucket = bucket
+        self.client = get_s3_client(region_name)
+
+    def get(self, key):
+        try:
+            return self.client.get_object(Bucket=self.bucket, Key=key)['Body'].read()
+        except self.client.exceptions.NoSuchKey:
+            return None
+
+    def put(self, key, body):
+        self.client.put_object(Bucket=self.bucket, Key=key, Body=body)
+
+    def list(self, prefix):
+        keys = []
+        for page in self.client.get_paginator('list_objects_v2').paginate(Bucket=self.bucket, Prefix=prefix):
+            keys.extend(obj['Key'] for obj in page.get('Contents', []))
+        return keys
+
+    def delete(self, key):
+        self.client.delete_object(Bucket=self.bucket, Key=key)
+
+class LocalStorage(Storage):
+    """Files under a local directory, keys being relative paths."""
+
+    def __init__(self, root="."):
+        """
+        Parameters:
+            root (str): The directory holding the objects.
+        """
+        super().__init__()
+        self.root = root
+
+    def get(self, key):
+        try:
+            with open(os.path.join(self.root, key), 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def put(self, key, body):
+        path = os.path.join(self.root, key)
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(body.encode('utf-8') if isinstance(body, str) else body)
+        os.replace(tmp_path, path)
+
+    def list(self, prefix):
+        directory = os.path.dirname(prefix)
+        try:
+            names = os.listdir(os.path.join(self.root, directory))
+        except FileNotFoundError:
+            return []
+        keys = [os.path.join(directory, name) if directory else name for name in names]
+        return sorted(key for key in keys if key.startswith(prefix) and not key.endswith(".tmp"))
+
+    def delete(self, key):
+        try:
+            os.remove(os.path.join(self.root, key))
+        except FileNotFoundError:
+            pass
+
+class MemoryStorage(Storage):
+    """Objects in a dict, for benchmarks and load tests of the whole pipeline without I/O."""
+
+    def __init__(self):
+        super().__init__()
+        self.objects = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            return self.objects.get(key)
+
+    def put(self, key, body):
+        with self._lock:
+            self.objects[key] = body.encode('utf-8') if isinstance(body, str) else bytes(body)
+
+    def list(self, prefix):
+        with self._lock:
+            return sorted(key for key in self.objects if key.startswith(prefix))
+
+    def delete(self, key):
+        with self._lock:
+            self.objects.pop(key, None)
+
+def open_storage(url, region_name=None):
+    """
+    Opens the storage backend described by a URL.
+
+    Parameters:
+        url (str): "s3://<bucket>", "memory://", or a local directory.
+        region_name (str): The AWS region, for S3 buckets.
+
+    Returns:
+        Storage: The backend.
+    """
+    if url.startswith("s3://"):
+        return S3Storage(url[len("s3://"):].strip("/"), region_name)
+    if url == "memory://":
+        return MemoryStorage()
+    return LocalStorage(url[len("file://"):] if url.startswith("file://") else url)
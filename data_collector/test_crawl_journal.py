@@ -0,0 +1,44 @@
+from crawl_journal import CrawlJournal
+
+def test_runs_resume_until_completed(tmp_path):
+    path = str(tmp_path / "journal.sqlite")
+    journal = CrawlJournal(path)
+    assert not journal.is_resumable("2024-11-20")
+
+    journal.record_discovery("2024-11-20", ["1", "2", "3", 4], done_ids=["3"])
+    assert journal.is_resumable("2024-11-20")
+    assert sorted(journal.pending_ids("2024-11-20")) == ["1", "2", "4"]
+    assert journal.pending_ids("2024-11-21") == []
+
+    journal.record_result("2024-11-20", "1", "done")
+    journal.record_result("2024-11-20", "2", "failed", "timeout")
+    # A new journal on the same file sees what the crashed run did
+    journal = CrawlJournal(path)
+    assert journal.is_resumable("2024-11-20")
+    assert sorted(journal.pending_ids("2024-11-20")) == ["2", "4"]
+    assert journal.summary("2024-11-20") == {"done": 2, "failed": 1, "pending": 1}
+
+    journal.mark_completed("2024-11-20")
+    assert not journal.is_resumable("2024-11-20")
+
+def test_failed_ids_are_given_up_after_max_attempts(tmp_path):
+    journal = CrawlJournal(str(tmp_path / "journal.sqlite"))
+    journal.record_discovery("2024-11-20", ["1", "2"])
+
+    for _ in range(3):
+        journal.record_result("2024-11-20", "1", "failed", "HTTP 500")
+    journal.record_result("2024-11-20", "2", "failed", "HTTP 500")
+
+    assert journal.pending_ids("2024-11-20", max_attempts=3) == ["2"]
+    assert sorted(journal.pending_ids("2024-11-20", max_attempts=4)) == ["1", "2"]
+
+def test_rediscovery_keeps_known_statuses(tmp_path):
+    journal = CrawlJournal(str(tmp_path / "journal.sqlite"))
+    journal.record_discovery("2024-11-20", ["1", "2"])
+    journal.record_result("2024-11-20", "1", "done")
+    journal.mark_completed("2024-11-20")
+
+    journal.record_discovery("2024-11-20", ["1", "2", "5"])
+
+    assert journal.is_resumable("2024-11-20")
+    assert sorted(journal.pending_ids("2024-11-20")) == ["2", "5"]
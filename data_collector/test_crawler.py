@@ -0,0 +1,96 @@
+import functools
+
+import crawler
+from crawl_journal import CrawlJournal
+from freshness import FreshnessStore
+from pipeline import crawl_pipeline
+from snapshot_sink import read_snapshot
+from storage import MemoryStorage
+
+PROPERTY_IDS = [str(3100000 + i) for i in range(12)]
+
+class FlakyStorage(MemoryStorage):
+    """MemoryStorage failing the first write of a snapshot part."""
+
+    def __init__(self):
+        super().__init__()
+        self.failed = []
+
+    def put(self, key, body):
+        if "/part-" in key and not self.failed:
+            self.failed.append(key)
+            raise OSError(f"Upload of {key} failed")
+        super().put(key, body)
+
+def _fetch(property_id):
+    return f"<html>{property_id}</html>".encode()
+
+def _parse(property_id, content):
+    return {"title": f"Flat {property_id}", "rent": "HK$ 12,000"}
+
+def _setup(monkeypatch, tmp_path, storage):
+    monkeypatch.setattr(crawler, "_storage", storage)
+    monkeypatch.setattr(crawler, "_journal", CrawlJournal(str(tmp_path / "journal.sqlite")))
+    monkeypatch.setattr(crawler, "_freshness", FreshnessStore(str(tmp_path / "freshness.sqlite")))
+    monkeypatch.setattr(crawler, "FRESHNESS_PATH", str(tmp_path / "freshness.sqlite"))
+    monkeypatch.setattr(crawler, "_snapshot_sink", None)
+    monkeypatch.setattr(crawler, "_written_ids", None)
+    monkeypatch.setattr(crawler, "_driver_pool", None)
+    monkeypatch.setattr(crawler, "OUTPUT_FORMATS", ["jsonl"])
+    monkeypatch.setattr(crawler, "current_date_str", "2024-11-20")
+    monkeypatch.setattr(crawler, "discover_property_ids", lambda max_pages=None: list(PROPERTY_IDS))
+    monkeypatch.setattr(crawler, "fetch_property_page", _fetch)
+    monkeypatch.setattr(crawler, "parse_property_page", _parse)
+    monkeypatch.setattr(crawler, "start_parse_pool", lambda: None)
+    monkeypatch.setattr(crawler, "crawl_pipeline", functools.partial(crawl_pipeline, max_workers=4, parse_workers=0))
+    monkeypatch.setattr(crawler, "SnapshotSink", functools.partial(crawler.SnapshotSink, formats=["jsonl"], part_records=5))
+
+def test_failed_upload_is_crawled_again_on_retry(monkeypatch, tmp_path):
+    storage = FlakyStorage()
+    _setup(monkeypatch, tmp_path, storage)
+
+    assert crawler.run(max_retries=3)
+
+    # The listings of the failed part were fetched but not stored by the first
+    # attempt; the retry must not take them for unchanged ones
+    assert len(storage.failed) == 1
+    manifest, records = read_snapshot(storage, "snapshots/2024-11-20/")
+    assert manifest is not None
+    assert sorted(record["property_id"] for record in records) == PROPERTY_IDS
+    completed = crawler.get_completed_store().load()
+    assert all(property_id in completed for property_id in PROPERTY_IDS)
+    summary = crawler.get_journal().summary("2024-11-20")
+    assert summary.get("done") == len(PROPERTY_IDS)
+
+def test_unchanged_listing_is_not_stored_again(monkeypatch, tmp_path):
+    storage = MemoryStorage()
+    _setup(monkeypatch, tmp_path, storage)
+    freshness = crawler.get_freshness()
+    for property_id in PROPERTY_IDS[:3]:
+        freshness.observe(property_id, _parse(property_id, None))
+
+    assert crawler.main()
+
+    _, records = read_snapshot(storage, "snapshots/2024-11-20/")
+    assert sorted(record["property_id"] for record in records) == PROPERTY_IDS[3:]
+
+def test_failed_attempt_does_not_store_listings_twice(monkeypatch, tmp_path):
+    storage = MemoryStorage()
+    _setup(monkeypatch, tmp_path, storage)
+    parsed = []
+
+    def parse(property_id, content):
+        # The first attempt fails on the 8th listing, with 2 listings buffered
+        parsed.append(property_id)
+        if len(parsed) == 8:
+            raise ValueError("Unexpected page")
+        # A property_id read from the page does not replace the crawler's
+        return {**_parse(property_id, content), "property_id": "0"}
+    monkeypatch.setattr(crawler, "parse_property_page", parse)
+    monkeypatch.setattr(crawler, "crawl_pipeline", functools.partial(crawl_pipeline, max_workers=1, parse_workers=0))
+
+    assert crawler.run(max_retries=3)
+
+    assert len(parsed) > len(PROPERTY_IDS)
+    _, records = read_snapshot(storage, "snapshots/2024-11-20/")
+    assert sorted(record["property_id"] for record in records) == PROPERTY_IDS
@@ -0,0 +1,70 @@
+import os
+import logging
+
+import facilities
+import page_cache
+
+# Saved property page, which does not assign the map_data_* globals (28hse loads
+# them when the map is opened), and the saved script of the map that does
+PAGES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "test_pages")
+
+class _Response:
+    def __init__(self, text):
+        self.text = text
+
+    def raise_for_status(self):
+        pass
+
+def _read(name):
+    with open(os.path.join(PAGES_DIR, name), 'rb') as f:
+        return f.read()
+
+def _setup(monkeypatch, tmp_path, url=""):
+    monkeypatch.setattr(facilities, "FACILITIES_URL", url)
+    monkeypatch.setattr(facilities, "_static_reads", 0)
+    monkeypatch.setattr(facilities, "_static_hits", 0)
+    monkeypatch.setattr(facilities, "_cache", facilities.OrderedDict())
+    monkeypatch.setattr(page_cache, "CACHE_DIR", str(tmp_path / "cache"))
+    monkeypatch.setattr(page_cache, "_page_cache", None)
+    page_cache.get_page_cache().put("4100001", _read("4100001.html"))
+
+def test_static_page_has_no_facilities(monkeypatch, tmp_path, caplog):
+    _setup(monkeypatch, tmp_path)
+    monkeypatch.setattr(facilities, "STATIC_PAGE_PROBES", 2)
+    fallback = []
+
+    with caplog.at_level(logging.WARNING):
+        for _ in range(2):
+            assert facilities.fetch_facilities("4100001") is None
+    assert "map_data_* globals" in caplog.text
+
+    # Once detected, the cached pages are not read again and the fallback is used
+    monkeypatch.setattr(page_cache.PageCache, "get", lambda self, key: fallback.append("cache"))
+    result = facilities.get_facilities("4100001", {}, lambda property_id: fallback.append(property_id) or {"mtr": []})
+    assert result == {"mtr": []}
+    assert fallback == ["4100001"]
+
+def test_facilities_url_reads_map_script(monkeypatch, tmp_path):
+    _setup(monkeypatch, tmp_path, "https://www.28hse.com/map/{property_id}.js")
+    urls = []
+    script = _read("4100001.map.js").decode('utf-8')
+    monkeypatch.setattr(facilities, "fetch_url", lambda url: urls.append(url) or _Response(script))
+
+    result = facilities.fetch_facilities("4100001")
+
+    assert urls == ["https://www.28hse.com/map/4100001.js"]
+    assert [mtr["name"] for mtr in result["mtr"]] == ["Tai Koo", "Quarry Bay"]
+    assert result["mall"] == [{"name": "Cityplaza", "distance": 150}]
+    assert result["school"] == []
+    # A global not written as a JSON literal is left out
+    assert result["restaurant"] is None and result["hospital"] is None
+
+def test_facilities_are_shared_by_a_building(monkeypatch, tmp_path):
+    _setup(monkeypatch, tmp_path)
+    calls = []
+    fallback = lambda property_id: calls.append(property_id) or {"mtr": [property_id]}
+    building = {"latitude": 22.2866, "longitude": 114.2178}
+
+    assert facilities.get_facilities("4100001", building, fallback) == {"mtr": ["4100001"]}
+    assert facilities.get_facilities("4100002", dict(building), fallback) == {"mtr": ["4100001"]}
+    assert calls == ["4100001"]
@@ -0,0 +1,33 @@
+import time
+
+import freshness
+from freshness import FreshnessStore
+
+LISTING = {"title": "Flat", "rent": "HK$ 12,000"}
+
+def _store(tmp_path, monkeypatch):
+    # Every listing is due again as soon as it was fetched
+    monkeypatch.setattr(freshness, "MIN_RECRAWL_INTERVAL", 1.0)
+    monkeypatch.setattr(freshness, "MAX_RECRAWL_INTERVAL", 1.0)
+    return FreshnessStore(str(tmp_path / "freshness.sqlite"))
+
+def test_unchanged_listing_is_detected(tmp_path, monkeypatch):
+    store = _store(tmp_path, monkeypatch)
+    assert store.changed("1", LISTING)
+    assert store.observe("1", LISTING)
+    assert not store.changed("1", dict(LISTING))
+    # Nearby facilities are not part of the content
+    assert not store.changed("1", {**LISTING, "mtr": [{"name": "Tai Koo"}]})
+    assert store.changed("1", {**LISTING, "rent": "HK$ 11,500"})
+
+def test_delisted_listing_is_not_due(tmp_path, monkeypatch):
+    store = _store(tmp_path, monkeypatch)
+    for property_id in ("1", "2"):
+        store.observe(property_id, LISTING)
+    store.mark_listed(["1", "2"])
+    assert sorted(store.due_ids(["1", "2", "3"])) == ["1", "2", "3"]
+
+    # "2" drops out of the search results
+    monkeypatch.setattr(time, "time", lambda now=time.time(): now + freshness.DELISTED_AFTER + 60)
+    store.mark_listed(["1"])
+    assert store.due_ids(["1", "2", "3"]) == ["1", "3"]
@@ -0,0 +1,105 @@
+import pytest
+
+import id_store
+from id_store import IdSet, IdStore, WrittenIds
+from storage import MemoryStorage
+
+# Deltas on either side of every varint length, up to the largest 32-bit ID
+EDGE_IDS = [0, 127, 255, 383, 16766, 16767, 2113663, 2113664, 0xFFFFFFFF]
+
+def _varint(value):
+    # LEB128, one byte at a time
+    out = bytearray()
+    while True:
+        out.append((value & 0x7F) | (0x80 if value >= 0x80 else 0))
+        value >>= 7
+        if not value:
+            return bytes(out)
+
+@pytest.mark.parametrize("ids", [[], [5], EDGE_IDS, [128], [127, 255], [0, 0xFFFFFFFF], list(range(0, 10**6, 997))])
+def test_round_trip(ids):
+    id_set = IdSet(ids)
+    data = id_set.to_bytes()
+
+    assert list(IdSet.from_bytes(data)) == sorted(ids)
+    # The body is the varint of every delta from the previous ID
+    deltas = [b - a for a, b in zip([0] + sorted(ids), sorted(ids))]
+    assert data[8:] == b"".join(_varint(delta) for delta in deltas)
+
+def test_deltas_of_127_128_and_the_largest_id():
+    data = IdSet([127, 255, 0xFFFFFFFF]).to_bytes()
+    # 127 fits in one byte, 128 needs two, 2^32-1 - 255 needs five
+    assert data[8:] == b"\x7f" + b"\x80\x01" + _varint(0xFFFFFFFF - 255)
+    assert len(data) == 8 + 1 + 2 + 5
+    assert list(IdSet.from_bytes(data)) == [127, 255, 0xFFFFFFFF]
+
+def test_truncated_files_are_rejected():
+    data = IdSet(EDGE_IDS).to_bytes()
+    for size in range(8, len(data)):
+        with pytest.raises(ValueError):
+            IdSet.from_bytes(data[:size])
+    with pytest.raises(ValueError):
+        IdSet.from_bytes(b"IDS0" + data[4:])
+
+def test_ids_that_are_not_32_bit_numbers():
+    id_set = IdSet(["12", 7, "abc", None, "-1", 2**32, "4100001"])
+
+    assert list(id_set) == [7, 12, 4100001]
+    assert "12" in id_set and 4100001 in id_set
+    assert "abc" not in id_set and 2**32 not in id_set and None not in id_set
+    assert id_set.exclude_from(["abc", "12", 13, "7", 2**32]) == ["abc", 13, 2**32]
+    assert list(id_set.union(["3", "x"], IdSet([12, 99]))) == [3, 7, 12, 99, 4100001]
+
+def test_legacy_text():
+    assert list(IdSet.from_text("12\n 3 \n\nabc\n12\n")) == [3, 12]
+
+def test_store_adds_deltas_and_compacts(monkeypatch):
+    monkeypatch.setattr(id_store, "COMPACT_AFTER", 3)
+    storage = MemoryStorage()
+    store = IdStore(storage)
+    assert len(store.load()) == 0
+
+    for ids in (["1", "2"], ["2", "300"], [], ["4100001"]):
+        store.add(ids)
+    assert len(store._delta_keys()) == 3
+    assert "completed.ids" not in storage.objects
+    assert list(store.load()) == [1, 2, 300, 4100001]
+
+    # The fourth delta is over the limit, so they are all folded into the base file
+    store.add([0xFFFFFFFF])
+    assert store._delta_keys() == []
+    assert list(IdSet.from_bytes(storage.get("completed.ids"))) == [1, 2, 300, 4100001, 0xFFFFFFFF]
+
+    store.add(["5"])
+    assert list(IdStore(storage).load()) == [1, 2, 5, 300, 4100001, 0xFFFFFFFF]
+    assert list(store.compact()) == [1, 2, 5, 300, 4100001, 0xFFFFFFFF]
+    assert store._delta_keys() == []
+
+def test_store_imports_the_legacy_file():
+    storage = MemoryStorage()
+    storage.put("completed.txt", "4100001\n4100002\n")
+    store = IdStore(storage)
+
+    assert list(store.load()) == [4100001, 4100002]
+    assert list(IdSet.from_bytes(storage.get("completed.ids"))) == [4100001, 4100002]
+    # Later reads use the base file
+    storage.delete("completed.txt")
+    store.add(["4100003"])
+    assert list(store.load()) == [4100001, 4100002, 4100003]
+
+def test_written_ids_are_saved_every_few_additions():
+    storage = MemoryStorage()
+    written = WrittenIds(storage, "written/2024-11-20.ids", save_every=2)
+    assert not written.found
+
+    written.add("4100001")
+    written.add("not-an-id")
+    assert storage.get(written.key) is None
+    written.add("4100002")
+    assert list(IdSet.from_bytes(storage.get(written.key))) == [4100001, 4100002]
+    written.add("4100003")
+    written.save()
+
+    reopened = WrittenIds(storage, written.key)
+    assert reopened.found
+    assert reopened.ids() == {"4100001", "4100002", "4100003"}
@@ -0,0 +1,32 @@
+import os
+import json
+
+import pytest
+
+from listing_parser import lxml, compare_extractors, extract_property_data_bs4, extract_property_data_lxml
+
+# Saved property pages, each with the listing data it holds (null for a page that
+# is not a listing), covering nested markup, entities, CJK text, scripts and styles
+# inside values, comments, a Latin-1 page, missing fields, repeated blocks and
+# empty responses
+PAGES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "test_pages")
+PAGES = sorted(name[:-len(".html")] for name in os.listdir(PAGES_DIR) if name.endswith(".html"))
+
+def _page(name):
+    with open(os.path.join(PAGES_DIR, f"{name}.html"), 'rb') as f:
+        content = f.read()
+    with open(os.path.join(PAGES_DIR, f"{name}.json"), encoding='utf-8') as f:
+        expected = json.load(f)
+    return content, expected
+
+@pytest.mark.parametrize("name", PAGES)
+def test_bs4_extractor(name):
+    content, expected = _page(name)
+    assert extract_property_data_bs4(content) == expected
+
+@pytest.mark.skipif(lxml is None, reason="lxml is not installed")
+@pytest.mark.parametrize("name", PAGES)
+def test_lxml_extractor_matches_bs4(name):
+    content, expected = _page(name)
+    assert compare_extractors(content) == {}
+    assert extract_property_data_lxml(content) == expected
@@ -0,0 +1,55 @@
+import os
+
+from page_cache import PageCache
+
+def _blobs(cache):
+    return [name for _, _, names in os.walk(os.path.join(cache.directory, "blobs")) for name in names]
+
+def test_pages_are_stored_with_their_validators(tmp_path):
+    cache = PageCache(str(tmp_path), max_bytes=10**6, ttl=60)
+    assert cache.get("4100001") is None
+
+    cache.put("4100001", b"<html>1</html>", etag='"abc"', last_modified="Wed, 20 Nov 2024 08:00:00 GMT")
+    page = cache.get("4100001")
+
+    assert page["content"] == b"<html>1</html>"
+    assert page["etag"] == '"abc"' and page["last_modified"] == "Wed, 20 Nov 2024 08:00:00 GMT"
+    assert page["fresh"]
+    # Reopening the directory finds the same pages
+    assert PageCache(str(tmp_path)).get("4100001")["content"] == b"<html>1</html>"
+
+def test_stale_pages_are_refreshed_by_touch(tmp_path):
+    cache = PageCache(str(tmp_path), max_bytes=10**6, ttl=60)
+    cache.put("4100001", b"page")
+    cache._db.execute("UPDATE pages SET fetched_at = fetched_at - 120")
+
+    assert not cache.get("4100001")["fresh"]
+    cache.touch("4100001")
+    assert cache.get("4100001")["fresh"]
+
+def test_identical_pages_share_a_blob(tmp_path):
+    cache = PageCache(str(tmp_path), max_bytes=10**6)
+    cache.put("1", b"same page")
+    cache.put("2", b"same page")
+    assert len(_blobs(cache)) == 1 and cache._size == len(b"same page")
+
+    # The blob goes once no page points at it
+    cache.put("1", b"new page")
+    assert len(_blobs(cache)) == 2
+    cache.put("2", b"new page")
+    assert len(_blobs(cache)) == 1 and cache._size == len(b"new page")
+    assert sorted(cache.keys()) == ["1", "2"]
+
+def test_least_recently_used_pages_are_evicted(tmp_path):
+    cache = PageCache(str(tmp_path), max_bytes=350)
+    for i in range(3):
+        cache.put(str(i), bytes([i]) * 100)
+        cache._db.execute("UPDATE pages SET accessed_at = ? WHERE key = ?", (i, str(i)))
+    cache.get("0")
+
+    cache.put("3", b"x" * 100)
+
+    # Evicted down to 90% of the limit, oldest access first
+    assert sorted(cache.keys()) == ["0", "2", "3"]
+    assert cache._size == 300 and len(_blobs(cache)) == 3
+    assert cache.get("1") is None
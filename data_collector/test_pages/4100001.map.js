@@ -0,0 +1,5 @@
+var map_data_MTRItems = [{"name": "Tai Koo", "distance": 180}, {"name": "Quarry Bay", "distance": 720}];
+var map_data_BusItems = [{"name": "Taikoo Shing Road", "distance": 60}];
+var map_data_MallItems = [{"name": "Cityplaza", "distance": 150}];
+var map_data_SchoolItems = [];
+var map_data_RestaurantItems = loadRestaurants();
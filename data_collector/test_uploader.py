@@ -0,0 +1,16 @@
+import metrics
+from storage import MemoryStorage
+from uploader import UploadPipeline
+
+def test_uploaded_bytes_are_counted_as_utf8(monkeypatch):
+    monkeypatch.setattr(metrics, "_counters", {})
+    storage = MemoryStorage()
+    pipeline = UploadPipeline(storage.put, max_workers=2)
+
+    pipeline.submit("a.json", '{"title": "太古城 海景"}')
+    pipeline.submit("b.bin", b"\x00\x01")
+    assert pipeline.close() == []
+
+    assert storage.get("a.json").decode('utf-8') == '{"title": "太古城 海景"}'
+    expected = len('{"title": "太古城 海景"}'.encode('utf-8')) + 2
+    assert metrics._counters[("bytes_uploaded_total", ())] == expected
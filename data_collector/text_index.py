@@ -0,0 +1,201 @@
+import os
+import re
+import sys
+import time
+import struct
+import logging
+import argparse
+import datetime
+import unicodedata
+from collections import Counter
+
+import numpy as np
+
+from snapshot_sink import SnapshotSink, read_snapshot
+from storage import open_storage
+
+# Name of the text index file in the folder of a snapshot
+TEXT_INDEX_NAME = "text_index.bin"
+
+# Each occurrence of a term in the title counts as this many in the description
+TITLE_WEIGHT = 2
+
+# Number of most recent daily snapshots the index covers, the newest version of
+# every listing in them; the backend only uses an index over the same snapshots as
+# its listings, so keep it equal to LISTINGS_GEO_HISTORY_DAYS
+HISTORY_DAYS = int(os.environ.get("CRAWLER_TEXT_HISTORY_DAYS", 30))
+
+# Folder, or any key in the folder, of a daily snapshot
+_SNAPSHOT_RE = re.compile(r"snapshots/(\d{4}-\d{2}-\d{2})(/|$)")
+
+# File layout: a fixed header, then the sections below in this order, each
+# starting at a multiple of 8 bytes. The header holds the magic, the format
+# version, the numbers of documents, terms and postings, the average document
+# length and the (offset, size) of every section.
+#   doc_id_offsets  uint32[docs + 1]   property_id of every document, as offsets
+#   doc_id_bytes    UTF-8              into doc_id_bytes
+#   doc_lengths     uint32[docs]       weighted number of tokens of every document
+#   term_offsets    uint32[terms + 1]  the terms, sorted, as offsets into term_bytes
+#   term_bytes      UTF-8
+#   posting_starts  uint64[terms + 1]  postings of term i are posting_starts[i]:[i + 1]
+#   posting_docs    uint32[postings]   documents containing the term, ascending
+#   posting_freqs   uint16[postings]   weighted number of occurrences in each
+# The backend reads it with app/text_index.py; keep both in step.
+MAGIC = b"HKTX"
+VERSION = 1
+SECTIONS = (
+    "doc_id_offsets", "doc_id_bytes", "doc_lengths", "term_offsets",
+    "term_bytes", "posting_starts", "posting_docs", "posting_freqs",
+)
+HEADER = struct.Struct("<4sIIIQd" + "QQ" * len(SECTIONS))
+
+# Runs of Latin letters and digits, and runs of CJK ideographs
+_TOKEN_RE = re.compile(r"[a-z0-9]+|[\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff]+")
+
+def tokenize(text):
+    """
+    Splits text into index terms.
+
+    Text is NFKC-normalised (so full-width letters and digits become ASCII) and
+    lowercased. Runs of letters and digits are words; runs of Chinese characters
+    become their overlapping bigrams ("太古城" gives "太古" and "古城"), as there
+    are no spaces between Chinese words, and a lone character is a term of its own.
+
+    Parameters:
+        text (str): The text; None gives no terms.
+
+    Returns:
+        list: The terms, in order.
+    """
+    if not text:
+        return []
+    tokens = []
+    for run in _TOKEN_RE.findall(unicodedata.normalize("NFKC", text).lower()):
+        if run.isascii() or len(run) == 1:
+            tokens.append(run)
+        else:
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+    return tokens
+
+def _string_table(strings):
+    encoded = [s.encode('utf-8') for s in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.uint32)
+    np.cumsum([len(b) for b in encoded], out=offsets[1:])
+    return offsets, b"".join(encoded)
+
+def build_text_index(records):
+    """
+    Builds the inverted index of the titles and descriptions of listings.
+
+    Parameters:
+        records (list): The listing dicts; when a property_id appears more than
+            once, its last record is indexed.
+
+    Returns:
+        bytes: The index file, see SECTIONS.
+    """
+    latest = {str(record.get("property_id")): record for record in records}
+    doc_ids, lengths, postings = [], [], {}
+    for doc, (property_id, record) in enumerate(latest.items()):
+        counts = Counter()
+        for term in tokenize(record.get("title")):
+            counts[term] += TITLE_WEIGHT
+        counts.update(tokenize(record.get("description")))
+        doc_ids.append(property_id)
+        lengths.append(sum(counts.values()))
+        for term, freq in counts.items():
+            entry = postings.get(term)
+            if entry is None:
+                postings[term] = entry = ([], [])
+            entry[0].append(doc)
+            entry[1].append(freq)
+
+    # Code point order is also the byte order of the UTF-8 encoded terms
+    terms = sorted(postings)
+    posting_starts = np.zeros(len(terms) + 1, dtype=np.uint64)
+    np.cumsum([len(postings[term][0]) for term in terms], out=posting_starts[1:])
+    doc_id_offsets, doc_id_bytes = _string_table(doc_ids)
+    term_offsets, term_bytes = _string_table(terms)
+    sections = {
+        "doc_id_offsets": doc_id_offsets.tobytes(),
+        "doc_id_bytes": doc_id_bytes,
+        "doc_lengths": np.array(lengths, dtype=np.uint32).tobytes(),
+        "term_offsets": term_offsets.tobytes(),
+        "term_bytes": term_bytes,
+        "posting_starts": posting_starts.tobytes(),
+        "posting_docs": np.array([doc for term in terms for doc in postings[term][0]], dtype=np.uint32).tobytes(),
+        "posting_freqs": np.minimum([freq for term in terms for freq in postings[term][1]], 65535).astype(np.uint16).tobytes(),
+    }
+
+    body = bytearray(HEADER.size)
+    layout = []
+    for name in SECTIONS:
+        body.extend(b"\0" * (-len(body) % 8))
+        layout.extend((len(body), len(sections[name])))
+        body.extend(sections[name])
+    average_length = float(np.mean(lengths)) if lengths else 0.0
+    HEADER.pack_into(body, 0, MAGIC, VERSION, len(doc_ids), len(terms), int(posting_starts[-1]), average_length, *layout)
+    return bytes(body)
+
+def store_text_index(storage, date, snapshot=None, history_days=HISTORY_DAYS):
+    """
+    Builds the text index of the listings up to a daily snapshot and stores it next
+    to the snapshot.
+
+    Every snapshot only holds the listings crawled that day, so the index covers
+    the newest version of every listing in the last history_days snapshots, the
+    same listings the backend searches.
+
+    Parameters:
+        storage (Storage): Where the snapshots are stored.
+        date (str): The date of the snapshot.
+        snapshot (tuple): (manifest, records) as returned by read_snapshot, if
+            already read.
+        history_days (int): Number of snapshots covered, this one included.
+
+    Returns:
+        dict: Description of the index for the manifest (key relative to the
+        snapshot folder, date of the oldest snapshot covered, listings indexed,
+        size, build time), or None if there is no snapshot for the date.
+    """
+    prefix = f"snapshots/{date}/"
+    manifest, records = snapshot if snapshot is not None else read_snapshot(storage, prefix)
+    if manifest is None:
+        return None
+    started = time.perf_counter()
+    # The earlier snapshots with a manifest, newest first, as the backend counts them
+    earlier = []
+    days = {m.group(1) for m in map(_SNAPSHOT_RE.match, storage.list("snapshots/")) if m and m.group(1) < date}
+    for day in sorted(days, reverse=True)[:max(history_days - 1, 0)]:
+        day_manifest, day_records = read_snapshot(storage, f"snapshots/{day}/")
+        if day_manifest is not None:
+            earlier.insert(0, (day, day_records))
+    # Oldest first, so the newest version of a listing is the one indexed
+    window = [record for _, day_records in earlier for record in day_records] + records
+    body = build_text_index(window)
+    storage.put(f"{prefix}{TEXT_INDEX_NAME}", body)
+    listings = HEADER.unpack_from(body)[2]
+    logging.info(f"Built the text index of {listings} listings of {len(earlier) + 1} snapshots up to {date} in {time.perf_counter() - started:.2f}s ({len(body)} bytes)")
+    return {"key": TEXT_INDEX_NAME, "since": earlier[0][0] if earlier else date, "records": listings, "bytes": len(body), "built_at": time.time()}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build the text index of the listings up to a daily snapshot.")
+    parser.add_argument("--storage", default="s3://housing-listing-bucket", help="where the snapshots are: s3://<bucket> or a local directory")
+    parser.add_argument("--region", default="ap-east-1", help="region of the S3 bucket")
+    parser.add_argument("--date", default=datetime.date.today().strftime("%Y-%m-%d"), help="date of the snapshot")
+    args = parser.parse_args(argv)
+
+    storage = open_storage(args.storage, args.region)
+    info = store_text_index(storage, args.date)
+    if info is None:
+        logging.error(f"No snapshot for {args.date} in {args.storage}")
+        return 1
+    # Lets the backend know there is a (new) index for the snapshot
+    SnapshotSink(storage, f"snapshots/{args.date}/").annotate("text_index", info)
+    return 0
+
+if __name__ == '__main__':
+    # Rebuild the text index of a day, e.g. after changing the tokenizer:
+    #   python text_index.py --storage ./housing_data --date 2024-11-20
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    sys.exit(main())
@@ -0,0 +1,148 @@
+import os
+import queue
+import atexit
+import logging
+import threading
+
+import boto3
+
+from metrics import count, timed
+
+# Number of background upload threads
+UPLOAD_WORKERS = int(os.environ.get("CRAWLER_UPLOAD_WORKERS", 8))
+
+# Maximum number of objects waiting to be uploaded before submit() blocks
+UPLOAD_QUEUE_SIZE = int(os.environ.get("CRAWLER_UPLOAD_QUEUE_SIZE", 256))
+
+# One client per region, shared by every thread (boto3 clients are thread-safe)
+_s3_clients = {}
+_s3_clients_lock = threading.Lock()
+
+def get_s3_client(region_name):
+    """
+    Returns the long-lived S3 client for a region, creating it on first use.
+
+    Parameters:
+        region_name (str): The AWS region of the bucket.
+
+    Returns:
+        botocore.client.S3: The shared S3 client.
+    """
+    with _s3_clients_lock:
+        client = _s3_clients.get(region_name)
+        if client is None:
+            client = boto3.client('s3', region_name=region_name)
+            _s3_clients[region_name] = client
+    return client
+
+class UploadPipeline:
+    """
+    Uploads objects in the background on a pool of worker threads.
+
+    submit() only enqueues the object, so scraping carries on while uploads are in
+    flight. The queue is bounded: if uploads fall behind, submit() blocks until a
+    slot frees up instead of buffering the whole crawl in memory. close() waits for
+    every queued upload and is also run at interpreter exit.
+    """
+
+    _STOP = object()
+
+    def __init__(self, put, max_workers=UPLOAD_WORKERS, max_queue=UPLOAD_QUEUE_SIZE):
+        """
+        Parameters:
+            put (callable): Function called as put(key, body) to store one object.
+            max_workers (int): Number of upload threads.
+            max_queue (int): Maximum number of objects waiting to be uploaded.
+        """
+        self._put = put
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._lock = threading.Lock()
+        self._closed = False
+        self.uploaded = 0
+        self.failures = []
+
+        # Daemon threads so a forgotten close() cannot hang the interpreter;
+        # the atexit hook still drains the queue before exit.
+        self._threads = [threading.Thread(target=self._run, daemon=True) for _ in range(max_workers)]
+        for thread in self._threads:
+            thread.start()
+        atexit.register(self.close)
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            try:
+                if item is self._STOP:
+                    return
+                key, body, on_success = item
+                # Encoded once here, so the byte count is that of what is stored
+                if isinstance(body, str):
+                    body = body.encode('utf-8')
+                try:
+                    with timed("upload"):
+                        self._put(key, body)
+                except Exception as e:
+                    with self._lock:
+                        self.failures.append((key, e))
+                    count("upload_failures_total", cause=type(e).__name__)
+                    logging.error(f"Failed to upload {key}: {e}")
+                    continue
+                count("bytes_uploaded_total", len(body))
+                with self._lock:
+                    self.uploaded += 1
+                logging.info(f"Uploaded {key}.")
+                if on_success is not None:
+                    try:
+                        on_success()
+                    except Exception as e:
+                        logging.error(f"Upload callback for {key} failed: {e}")
+            finally:
+                self._queue.task_done()
+
+    def submit(self, key, body, on_success=None):
+        """
+        Queues an object for upload, blocking while the queue is full.
+
+        Parameters:
+            key (str): The object key.
+            body (str | bytes): The object content.
+            on_success (callable): Called without arguments once the object is stored.
+
+        Returns:
+            None
+        """
+        if self._closed:
+            raise RuntimeError("UploadPipeline is closed")
+        self._queue.put((key, body, on_success))
+
+    def flush(self):
+        """
+        Waits until every object submitted so far has been uploaded or has failed.
+
+        Returns:
+            list: (key, exception) pairs for the uploads that failed since the
+            previous flush.
+        """
+        self._queue.join()
+        with self._lock:
+            failures, self.failures = self.failures, []
+        return failures
+
+    def close(self):
+        """
+        Flushes the queue and stops the worker threads. Safe to call more than once.
+
+        Returns:
+            list: (key, exception) pairs for the uploads that failed since the
+            previous flush.
+        """
+        with self._lock:
+            if self._closed:
+                return list(self.failures)
+            self._closed = True
+        for _ in self._threads:
+            self._queue.put(self._STOP)
+        for thread in self._threads:
+            thread.join()
+        atexit.unregister(self.close)
+        return list(self.failures)
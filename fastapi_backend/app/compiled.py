@@ -0,0 +1,195 @@
+import json
+import mmap
+import struct
+
+import numpy as np
+
+# File layout, written by data_collector/compiled_snapshot.py; keep both in step
+MAGIC = b"HKCS"
+VERSION = 1
+HEADER = struct.Struct("<4sIQQ")
+
+# String ID of a missing value
+MISSING = 0xFFFFFFFF
+
+# Rows converted at once by StringColumn.to_bytes
+_BYTES_CHUNK = 65536
+
+class StringColumn:
+    """
+    A column of text values, stored as uint32 IDs into a string table.
+
+    The table is a uint64 array of offsets into UTF-8 data, so the column can sit
+    in a memory-mapped file as is; repeated values (districts, floor zones) are
+    stored once. Taking rows of a column gives a column sharing the same table.
+    """
+
+    def __init__(self, ids, offsets, data):
+        """
+        Parameters:
+            ids (np.ndarray): uint32 string ID of every row, MISSING for None.
+            offsets (np.ndarray): uint64 start of every string in data, plus the end.
+            data (np.ndarray): uint8 UTF-8 data of the strings.
+        """
+        self.ids = ids
+        self.offsets = offsets
+        self.data = data
+
+    @classmethod
+    def from_values(cls, values):
+        """
+        Builds a column from Python values; anything but None is stored as its str().
+
+        Parameters:
+            values (list): The values.
+
+        Returns:
+            StringColumn: The column.
+        """
+        strings = {}
+        ids = np.array([MISSING if v is None else strings.setdefault(str(v), len(strings)) for v in values], dtype=np.uint32)
+        encoded = [s.encode('utf-8') for s in strings]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.uint64)
+        np.cumsum([len(b) for b in encoded], out=offsets[1:])
+        return cls(ids, offsets, np.frombuffer(b"".join(encoded), dtype=np.uint8))
+
+    @staticmethod
+    def concatenate(columns):
+        """
+        Joins columns end to end. Columns with different string tables get a new
+        table holding only the strings they use.
+
+        Parameters:
+            columns (list): The StringColumns.
+
+        Returns:
+            StringColumn: The joined column.
+        """
+        if all(column.offsets is columns[0].offsets for column in columns):
+            return StringColumn(np.concatenate([column.ids for column in columns]), columns[0].offsets, columns[0].data)
+        columns = [column.compacted() for column in columns]
+        ids, offsets, data = [], [], []
+        count = size = 0
+        for column in columns:
+            ids.append(np.where(column.ids == MISSING, MISSING, column.ids + np.uint32(count)).astype(np.uint32))
+            offsets.append(column.offsets[:-1] + np.uint64(size))
+            data.append(column.data)
+            count += len(column.offsets) - 1
+            size += len(column.data)
+        offsets.append(np.array([size], dtype=np.uint64))
+        return StringColumn(np.concatenate(ids), np.concatenate(offsets), np.concatenate(data))
+
+    def compacted(self):
+        """
+        Returns the same column with a string table of only the strings it uses.
+
+        Returns:
+            StringColumn: The new column.
+        """
+        used, inverse = np.unique(self.ids, return_inverse=True)
+        # MISSING is the largest ID, so it can only be the last one used
+        present = used[:-1] if len(used) and used[-1] == MISSING else used
+        starts = self.offsets[present].astype(np.int64)
+        lengths = self.offsets[present + 1].astype(np.int64) - starts
+        offsets = np.zeros(len(present) + 1, dtype=np.uint64)
+        np.cumsum(lengths, out=offsets[1:])
+        # Position in data of every byte of the new table
+        positions = np.repeat(starts - offsets[:-1].astype(np.int64), lengths) + np.arange(int(offsets[-1]))
+        ids = np.where(inverse < len(present), inverse, MISSING).astype(np.uint32)
+        return StringColumn(ids, offsets, self.data[positions])
+
+    def __len__(self):
+        return len(self.ids)
+
+    def string(self, string_id):
+        """
+        Returns a string of the table.
+
+        Parameters:
+            string_id (int): Its ID.
+
+        Returns:
+            str: The string, or None for MISSING.
+        """
+        if string_id == MISSING:
+            return None
+        return self.data[self.offsets[string_id]:self.offsets[string_id + 1]].tobytes().decode('utf-8')
+
+    def __getitem__(self, i):
+        # A row gives its value; a slice or an array of rows gives a column
+        if isinstance(i, (int, np.integer)):
+            return self.string(int(self.ids[i]))
+        return StringColumn(self.ids[i], self.offsets, self.data)
+
+    def __iter__(self):
+        return (self.string(string_id) for string_id in self.ids.tolist())
+
+    def to_bytes(self):
+        """
+        Returns the UTF-8 value of every row as a fixed-width NumPy bytes array, without
+        creating a Python object per row, e.g. to compare columns with np.isin.
+
+        Returns:
+            np.ndarray: The values, b"" for None.
+        """
+        result = []
+        for start in range(0, len(self.ids), _BYTES_CHUNK):
+            ids = self.ids[start:start + _BYTES_CHUNK]
+            present = ids != MISSING
+            safe = np.where(present, ids, 0).astype(np.int64)
+            if len(self.data) == 0:
+                result.append(np.zeros(len(ids), dtype="S1"))
+                continue
+            starts = self.offsets[safe].astype(np.int64)
+            lengths = np.where(present, self.offsets[safe + 1].astype(np.int64) - starts, 0)
+            width = max(int(lengths.max(initial=0)), 1)
+            positions = np.minimum(starts[:, None] + np.arange(width), len(self.data) - 1)
+            chars = np.where(np.arange(width) < lengths[:, None], self.data[positions], 0).astype(np.uint8)
+            result.append(np.ascontiguousarray(chars).view(f"S{width}").ravel())
+        if not result:
+            return np.array([], dtype="S1")
+        return np.concatenate(result)
+
+class CompiledSnapshot:
+    """
+    A daily snapshot compiled by the crawler, memory-mapped read-only.
+
+    Opening it reads the header and the directory of the file; numeric columns,
+    string IDs and the string table are NumPy arrays over the mapped pages, so
+    nothing is parsed or copied, pages are only read as they are used, and every
+    process mapping the same file shares them.
+    """
+
+    def __init__(self, path):
+        """
+        Parameters:
+            path (str): The compiled snapshot file.
+
+        Raises:
+            ValueError: If the file is not a compiled snapshot of this version.
+        """
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, offset, size = HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a version {VERSION} compiled snapshot")
+        directory = json.loads(self._mmap[offset:offset + size])
+        self.size = directory["rows"]
+
+        def array(dtype, count, offset):
+            return np.frombuffer(self._mmap, dtype, count, offset)
+
+        strings = directory["strings"]
+        offsets = array(np.uint64, strings["count"] + 1, strings["offsets"])
+        data = array(np.uint8, strings["size"], strings["data"])
+        # Columns by name: float64 arrays (NaN when missing) or StringColumns
+        self.columns = {
+            name: (array(np.float64, self.size, column["offset"]) if column["type"] == "float64"
+                   else StringColumn(array(np.uint32, self.size, column["offset"]), offsets, data))
+            for name, column in directory["columns"].items()
+        }
+        # (ascending, descending) row orders of the columns listings are sorted by
+        self.orders = {
+            name: (array(np.uint32, self.size, order["ascending"]), array(np.uint32, self.size, order["descending"]))
+            for name, order in directory["orders"].items()
+        }
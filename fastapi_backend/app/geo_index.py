@@ -0,0 +1,292 @@
+import os
+
+import numpy as np
+
+from .listing_index import ListingIndex
+
+# Size of a grid cell in degrees (about 1.1 km north-south)
+CELL_DEGREES = float(os.environ.get("LISTINGS_GEO_CELL_DEGREES", 0.01))
+
+# Number of segments above which they are merged into one
+COMPACT_AFTER = int(os.environ.get("LISTINGS_GEO_COMPACT_AFTER", 8))
+
+# First radius tried by nearest(), doubled until enough listings are found
+NEAREST_START_RADIUS = 500.0
+
+EARTH_RADIUS_M = 6371008.8
+
+# Well-known places queries can be made around, as (latitude, longitude)
+PLACES = {
+    "hku": (22.2830, 114.1371),
+    "cuhk": (22.4196, 114.2068),
+    "hkust": (22.3364, 114.2654),
+    "polyu": (22.3049, 114.1795),
+    "cityu": (22.3360, 114.1730),
+    "hku-station": (22.2841, 114.1352),
+    "central-station": (22.2819, 114.1581),
+    "admiralty-station": (22.2793, 114.1646),
+    "tsim-sha-tsui-station": (22.2975, 114.1722),
+    "mong-kok-station": (22.3193, 114.1694),
+    "kowloon-tong-station": (22.3372, 114.1760),
+    "sha-tin-station": (22.3826, 114.1878),
+}
+
+# Cells per row of longitude in a cell key
+_LNG_CELLS = int(np.ceil(360 / CELL_DEGREES)) + 2
+
+def haversine_m(lat, lng, lats, lngs):
+    """
+    Great-circle distances from one point to many.
+
+    Parameters:
+        lat (float): Latitude of the point, in degrees.
+        lng (float): Longitude of the point, in degrees.
+        lats (np.ndarray): Latitudes, in degrees.
+        lngs (np.ndarray): Longitudes, in degrees.
+
+    Returns:
+        np.ndarray: Distances in metres.
+    """
+    lat1 = np.radians(lat)
+    lats2 = np.radians(lats)
+    a = (np.sin((lats2 - lat1) / 2) ** 2
+         + np.cos(lat1) * np.cos(lats2) * np.sin(np.radians(lngs - lng) / 2) ** 2)
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+def _cells(values):
+    return np.floor(values / CELL_DEGREES).astype(np.int64)
+
+def listing_dates(listings):
+    """
+    Returns the snapshot date of every row of a ListingIndex, for GeoSegment.
+
+    Parameters:
+        listings (ListingIndex): The listings, all of the same snapshot.
+
+    Returns:
+        np.ndarray: datetime64[D] dates; NaT if the index has no snapshot date.
+    """
+    return np.full(listings.size, np.datetime64(listings.snapshot or "NaT", "D"))
+
+def _cell_keys(lats, lngs):
+    # Cells of the same latitude row have consecutive keys
+    return (_cells(lats) + _LNG_CELLS) * _LNG_CELLS + _cells(lngs) + _LNG_CELLS // 2
+
+class GeoSegment:
+    """
+    Listings with coordinates from one batch, ordered by grid cell.
+
+    Rows are sorted by cell key, so the listings of a run of cells along a latitude
+    row are a contiguous slice found with two binary searches. Every row keeps the
+    date of the snapshot it comes from, so it can expire. Segments are never
+    modified; whether a row is still the latest version of its listing, and still
+    recent enough, is tracked by the GeoIndex holding the segment.
+    """
+
+    def __init__(self, listings, dates=None):
+        """
+        Parameters:
+            listings (ListingIndex): The listings of the batch; those without
+                coordinates are left out.
+            dates (np.ndarray): datetime64[D] snapshot date of every row of
+                listings; listings.snapshot for all of them if None.
+        """
+        dates = listing_dates(listings) if dates is None else dates
+        lats = listings.columns["latitude"]
+        lngs = listings.columns["longitude"]
+        located = np.flatnonzero(~np.isnan(lats) & ~np.isnan(lngs))
+        keys = _cell_keys(lats[located], lngs[located])
+        order = np.argsort(keys, kind="stable")
+        rows = located[order]
+
+        # Row of every segment row in listings
+        self.record_rows = rows
+        self.keys = keys[order]
+        self.lats = lats[rows]
+        self.lngs = lngs[rows]
+        self.dates = dates[rows]
+        self.listings = listings.take(rows)
+        self.ids = self.listings.columns["property_id"].to_bytes()
+        self.size = len(rows)
+
+    def rows_near(self, lat, lng, radius_m):
+        """
+        Returns the rows in the grid cells covering a circle; a superset of the rows inside it.
+
+        Parameters:
+            lat (float): Latitude of the centre.
+            lng (float): Longitude of the centre.
+            radius_m (float): Radius in metres.
+
+        Returns:
+            np.ndarray: The row IDs.
+        """
+        dlat = np.degrees(radius_m / EARTH_RADIUS_M)
+        # Longitude degrees shrink towards the poles; use the widest span in the box
+        cos_lat = max(np.cos(np.radians(min(abs(lat) + dlat, 90.0))), 1e-6)
+        dlng = min(np.degrees(radius_m / (EARTH_RADIUS_M * cos_lat)), 180.0)
+        lat_cells = np.arange(_cells(np.float64(lat - dlat)), _cells(np.float64(lat + dlat)) + 1)
+        low = (lat_cells + _LNG_CELLS) * _LNG_CELLS + _cells(np.float64(lng - dlng)) + _LNG_CELLS // 2
+        high = (lat_cells + _LNG_CELLS) * _LNG_CELLS + _cells(np.float64(lng + dlng)) + _LNG_CELLS // 2
+        starts = np.searchsorted(self.keys, low, "left")
+        stops = np.searchsorted(self.keys, high, "right")
+        slices = [np.arange(start, stop) for start, stop in zip(starts, stops) if stop > start]
+        return np.concatenate(slices) if slices else np.array([], dtype=np.intp)
+
+class GeoIndex:
+    """
+    Spatial index over the listings of every loaded snapshot, one GeoSegment per batch.
+
+    Adding a snapshot builds a segment for its listings only and marks the older
+    rows of the same listings as superseded, so the index grows incrementally as
+    daily snapshots land. since() drops the rows of snapshots that fell out of the
+    history window, so listings that are no longer crawled expire. Segments without
+    a current row are dropped, and once there are more than COMPACT_AFTER segments,
+    the current rows are merged into a single segment. with_listings and since return a new index and leave the old one
+    untouched, so it can be swapped in while requests use the old one.
+    """
+
+    def __init__(self, segments=(), current=()):
+        """
+        Parameters:
+            segments (tuple): The GeoSegments, oldest first.
+            current (tuple): For each segment, a boolean array of the rows that are
+            the latest version of their listing and have not expired.
+        """
+        self.segments = tuple(segments)
+        self.current = tuple(current)
+        self.size = int(sum(np.count_nonzero(alive) for alive in self.current))
+
+    def _tidied(self):
+        # Drops segments without a current row, and compacts once there are too many
+        kept = [(segment, alive) for segment, alive in zip(self.segments, self.current) if alive.any()]
+        index = GeoIndex([segment for segment, _ in kept], [alive for _, alive in kept])
+        if len(index.segments) > COMPACT_AFTER:
+            index = index.compacted()
+        return index
+
+    def with_records(self, records):
+        """
+        Returns an index that also holds a batch of listings, newer than those already in it.
+
+        Parameters:
+            records (list): The listing dicts, e.g. the listings of a daily snapshot.
+
+        Returns:
+            GeoIndex: The new index.
+        """
+        return self.with_listings(ListingIndex(records))
+
+    def with_listings(self, listings, dates=None):
+        """
+        Returns an index that also holds a batch of listings, newer than those already in it.
+
+        Parameters:
+            listings (ListingIndex): The listings, e.g. those of a daily snapshot.
+            dates (np.ndarray): datetime64[D] snapshot date of every listing, for a
+                batch of several snapshots; listings.snapshot if None.
+
+        Returns:
+            GeoIndex: The new index.
+        """
+        segment = GeoSegment(listings, dates)
+        # Every listing of the batch supersedes its older rows, even if it has no coordinates now
+        batch_ids = listings.columns["property_id"].to_bytes()
+        current = [alive & ~np.isin(old.ids, batch_ids) for old, alive in zip(self.segments, self.current)]
+        # A listing appearing twice in the batch counts once, at its last row
+        latest = np.zeros(segment.size, dtype=bool)
+        if segment.size:
+            _, last = np.unique(batch_ids[::-1], return_index=True)
+            latest = np.isin(segment.record_rows, listings.size - 1 - last)
+        return GeoIndex(self.segments + (segment,), tuple(current) + (latest,))._tidied()
+
+    def since(self, oldest):
+        """
+        Returns an index without the listings of snapshots older than a date.
+
+        Parameters:
+            oldest (str): Date of the oldest snapshot to keep, e.g. "2024-11-20".
+
+        Returns:
+            GeoIndex: The new index, or this one if nothing is older.
+        """
+        oldest = np.datetime64(oldest, "D")
+        # Rows without a snapshot date never expire
+        current = [alive & ~(segment.dates < oldest) for segment, alive in zip(self.segments, self.current)]
+        if all(np.array_equal(new, alive) for new, alive in zip(current, self.current)):
+            return self
+        return GeoIndex(self.segments, current)._tidied()
+
+    def compacted(self):
+        """
+        Returns the same index with the current rows of every segment merged into one.
+
+        Returns:
+            GeoIndex: The compacted index.
+        """
+        rows = [np.flatnonzero(alive) for alive in self.current]
+        parts = [segment.listings.take(r) for segment, r in zip(self.segments, rows)]
+        dates = [segment.dates[r] for segment, r in zip(self.segments, rows)]
+        if not parts:
+            return GeoIndex()
+        return GeoIndex().with_listings(ListingIndex.concatenate(parts), np.concatenate(dates))
+
+    def _within(self, lat, lng, radius_m):
+        # (distances, segment number, row) of every current listing inside the circle
+        distances, segment_numbers, rows = [], [], []
+        for number, (segment, alive) in enumerate(zip(self.segments, self.current)):
+            candidates = segment.rows_near(lat, lng, radius_m)
+            candidates = candidates[alive[candidates]]
+            d = haversine_m(lat, lng, segment.lats[candidates], segment.lngs[candidates])
+            inside = d <= radius_m
+            distances.append(d[inside])
+            rows.append(candidates[inside])
+            segment_numbers.append(np.full(np.count_nonzero(inside), number))
+        if not distances:
+            return np.array([]), np.array([], dtype=np.intp), np.array([], dtype=np.intp)
+        return np.concatenate(distances), np.concatenate(segment_numbers), np.concatenate(rows)
+
+    def _results(self, distances, segment_numbers, rows, limit):
+        order = np.argsort(distances, kind="stable")[:limit]
+        return [
+            {**self.segments[segment_numbers[i]].listings.row(rows[i]), "distance_m": round(float(distances[i]), 1)}
+            for i in order
+        ]
+
+    def within(self, lat, lng, radius_m, limit=50):
+        """
+        Finds the listings within a distance of a point, nearest first.
+
+        Parameters:
+            lat (float): Latitude of the point.
+            lng (float): Longitude of the point.
+            radius_m (float): Distance in metres.
+            limit (int): Maximum number of listings to return.
+
+        Returns:
+            tuple: (number of listings within the distance, list of listing dicts with distance_m).
+        """
+        distances, segment_numbers, rows = self._within(lat, lng, radius_m)
+        return len(distances), self._results(distances, segment_numbers, rows, limit)
+
+    def nearest(self, lat, lng, k=10):
+        """
+        Finds the k listings nearest to a point.
+
+        The search radius starts at NEAREST_START_RADIUS and doubles until the circle
+        holds at least k listings; those are then exactly the k nearest.
+
+        Parameters:
+            lat (float): Latitude of the point.
+            lng (float): Longitude of the point.
+            k (int): Number of listings wanted.
+
+        Returns:
+            list: Up to k listing dicts with distance_m, nearest first.
+        """
+        radius_m = NEAREST_START_RADIUS
+        while True:
+            distances, segment_numbers, rows = self._within(lat, lng, radius_m)
+            if len(distances) >= min(k, self.size) or radius_m > np.pi * EARTH_RADIUS_M:
+                return self._results(distances, segment_numbers, rows, k)
+            radius_m *= 2
@@ -0,0 +1,286 @@
+import math
+
+import numpy as np
+
+from .compiled import StringColumn
+
+# Fields kept in memory and returned for every listing
+TEXT_FIELDS = ("property_id", "title", "district", "floor_zone", "estate_entry_month")
+NUMERIC_FIELDS = (
+    "rent_hkd", "saleable_area_sqft", "gross_area_sqft", "floor_number",
+    "building_age_years", "latitude", "longitude",
+)
+FIELDS = TEXT_FIELDS + NUMERIC_FIELDS
+
+# Sort keys accepted by ListingIndex.search, with the field each one sorts on
+SORT_FIELDS = {"rent": "rent_hkd", "area": "saleable_area_sqft"}
+
+# Below this share of all listings, matches are sorted directly rather than
+# picked out of the presorted index
+_DIRECT_SORT_SHARE = 0.1
+
+def _floats(values):
+    return np.array([
+        float(v) if isinstance(v, (int, float)) and not isinstance(v, bool) else np.nan
+        for v in values
+    ], dtype=np.float64)
+
+def _plain(value):
+    # numpy scalars and NaN as JSON-friendly Python values
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    return value
+
+class ListingIndex:
+    """
+    Listings of a snapshot held column by column in NumPy arrays (text as
+    StringColumns).
+
+    Rent and saleable area have precomputed sort orders (missing values last), so a
+    range filter is a binary search giving a slice of row IDs, and every district has
+    the sorted list of its rows. A query starts from the smallest of those candidate
+    sets, checks the remaining filters on the columns of the candidates only and then
+    orders the matches, either by sorting them directly or, when they are many, by
+    picking them out of the presorted index. The index is never modified once built;
+    a new snapshot gets a new index.
+    """
+
+    def __init__(self, records, snapshot=None):
+        """
+        Parameters:
+            records (list): The listing dicts of the snapshot.
+            snapshot (str): The date of the snapshot, if any.
+        """
+        columns = {field: StringColumn.from_values([r.get(field) for r in records]) for field in TEXT_FIELDS}
+        columns.update({field: _floats([r.get(field) for r in records]) for field in NUMERIC_FIELDS})
+        self._build(columns, len(records), snapshot, {})
+
+    @classmethod
+    def from_columns(cls, columns, size, snapshot=None, orders=None):
+        """
+        Builds an index over existing columns without copying them, e.g. those of a
+        memory-mapped CompiledSnapshot.
+
+        Parameters:
+            columns (dict): float64 arrays (NaN when missing) for NUMERIC_FIELDS and
+                StringColumns for TEXT_FIELDS; other keys are ignored, and a missing
+                or mistyped field is treated as missing in every row.
+            size (int): Number of rows.
+            snapshot (str): The date of the snapshot, if any.
+            orders (dict): Precomputed (ascending, descending) row orders by field,
+                as ListingIndex computes them, for any of the SORT_FIELDS.
+
+        Returns:
+            ListingIndex: The index.
+        """
+        index = cls.__new__(cls)
+        index._build(columns, size, snapshot, orders or {})
+        return index
+
+    def _build(self, columns, size, snapshot, orders):
+        self.snapshot = snapshot
+        self.size = size
+        self.columns = {}
+        for field in TEXT_FIELDS:
+            column = columns.get(field)
+            self.columns[field] = column if isinstance(column, StringColumn) else StringColumn.from_values([None] * size)
+        for field in NUMERIC_FIELDS:
+            column = columns.get(field)
+            self.columns[field] = column if isinstance(column, np.ndarray) and column.dtype == np.float64 else np.full(size, np.nan)
+
+        # District of every row as a code into district_names (case-insensitive),
+        # looking at every distinct value once
+        districts = self.columns["district"]
+        distinct, inverse = np.unique(districts.ids, return_inverse=True)
+        names = np.array([(districts.string(int(i)) or "").strip().lower() for i in distinct], dtype=object)
+        names, codes = np.unique(names, return_inverse=True) if len(names) else (names, np.array([], dtype=np.intp))
+        self.district_names = names
+        self.district_codes = codes[inverse].astype(np.int32)
+        order = np.argsort(self.district_codes, kind="stable")
+        bounds = np.searchsorted(self.district_codes[order], np.arange(len(names) + 1))
+        self._district_rows = {name: order[bounds[i]:bounds[i + 1]] for i, name in enumerate(names) if name}
+
+        # Row IDs by ascending and by descending value (missing values last, ties in
+        # row order either way), and the sorted values for binary searches
+        self._orders = {}
+        self._descending_orders = {}
+        self._sorted = {}
+        self._valid = {}
+        for field in SORT_FIELDS.values():
+            column = self.columns[field]
+            valid = int(np.count_nonzero(~np.isnan(column)))
+            if field in orders:
+                order, descending = orders[field]
+            else:
+                order = np.argsort(column, kind="stable")
+                descending = np.concatenate([
+                    order[:valid][np.argsort(-column[order[:valid]], kind="stable")], order[valid:]])
+            self._orders[field] = order
+            self._descending_orders[field] = descending
+            self._sorted[field] = column[order]
+            self._valid[field] = valid
+
+    def take(self, rows):
+        """
+        Returns an index of some of the listings.
+
+        Parameters:
+            rows (np.ndarray): Their row IDs, in the order wanted.
+
+        Returns:
+            ListingIndex: The new index; text columns share their string tables with this one.
+        """
+        return ListingIndex.from_columns({field: self.columns[field][rows] for field in FIELDS}, len(rows), self.snapshot)
+
+    @staticmethod
+    def concatenate(indexes, snapshot=None):
+        """
+        Returns an index of the listings of several indexes, one after the other.
+
+        Parameters:
+            indexes (list): The ListingIndexes.
+            snapshot (str): The date of the snapshot the new index stands for, if any.
+
+        Returns:
+            ListingIndex: The new index.
+        """
+        if not indexes:
+            return ListingIndex([], snapshot)
+        columns = {field: StringColumn.concatenate([index.columns[field] for index in indexes]) for field in TEXT_FIELDS}
+        columns.update({field: np.concatenate([index.columns[field] for index in indexes]) for field in NUMERIC_FIELDS})
+        return ListingIndex.from_columns(columns, sum(index.size for index in indexes), snapshot)
+
+    @staticmethod
+    def latest(indexes, snapshot=None):
+        """
+        Returns an index of the newest version of every listing of several indexes,
+        e.g. of daily snapshots that each only hold the listings crawled that day.
+
+        Parameters:
+            indexes (list): The ListingIndexes, oldest first; a listing of a later
+                index replaces its rows in earlier ones, matched by property_id.
+            snapshot (str): The date of the snapshot the new index stands for, if any.
+
+        Returns:
+            ListingIndex: The new index, its listings in the order of their newest rows.
+        """
+        listings = ListingIndex.concatenate(indexes, snapshot)
+        if listings.size == 0:
+            return listings
+        ids = listings.columns["property_id"].to_bytes()
+        _, last = np.unique(ids[::-1], return_index=True)
+        rows = np.sort(listings.size - 1 - last)
+        if len(rows) == listings.size:
+            return listings
+        return ListingIndex.from_columns({field: listings.columns[field][rows] for field in FIELDS}, len(rows), snapshot)
+
+    def _range_rows(self, field, low, high):
+        # Rows with low <= value <= high, as a slice of the sort order; missing values never match
+        values = self._sorted[field]
+        start = 0 if low is None else np.searchsorted(values, low, "left")
+        stop = self._valid[field] if high is None else np.searchsorted(values, high, "right")
+        return self._orders[field][start:max(start, stop)]
+
+    def _ordered(self, rows, field, descending):
+        """
+        Orders matching rows by a field, missing values last and ties in row order.
+
+        Parameters:
+            rows (np.ndarray): The matching row IDs, or None for every row.
+            field (str): The field to sort on.
+            descending (bool): Whether the highest values come first.
+
+        Returns:
+            np.ndarray: The row IDs in order.
+        """
+        if rows is not None and len(rows) < self.size * _DIRECT_SORT_SHARE:
+            # Back in row order first, so the stable sort keeps ties in row order
+            rows = np.sort(rows)
+            values = self.columns[field][rows]
+            # Negating keeps NaN, which argsort puts last either way
+            return rows[np.argsort(-values if descending else values, kind="stable")]
+
+        order = (self._descending_orders if descending else self._orders)[field]
+        if rows is None:
+            return order
+        member = np.zeros(self.size, dtype=bool)
+        member[rows] = True
+        return order[member[order]]
+
+    def search(self, districts=None, min_rent=None, max_rent=None, min_area=None, max_area=None,
+               sort="rent", offset=0, limit=20, matches=None):
+        """
+        Finds the listings matching every given filter.
+
+        Parameters:
+            districts (list): District names, any of which matches (case-insensitive).
+            min_rent (float): Lowest monthly rent in HKD.
+            max_rent (float): Highest monthly rent in HKD.
+            min_area (float): Smallest saleable area in square feet.
+            max_area (float): Largest saleable area in square feet.
+            sort (str): "rent" or "area", prefixed with "-" for descending order, or
+                "relevance" for the order of matches.
+            offset (int): Number of matches to skip.
+            limit (int): Maximum number of matches to return.
+            matches (np.ndarray): Row IDs the listings must be among, best first,
+                e.g. the matches of a text search.
+
+        Returns:
+            tuple: (total number of matches, list of listing dicts for the page).
+
+        Raises:
+            ValueError: If the sort key is unknown, or is "relevance" without matches.
+        """
+        descending = sort.startswith("-")
+        field = SORT_FIELDS.get(sort.lstrip("-"))
+        if sort == "relevance":
+            if matches is None:
+                raise ValueError("Sorting by relevance needs a text query")
+        elif field is None:
+            raise ValueError(f"Unknown sort key {sort!r}; use one of {', '.join(SORT_FIELDS)}, relevance")
+
+        # Each filter as candidate rows and as a check on the columns of other rows
+        filters = []
+        for column, low, high in (("rent_hkd", min_rent, max_rent), ("saleable_area_sqft", min_area, max_area)):
+            if low is None and high is None:
+                continue
+            values = self.columns[column]
+            check = lambda rows, values=values, low=low, high=high: (
+                (values[rows] >= (-np.inf if low is None else low)) & (values[rows] <= (np.inf if high is None else high)))
+            filters.append((self._range_rows(column, low, high), check))
+        if districts:
+            wanted = [name.strip().lower() for name in districts]
+            rows = [self._district_rows[name] for name in wanted if name in self._district_rows]
+            rows = np.concatenate(rows) if rows else np.array([], dtype=np.intp)
+            codes = np.flatnonzero(np.isin(self.district_names, wanted))
+            filters.append((rows, lambda rows, codes=codes: np.isin(self.district_codes[rows], codes)))
+        if matches is not None:
+            filters.append((matches, lambda rows: np.isin(rows, matches)))
+
+        rows = None
+        if filters:
+            filters.sort(key=lambda f: len(f[0]))
+            rows = filters[0][0]
+            for _, check in filters[1:]:
+                rows = rows[check(rows)]
+
+        if sort == "relevance":
+            ordered = matches[np.isin(matches, rows)]
+        else:
+            ordered = self._ordered(rows, field, descending)
+        page = ordered[offset:offset + limit]
+        return len(ordered), [self.row(i) for i in page]
+
+    def row(self, i):
+        """
+        Returns a listing.
+
+        Parameters:
+            i (int): The row ID.
+
+        Returns:
+            dict: The listing fields, with None for missing values.
+        """
+        return {field: _plain(self.columns[field][i]) for field in FIELDS}
@@ -1,8 +1,28 @@
-from typing import Union
+import time
+from contextlib import asynccontextmanager
+from typing import List, Union
 
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException, Query
 
-app = FastAPI()
+from .listing_index import SORT_FIELDS
+from .geo_index import PLACES
+from .reloader import IndexReloader
+from .roommates import RoommateIndex, RoommateProfile
+
+# Listing and spatial indexes of the snapshots, reloaded in the background
+reloader = IndexReloader()
+
+# Roommate profiles, kept in memory
+roommates = RoommateIndex()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    reloader.start()
+    yield
+    reloader.stop()
+
+app = FastAPI(lifespan=lifespan)
 
 
 @app.get("/")
@@ -12,3 +32,122 @@ def read_root():
 @app.get("/items/{item_id}")
 def read_item(item_id: int, q: str = None):
     return {"item_id": item_id, "q": q}
+
+@app.get("/listings")
+def search_listings(
+    district: Union[List[str], None] = Query(None),
+    min_rent: float = None,
+    max_rent: float = None,
+    min_area: float = None,
+    max_area: float = None,
+    q: str = Query(None, max_length=200),
+    sort: str = Query(None, pattern="^(relevance|-?(" + "|".join(SORT_FIELDS) + "))$"),
+    offset: int = Query(0, ge=0),
+    limit: int = Query(20, ge=1, le=100),
+):
+    started = time.perf_counter()
+    # One reference for the whole request, so a reload cannot change the index midway
+    index = reloader.index
+    matches = None
+    if q:
+        text = reloader.text
+        if text is None:
+            raise HTTPException(status_code=503, detail="The text index is not loaded yet")
+        # Searched in the listings the text index was built from
+        text, index = text
+        matches = text.matching_rows(q, index)
+    try:
+        total, results = index.search(district, min_rent, max_rent, min_area, max_area,
+                                      sort or ("relevance" if q else "rent"), offset, limit, matches)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {
+        "snapshot": index.snapshot,
+        "total": total,
+        "offset": offset,
+        "limit": limit,
+        "took_ms": round((time.perf_counter() - started) * 1e3, 3),
+        "results": results,
+    }
+
+def _point(lat, lng, place):
+    # The point of a spatial query, given as coordinates or as the name of a place
+    if place is not None:
+        if place.lower() not in PLACES:
+            raise HTTPException(status_code=404, detail=f"Unknown place {place!r}; use one of {', '.join(PLACES)}")
+        return PLACES[place.lower()]
+    if lat is None or lng is None:
+        raise HTTPException(status_code=400, detail="Give lat and lng, or place")
+    return lat, lng
+
+@app.get("/listings/nearby")
+def nearby_listings(
+    lat: float = Query(None, ge=-90, le=90),
+    lng: float = Query(None, ge=-180, le=180),
+    place: str = None,
+    radius: float = Query(1000, gt=0, le=50000),
+    limit: int = Query(50, ge=1, le=500),
+):
+    started = time.perf_counter()
+    lat, lng = _point(lat, lng, place)
+    total, results = reloader.geo.within(lat, lng, radius, limit)
+    return {
+        "lat": lat,
+        "lng": lng,
+        "radius": radius,
+        "total": total,
+        "took_ms": round((time.perf_counter() - started) * 1e3, 3),
+        "results": results,
+    }
+
+@app.get("/listings/nearest")
+def nearest_listings(
+    lat: float = Query(None, ge=-90, le=90),
+    lng: float = Query(None, ge=-180, le=180),
+    place: str = None,
+    k: int = Query(10, ge=1, le=500),
+):
+    started = time.perf_counter()
+    lat, lng = _point(lat, lng, place)
+    results = reloader.geo.nearest(lat, lng, k)
+    return {
+        "lat": lat,
+        "lng": lng,
+        "took_ms": round((time.perf_counter() - started) * 1e3, 3),
+        "results": results,
+    }
+
+@app.put("/roommates/{user_id}")
+def put_roommate_profile(user_id: str, profile: RoommateProfile):
+    roommates.upsert(user_id, profile)
+    return {"user_id": user_id, "profile": profile}
+
+@app.get("/roommates/{user_id}")
+def get_roommate_profile(user_id: str):
+    profile = roommates.get(user_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail=f"No profile for {user_id!r}")
+    return {"user_id": user_id, "profile": profile}
+
+@app.delete("/roommates/{user_id}")
+def delete_roommate_profile(user_id: str):
+    if not roommates.remove(user_id):
+        raise HTTPException(status_code=404, detail=f"No profile for {user_id!r}")
+    return {"user_id": user_id}
+
+@app.get("/roommates/{user_id}/matches")
+def roommate_matches(
+    user_id: str,
+    k: int = Query(10, ge=1, le=100),
+    approximate: bool = False,
+):
+    started = time.perf_counter()
+    try:
+        results = roommates.top_k(user_id, k, approximate)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"No profile for {user_id!r}")
+    return {
+        "user_id": user_id,
+        "took_ms": round((time.perf_counter() - started) * 1e3, 3),
+        "results": results,
+    }
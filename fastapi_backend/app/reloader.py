@@ -0,0 +1,217 @@
+import os
+import time
+import logging
+import threading
+
+import numpy as np
+
+from .snapshots import SnapshotSource, snapshot_dates, read_manifest, read_parts
+from .listing_index import ListingIndex, FIELDS
+from .geo_index import GeoIndex, listing_dates
+from .text_index import TextIndex
+from .compiled import CompiledSnapshot
+
+# Seconds between checks for a newer snapshot
+RELOAD_INTERVAL = float(os.environ.get("LISTINGS_RELOAD_INTERVAL", 300))
+
+# Number of most recent daily snapshots the spatial index starts from
+GEO_HISTORY_DAYS = int(os.environ.get("LISTINGS_GEO_HISTORY_DAYS", 30))
+
+# Whether to memory-map the compiled snapshots the crawler builds, rather than read the parts
+USE_COMPILED = os.environ.get("LISTINGS_USE_COMPILED", "1") == "1"
+
+def _version(manifest):
+    # A snapshot changes while its day's crawl is still adding parts
+    return manifest["records"], len(manifest["parts"])
+
+class IndexReloader:
+    """
+    Keeps the indexes of the crawler's snapshots, reloading them in the background.
+
+    Every snapshot only holds the listings crawled that day, so both listing indexes
+    cover the last GEO_HISTORY_DAYS snapshots. index is the ListingIndex of the newest
+    version of every listing in them, rebuilt from the per-day ListingIndexes (over
+    the memory-mapped columns of a compiled file where the crawler has built one)
+    whenever a snapshot is added, grows or falls out of the window. geo is their
+    GeoIndex; each new or grown snapshot is added to it as one more segment rather
+    than rebuilding it, and the listings of snapshots that fall out of the window are
+    dropped from it. text is the TextIndex of the latest snapshot that has one,
+    memory-mapped from the file the crawler builds over the same window at the end of
+    a day's crawl, paired with the ListingIndex of the listings it covers as a
+    (TextIndex, ListingIndex) tuple: text searches are answered from those listings,
+    as the latest snapshot can grow after its text index is built. New indexes are
+    built on the reloader's thread while requests go on using the current ones, then
+    swapped in with a single assignment each, so a request sees either an old index
+    or a new one, never a mix of both.
+    """
+
+    def __init__(self, source=None, interval=RELOAD_INTERVAL, use_compiled=USE_COMPILED):
+        """
+        Parameters:
+            source (SnapshotSource): Where the snapshots are; LISTINGS_STORAGE if None.
+            interval (float): Seconds between checks for a newer snapshot.
+            use_compiled (bool): Whether to load compiled snapshots where they exist.
+        """
+        self.source = source
+        self.interval = interval
+        self.use_compiled = use_compiled
+        self.index = ListingIndex([])
+        self.geo = GeoIndex()
+        self.text = None
+        self.versions = {}
+        self._days = {}
+        self._text_version = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def reload(self):
+        """
+        Loads the snapshots that are new or have grown since the last reload.
+
+        Returns:
+            bool: True if new indexes were swapped in.
+        """
+        if self.source is None:
+            self.source = SnapshotSource()
+        dates = snapshot_dates(self.source)[-GEO_HISTORY_DAYS:]
+        # Only the latest loaded day can still grow; earlier ones are final
+        newest_loaded = max(self.versions, default="")
+        changed = []
+        manifests = {}
+        for date in dates:
+            if date < newest_loaded:
+                continue
+            manifest = manifests[date] = read_manifest(self.source, date)
+            if manifest is not None and self.versions.get(date) != _version(manifest):
+                changed.append((date, manifest))
+        # Listings only found in snapshots older than the window expire
+        geo = self.geo.since(dates[0]) if dates else self.geo
+        expired = [date for date in self._days if dates and date < dates[0]]
+        if not changed and not expired:
+            return self._reload_text(dates, manifests)
+
+        days = {date: listings for date, listings in self._days.items() if date not in expired}
+        batch = []
+        for date, manifest in changed:
+            started = time.perf_counter()
+            listings = days[date] = self._load(date, manifest)
+            batch.append(listings)
+            logging.info(f"Loaded {listings.size} listings of snapshot {date} in {time.perf_counter() - started:.2f}s")
+        # Days loaded together form one segment, in date order so later versions win
+        if len(batch) == 1:
+            geo = geo.with_listings(batch[0])
+        elif batch:
+            geo = geo.with_listings(ListingIndex.concatenate(batch), np.concatenate([listing_dates(listings) for listings in batch]))
+        index = ListingIndex.latest([days[date] for date in sorted(days)], max(days, default=None))
+
+        self.index = index
+        self.geo = geo
+        self._days = days
+        for date in expired:
+            self.versions.pop(date, None)
+        for date, manifest in changed:
+            self.versions[date] = _version(manifest)
+        self._reload_text(dates, manifests)
+        return True
+
+    def _load(self, date, manifest):
+        """
+        Loads the listings of a snapshot, memory-mapping its compiled file when the
+        crawler has built one for every part, reading the parts otherwise.
+
+        Parameters:
+            date (str): The date of the snapshot.
+            manifest (dict): Its manifest.
+
+        Returns:
+            ListingIndex: The listings.
+        """
+        compiled = manifest.get("compiled") if self.use_compiled else None
+        if compiled is not None and compiled["records"] == manifest["records"]:
+            path = self.source.local_path(f"snapshots/{date}/{compiled['key']}", str(compiled["built_at"]))
+            if path is not None:
+                snapshot = CompiledSnapshot(path)
+                return ListingIndex.from_columns(snapshot.columns, snapshot.size, date, snapshot.orders)
+        return ListingIndex(read_parts(self.source, date, manifest, FIELDS), date)
+
+    def _reload_text(self, dates, manifests):
+        """
+        Maps the text index of the latest snapshot that has one, paired with the
+        listings it was built from: the newest version of every listing in the
+        snapshots from info["since"] to its own. Until the latest snapshot has one,
+        the newest earlier one is used, so a text search may answer from listings a
+        day old, but documents are never matched to the rows of other listings.
+
+        Parameters:
+            dates (list): Dates of the snapshots in the window, oldest first.
+            manifests (dict): Manifests already read, by date.
+
+        Returns:
+            bool: True if a new text index was swapped in.
+        """
+        for date in (dates[::-1] if self.text is None else dates[-1:]):
+            manifest = manifests[date] if date in manifests else read_manifest(self.source, date)
+            info = (manifest or {}).get("text_index")
+            if info is None:
+                continue
+            version = (date, info["built_at"])
+            if version == self._text_version:
+                return False
+            # Indexes built before they covered several snapshots only cover their own
+            since = info.get("since", date)
+            covered = [day for day in sorted(self._days) if since <= day <= date]
+            if not covered or covered[0] != since:
+                logging.warning(f"Not using the text index of snapshot {date}: it covers snapshots since {since}, which are not all loaded")
+                continue
+            path = self.source.local_path(f"snapshots/{date}/{info['key']}", str(info["built_at"]))
+            if path is None:
+                continue
+            text = TextIndex(path)
+            if covered == sorted(self._days) and date == self.index.snapshot:
+                listings = self.index
+            else:
+                listings = ListingIndex.latest([self._days[day] for day in covered], date)
+            if text.size != listings.size:
+                logging.warning(f"Not using the text index of snapshot {date}: it has {text.size} listings, "
+                                f"the snapshots since {since} have {listings.size}")
+                continue
+            # Matches documents to the rows of the listings before requests need it
+            text.rows_in(listings)
+            self.text = (text, listings)
+            self._text_version = version
+            logging.info(f"Mapped the text index of snapshot {date} ({text.size} listings since {since})")
+            return True
+        return False
+
+    def _run(self):
+        while True:
+            try:
+                self.reload()
+            except Exception as e:
+                logging.error(f"Failed to reload the listing indexes: {e}")
+            if self._stop.wait(self.interval):
+                return
+
+    def start(self):
+        """
+        Starts loading and reloading on a background thread; requests are answered
+        from empty indexes until the first load completes.
+
+        Returns:
+            None
+        """
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """
+        Stops the background thread.
+
+        Returns:
+            None
+        """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
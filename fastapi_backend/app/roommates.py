@@ -0,0 +1,351 @@
+import os
+import math
+import threading
+from typing import List, Literal
+
+import numpy as np
+from pydantic import BaseModel, Field, model_validator
+
+from .geo_index import haversine_m
+
+# Weight of every group of features in the compatibility score; a difference of
+# one unit (see profile_features) in a feature costs its weight squared
+FEATURE_WEIGHTS = {
+    "budget": 1.5,
+    "location": 1.0,
+    "schedule": 1.0,
+    "habits": 0.8,
+}
+
+# Below this many profiles the approximate mode searches every profile anyway
+APPROX_MIN_USERS = int(os.environ.get("ROOMMATES_APPROX_MIN_USERS", 5000))
+
+# Clusters looked at by an approximate query
+APPROX_PROBES = int(os.environ.get("ROOMMATES_APPROX_PROBES", 8))
+
+# Rounds of k-means when the clusters of the approximate mode are trained
+_KMEANS_ROUNDS = 8
+_KMEANS_SAMPLE = 20000
+
+GENDERS = ("female", "male", "other")
+_GENDER_BITS = {gender: 1 << i for i, gender in enumerate(GENDERS)}
+
+# Kilometres per degree of latitude, and of longitude around Hong Kong
+_KM_PER_DEGREE = 111.32
+_KM_PER_DEGREE_LNG = _KM_PER_DEGREE * math.cos(math.radians(22.3))
+
+# Features are centred on these, to keep float32 precision
+_CENTRE = (22.3, 114.17)
+_TYPICAL_BUDGET = 8000
+
+class RoommateProfile(BaseModel):
+    """Preferences of someone looking for a roommate."""
+
+    budget_min: float = Field(ge=0, description="Lowest monthly rent share in HKD")
+    budget_max: float = Field(gt=0, description="Highest monthly rent share in HKD")
+    lat: float = Field(ge=-90, le=90, description="Where they want to live")
+    lng: float = Field(ge=-180, le=180)
+    max_distance_km: float = Field(5, gt=0, description="How far from lat/lng a shared flat may be")
+    bedtime: float = Field(23, ge=0, lt=24, description="Usual bedtime, in hours")
+    wake_time: float = Field(7, ge=0, lt=24, description="Usual wake-up time, in hours")
+    cleanliness: int = Field(3, ge=1, le=5)
+    noise: int = Field(3, ge=1, le=5, description="How much noise they make and tolerate")
+    guests: int = Field(3, ge=1, le=5, description="How often they have guests over")
+    gender: Literal["female", "male", "other"] = "other"
+    accepts_genders: List[Literal["female", "male", "other"]] = list(GENDERS)
+    smokes: bool = False
+    accepts_smokers: bool = True
+    has_pets: bool = False
+    accepts_pets: bool = True
+
+    @model_validator(mode="after")
+    def check_budget(self):
+        if self.budget_min > self.budget_max:
+            raise ValueError("budget_min is above budget_max")
+        return self
+
+def _hours(hour):
+    # A time of day as a point on a circle, so 23:00 and 01:00 are close
+    angle = 2 * math.pi * hour / 24
+    return math.cos(angle), math.sin(angle)
+
+def profile_features(profile):
+    """
+    Turns a profile into the vector its compatibility is scored on.
+
+    Budgets are compared by the log of their midpoint (a halving or doubling is
+    about one unit), places in units of 5 km, times of day on a circle and habits
+    in units of two steps of their 1-5 scale; every group is then scaled by its
+    FEATURE_WEIGHTS entry.
+
+    Parameters:
+        profile (RoommateProfile): The profile.
+
+    Returns:
+        np.ndarray: The float32 feature vector.
+    """
+    w = FEATURE_WEIGHTS
+    budget = math.log2(max((profile.budget_min + profile.budget_max) / 2, 1.0) / _TYPICAL_BUDGET)
+    return np.array([
+        w["budget"] * budget,
+        w["location"] * (profile.lat - _CENTRE[0]) * _KM_PER_DEGREE / 5,
+        w["location"] * (profile.lng - _CENTRE[1]) * _KM_PER_DEGREE_LNG / 5,
+        *(w["schedule"] * v for v in _hours(profile.bedtime)),
+        *(w["schedule"] * v for v in _hours(profile.wake_time)),
+        w["habits"] * (profile.cleanliness - 3) / 2,
+        w["habits"] * (profile.noise - 3) / 2,
+        w["habits"] * (profile.guests - 3) / 2,
+    ], dtype=np.float32)
+
+FEATURE_COUNT = 10
+
+class RoommateIndex:
+    """
+    Roommate profiles held as a dense feature matrix, for top-k compatibility queries.
+
+    Every profile is a row of the matrix, with its hard constraints (budget range,
+    place and distance, accepted genders, smoking and pets) in parallel columns.
+    A query first prunes every row that fails a hard constraint in either
+    direction, with vectorised comparisons, then scores what is left against the
+    query's row in one batched computation (score = 1 / (1 + squared distance
+    between feature vectors)) and picks the top k with a partial sort.
+
+    The approximate mode clusters the rows with k-means and only considers the
+    rows of the APPROX_PROBES clusters nearest to the query, so its cost grows with
+    the size of a cluster rather than with the number of profiles. Removed rows are
+    reused by later profiles.
+    """
+
+    def __init__(self, capacity=1024):
+        """
+        Parameters:
+            capacity (int): Number of rows allocated up front; grows as needed.
+        """
+        self._lock = threading.Lock()
+        self._ids = {}
+        self._profiles = []
+        self._free = []
+        self._size = 0
+        self._allocate(capacity)
+        self._centroids = None
+        self._members = []
+        self._trained_size = 0
+
+    def _allocate(self, capacity):
+        # (Re)allocates every column with room for capacity rows, keeping the current ones
+        columns = {
+            "features": np.zeros((capacity, FEATURE_COUNT), dtype=np.float32),
+            "budget_min": np.zeros(capacity, dtype=np.float32),
+            "budget_max": np.zeros(capacity, dtype=np.float32),
+            "lat": np.zeros(capacity),
+            "lng": np.zeros(capacity),
+            "max_distance_m": np.zeros(capacity, dtype=np.float32),
+            "gender": np.zeros(capacity, dtype=np.uint8),
+            "accepts_genders": np.zeros(capacity, dtype=np.uint8),
+            "smokes": np.zeros(capacity, dtype=bool),
+            "accepts_smokers": np.zeros(capacity, dtype=bool),
+            "has_pets": np.zeros(capacity, dtype=bool),
+            "accepts_pets": np.zeros(capacity, dtype=bool),
+            "active": np.zeros(capacity, dtype=bool),
+            "cluster": np.full(capacity, -1, dtype=np.int32),
+        }
+        for name, column in columns.items():
+            old = getattr(self, name, None)
+            if old is not None:
+                column[:len(old)] = old
+            setattr(self, name, column)
+        self._profiles.extend([None] * (capacity - len(self._profiles)))
+
+    def __len__(self):
+        return len(self._ids)
+
+    def upsert(self, user_id, profile):
+        """
+        Adds a profile, or replaces the profile of the same user.
+
+        Parameters:
+            user_id (str): The user.
+            profile (RoommateProfile): Their preferences.
+
+        Returns:
+            None
+        """
+        with self._lock:
+            row = self._ids.get(user_id)
+            if row is None:
+                if self._free:
+                    row = self._free.pop()
+                else:
+                    if self._size == len(self.active):
+                        self._allocate(len(self.active) * 2)
+                    row = self._size
+                    self._size += 1
+                self._ids[user_id] = row
+
+            self.features[row] = profile_features(profile)
+            self.budget_min[row] = profile.budget_min
+            self.budget_max[row] = profile.budget_max
+            self.lat[row] = profile.lat
+            self.lng[row] = profile.lng
+            self.max_distance_m[row] = profile.max_distance_km * 1000
+            self.gender[row] = _GENDER_BITS[profile.gender]
+            self.accepts_genders[row] = sum(_GENDER_BITS[g] for g in set(profile.accepts_genders))
+            self.smokes[row] = profile.smokes
+            self.accepts_smokers[row] = profile.accepts_smokers
+            self.has_pets[row] = profile.has_pets
+            self.accepts_pets[row] = profile.accepts_pets
+            self.active[row] = True
+            self._profiles[row] = (user_id, profile)
+
+            if self._centroids is not None:
+                if len(self._ids) > 2 * self._trained_size:
+                    self._train()
+                else:
+                    self._assign(np.array([row]))
+
+    def remove(self, user_id):
+        """
+        Removes the profile of a user.
+
+        Parameters:
+            user_id (str): The user.
+
+        Returns:
+            bool: False if there was no such profile.
+        """
+        with self._lock:
+            row = self._ids.pop(user_id, None)
+            if row is None:
+                return False
+            self.active[row] = False
+            self.cluster[row] = -1
+            self._profiles[row] = None
+            self._free.append(row)
+            return True
+
+    def get(self, user_id):
+        """
+        Returns the profile of a user.
+
+        Parameters:
+            user_id (str): The user.
+
+        Returns:
+            RoommateProfile: The profile, or None if there is none.
+        """
+        row = self._ids.get(user_id)
+        return self._profiles[row][1] if row is not None else None
+
+    def _train(self):
+        # k-means over a sample of the profiles, then every profile to its nearest centroid;
+        # the caller holds the lock
+        rows = np.flatnonzero(self.active[:self._size])
+        rng = np.random.default_rng(0)
+        sample = self.features[rng.choice(rows, min(len(rows), _KMEANS_SAMPLE), replace=False)]
+        n_clusters = max(1, int(math.sqrt(len(rows))))
+        centroids = sample[rng.choice(len(sample), n_clusters, replace=False)]
+        for _ in range(_KMEANS_ROUNDS):
+            nearest = self._nearest_centroids(sample, centroids, 1)[:, 0]
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, nearest, sample)
+            counts = np.bincount(nearest, minlength=n_clusters)[:, None]
+            # Empty clusters keep their centroid
+            centroids = np.where(counts > 0, sums / np.maximum(counts, 1), centroids).astype(np.float32)
+        self._centroids = centroids
+        self._members = [[] for _ in range(n_clusters)]
+        self._trained_size = len(rows)
+        self.cluster[rows] = -1
+        self._assign(rows)
+
+    @staticmethod
+    def _nearest_centroids(features, centroids, n):
+        d2 = (features ** 2).sum(1)[:, None] + (centroids ** 2).sum(1)[None, :] - 2 * features @ centroids.T
+        if n >= centroids.shape[0]:
+            return np.argsort(d2, axis=1)
+        return np.argpartition(d2, n - 1, axis=1)[:, :n]
+
+    def _assign(self, rows):
+        # The caller holds the lock; rows moving cluster stay listed in the old one until
+        # a query drops them from it
+        for start in range(0, len(rows), 8192):
+            chunk = rows[start:start + 8192]
+            nearest = self._nearest_centroids(self.features[chunk], self._centroids, 1)[:, 0]
+            moved = self.cluster[chunk] != nearest
+            self.cluster[chunk] = nearest
+            for row, cluster in zip(chunk[moved].tolist(), nearest[moved].tolist()):
+                self._members[cluster].append(row)
+
+    def _candidates(self, row, approximate, probes):
+        # Rows worth scoring: every row, or those of the clusters nearest to the query
+        if not approximate or len(self._ids) < APPROX_MIN_USERS:
+            return np.arange(self._size)
+        if self._centroids is None:
+            self._train()
+        clusters = self._nearest_centroids(self.features[row:row + 1], self._centroids, probes)[0]
+        rows = []
+        for cluster in clusters.tolist():
+            members = np.array(self._members[cluster], dtype=np.intp)
+            current = members[self.cluster[members] == cluster]
+            if len(current) < len(members):
+                self._members[cluster] = current.tolist()
+            rows.append(current)
+        return np.concatenate(rows)
+
+    def top_k(self, user_id, k=10, approximate=False, probes=APPROX_PROBES):
+        """
+        Finds the most compatible roommates for a user.
+
+        Parameters:
+            user_id (str): The user.
+            k (int): Number of matches wanted.
+            approximate (bool): Whether to only search the clusters nearest to the
+                user's profile; faster on large user bases, but may miss matches.
+            probes (int): Clusters searched in approximate mode.
+
+        Returns:
+            list: Up to k dicts with user_id, score (1 for identical preferences,
+            towards 0 for very different ones), distance_km between the places
+            they want to live, and their profile, best match first.
+
+        Raises:
+            KeyError: If the user has no profile.
+        """
+        with self._lock:
+            row = self._ids[user_id]
+            rows = self._candidates(row, approximate, probes)
+
+            # Hard constraints, in both directions
+            ok = self.active[rows] & (rows != row)
+            ok &= (self.budget_min[rows] <= self.budget_max[row]) & (self.budget_max[rows] >= self.budget_min[row])
+            ok &= (self.accepts_genders[rows] & self.gender[row]) != 0
+            ok &= (self.accepts_genders[row] & self.gender[rows]) != 0
+            if not self.accepts_smokers[row]:
+                ok &= ~self.smokes[rows]
+            if self.smokes[row]:
+                ok &= self.accepts_smokers[rows]
+            if not self.accepts_pets[row]:
+                ok &= ~self.has_pets[rows]
+            if self.has_pets[row]:
+                ok &= self.accepts_pets[rows]
+            rows = rows[ok]
+            distances = haversine_m(self.lat[row], self.lng[row], self.lat[rows], self.lng[rows])
+            near = distances <= np.minimum(self.max_distance_m[rows], self.max_distance_m[row])
+            rows, distances = rows[near], distances[near]
+
+            # Batched squared distances between feature vectors
+            differences = self.features[rows] - self.features[row]
+            scores = 1 / (1 + np.einsum("ij,ij->i", differences, differences))
+            if len(rows) > k:
+                best = np.argpartition(-scores, k - 1)[:k]
+            else:
+                best = np.arange(len(rows))
+            best = best[np.argsort(-scores[best], kind="stable")]
+            return [
+                {
+                    "user_id": self._profiles[rows[i]][0],
+                    "score": round(float(scores[i]), 4),
+                    "distance_km": round(float(distances[i]) / 1000, 2),
+                    "profile": self._profiles[rows[i]][1],
+                }
+                for i in best
+            ]
@@ -0,0 +1,170 @@
+import io
+import os
+import re
+import gzip
+import json
+import tempfile
+
+try:
+    import pyarrow.parquet as pq
+except ImportError:
+    pq = None
+
+# Where the crawler stores its output: "s3://<bucket>" or a local directory
+LISTINGS_STORAGE = os.environ.get("LISTINGS_STORAGE", "s3://housing-listing-bucket")
+S3_REGION = os.environ.get("LISTINGS_S3_REGION", "ap-east-1")
+
+# Where objects downloaded from S3 to be memory-mapped are kept
+CACHE_DIR = os.environ.get("LISTINGS_CACHE_DIR", os.path.join(tempfile.gettempdir(), "listings-cache"))
+
+_SNAPSHOT_RE = re.compile(r"snapshots/(\d{4}-\d{2}-\d{2})/manifest\.json$")
+
+class SnapshotSource:
+    """
+    Read-only access to the objects written by the crawler, in S3 or a local directory.
+    """
+
+    def __init__(self, url=LISTINGS_STORAGE, region_name=S3_REGION):
+        """
+        Parameters:
+            url (str): "s3://<bucket>" or a local directory.
+            region_name (str): The AWS region, for S3 buckets.
+        """
+        self.url = url
+        if url.startswith("s3://"):
+            import boto3
+
+            self.bucket = url[len("s3://"):].strip("/")
+            self.client = boto3.client('s3', region_name=region_name)
+        else:
+            self.root = url[len("file://"):] if url.startswith("file://") else url
+            self.client = None
+
+    def get(self, key):
+        """
+        Reads an object.
+
+        Parameters:
+            key (str): The object key.
+
+        Returns:
+            bytes: The content, or None if there is no such object.
+        """
+        if self.client is not None:
+            try:
+                return self.client.get_object(Bucket=self.bucket, Key=key)['Body'].read()
+            except self.client.exceptions.NoSuchKey:
+                return None
+        try:
+            with open(os.path.join(self.root, key), 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def local_path(self, key, tag=""):
+        """
+        Returns the path of a local file holding an object, e.g. to memory-map it.
+
+        Objects in S3 are downloaded into CACHE_DIR once; processes sharing the cache
+        share the file.
+
+        Parameters:
+            key (str): The object key.
+            tag (str): Changes whenever the object does, so a rewritten object is
+                downloaded again rather than read from the cache.
+
+        Returns:
+            str: The path, or None if there is no such object.
+        """
+        if self.client is None:
+            path = os.path.join(self.root, key)
+            return path if os.path.exists(path) else None
+        path = os.path.join(CACHE_DIR, self.bucket, f"{key}.{tag}" if tag else key)
+        if not os.path.exists(path):
+            data = self.get(key)
+            if data is None:
+                return None
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Written aside and renamed, so no process maps a partial file
+            partial = f"{path}.{os.getpid()}.partial"
+            with open(partial, 'wb') as f:
+                f.write(data)
+            os.replace(partial, path)
+        return path
+
+    def list(self, prefix):
+        """
+        Lists the keys starting with a prefix.
+
+        Parameters:
+            prefix (str): The prefix, ending with "/".
+
+        Returns:
+            list: The keys.
+        """
+        if self.client is not None:
+            keys = []
+            for page in self.client.get_paginator('list_objects_v2').paginate(Bucket=self.bucket, Prefix=prefix):
+                keys.extend(obj['Key'] for obj in page.get('Contents', []))
+            return keys
+        keys = []
+        for directory, _, filenames in os.walk(os.path.join(self.root, prefix)):
+            relative = os.path.relpath(directory, self.root).replace(os.sep, "/")
+            keys.extend(f"{relative}/{filename}" for filename in filenames)
+        return keys
+
+def snapshot_dates(source):
+    """
+    Lists the dates of the daily snapshots that have a manifest.
+
+    Parameters:
+        source (SnapshotSource): Where the snapshots are.
+
+    Returns:
+        list: The dates, oldest first.
+    """
+    return sorted(m.group(1) for m in map(_SNAPSHOT_RE.search, source.list("snapshots/")) if m)
+
+def read_manifest(source, date):
+    """
+    Reads the manifest of a daily snapshot.
+
+    Parameters:
+        source (SnapshotSource): Where the snapshots are.
+        date (str): The date of the snapshot.
+
+    Returns:
+        dict: The manifest, or None if there is none.
+    """
+    data = source.get(f"snapshots/{date}/manifest.json")
+    return json.loads(data) if data is not None else None
+
+def read_parts(source, date, manifest, columns=None):
+    """
+    Reads the listings of a snapshot, from its Parquet parts when pyarrow is
+    installed and they exist, from its JSON Lines parts otherwise.
+
+    Parameters:
+        source (SnapshotSource): Where the snapshot is.
+        date (str): The date of the snapshot.
+        manifest (dict): Its manifest, listing the parts.
+        columns (list): Fields to read; all of them if None.
+
+    Returns:
+        list: The listing dicts.
+    """
+    records = []
+    for part in manifest["parts"]:
+        files = part["files"]
+        parquet_key = f"snapshots/{date}/{part['name']}.parquet"
+        if pq is not None and parquet_key in files:
+            table = pq.read_table(io.BytesIO(source.get(parquet_key)))
+            if columns is not None:
+                table = table.select([name for name in columns if name in table.column_names])
+            records.extend(table.to_pylist())
+            continue
+        data = source.get(f"snapshots/{date}/{part['name']}.jsonl.gz")
+        for line in gzip.decompress(data).decode('utf-8').splitlines():
+            record = json.loads(line)
+            records.append(record if columns is None else {name: record.get(name) for name in columns})
+    return records
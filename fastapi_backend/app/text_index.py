@@ -0,0 +1,260 @@
+import re
+import mmap
+import math
+import struct
+import unicodedata
+
+import numpy as np
+
+# BM25 parameters: term frequency saturation and document length normalisation
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Most index terms a prefix query term expands to, the most frequent first
+MAX_PREFIX_TERMS = 64
+
+# Queries whose postings add up to more than this share of the documents are
+# scored in arrays over every document rather than by intersecting postings
+_DENSE_SHARE = 0.25
+
+# File layout, written by data_collector/text_index.py; keep both in step
+MAGIC = b"HKTX"
+VERSION = 1
+SECTIONS = (
+    "doc_id_offsets", "doc_id_bytes", "doc_lengths", "term_offsets",
+    "term_bytes", "posting_starts", "posting_docs", "posting_freqs",
+)
+HEADER = struct.Struct("<4sIIIQd" + "QQ" * len(SECTIONS))
+_DTYPES = {
+    "doc_id_offsets": np.uint32, "doc_lengths": np.uint32, "term_offsets": np.uint32,
+    "posting_starts": np.uint64, "posting_docs": np.uint32, "posting_freqs": np.uint16,
+}
+
+# Same tokenizer as data_collector/text_index.py
+_TOKEN_RE = re.compile(r"[a-z0-9]+|[\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff]+")
+
+def tokenize(text):
+    """
+    Splits text into index terms: words of letters and digits, and bigrams of
+    Chinese characters (a lone character is a term of its own), after NFKC
+    normalisation and lowercasing.
+
+    Parameters:
+        text (str): The text.
+
+    Returns:
+        list: The terms, in order.
+    """
+    tokens = []
+    for run in _TOKEN_RE.findall(unicodedata.normalize("NFKC", text).lower()):
+        if run.isascii() or len(run) == 1:
+            tokens.append(run)
+        else:
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+    return tokens
+
+def parse_query(query):
+    """
+    Turns a search query into the terms a listing must all contain.
+
+    A word ending with "*" is a prefix: "harb*" matches "harbour" and "harbourfront".
+    A single Chinese character matches every bigram starting with it.
+
+    Parameters:
+        query (str): The query.
+
+    Returns:
+        list: (term, is_prefix) tuples, without repeats.
+    """
+    terms = []
+    for word in query.split():
+        tokens = tokenize(word.rstrip("*"))
+        for i, token in enumerate(tokens):
+            prefix = (word.endswith("*") and i == len(tokens) - 1) or (not token.isascii() and len(token) == 1)
+            if (token, prefix) not in terms:
+                terms.append((token, prefix))
+    return terms
+
+class TextIndex:
+    """
+    Inverted index of listing titles and descriptions, memory-mapped read-only.
+
+    The file is built by the crawler for a daily snapshot (see
+    data_collector/text_index.py). Opening it only reads the header; terms and
+    postings are paged in as queries touch them, and processes mapping the same
+    file share its pages. A query finds the postings of every term by binary
+    search over the sorted terms, intersects them starting from the shortest and
+    ranks the listings that contain every term with BM25; nothing is done per
+    listing that does not match, except for broad queries (e.g. short prefixes)
+    whose postings cover much of the index, which are scored in arrays over every
+    listing instead.
+    """
+
+    def __init__(self, path):
+        """
+        Parameters:
+            path (str): The index file.
+
+        Raises:
+            ValueError: If the file is not a text index of this version.
+        """
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.size, self.term_count, _, self.average_length, *layout = HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a version {VERSION} text index")
+        view = memoryview(self._mmap)
+        sections = {}
+        for i, name in enumerate(SECTIONS):
+            offset, size = layout[2 * i], layout[2 * i + 1]
+            dtype = _DTYPES.get(name)
+            sections[name] = (view[offset:offset + size] if dtype is None
+                              else np.frombuffer(self._mmap, dtype, size // np.dtype(dtype).itemsize, offset))
+        self._sections = sections
+        self._rows = None
+
+    def _term(self, i):
+        offsets = self._sections["term_offsets"]
+        return self._sections["term_bytes"][offsets[i]:offsets[i + 1]].tobytes()
+
+    def _first_term(self, term):
+        # Number of the first term not below term, in byte order
+        low, high = 0, self.term_count
+        while low < high:
+            middle = (low + high) // 2
+            if self._term(middle) < term:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def _terms(self, term, prefix):
+        # Numbers of the index terms a query term matches
+        encoded = term.encode('utf-8')
+        start = self._first_term(encoded)
+        if not prefix:
+            return [start] if start < self.term_count and self._term(start) == encoded else []
+        # No UTF-8 byte is 0xff, so this is above every term starting with the prefix
+        stop = self._first_term(encoded + b"\xff")
+        numbers = np.arange(start, stop)
+        if len(numbers) > MAX_PREFIX_TERMS:
+            starts = self._sections["posting_starts"]
+            frequencies = starts[numbers + 1] - starts[numbers]
+            numbers = numbers[np.argsort(-frequencies.astype(np.int64), kind="stable")[:MAX_PREFIX_TERMS]]
+        return numbers.tolist()
+
+    def _postings(self, number):
+        starts = self._sections["posting_starts"]
+        start, stop = int(starts[number]), int(starts[number + 1])
+        return self._sections["posting_docs"][start:stop], self._sections["posting_freqs"][start:stop]
+
+    def search(self, query):
+        """
+        Finds the listings containing every term of a query, best match first.
+
+        Parameters:
+            query (str): The query, see parse_query.
+
+        Returns:
+            tuple: (np.ndarray of document numbers, np.ndarray of their BM25 scores).
+        """
+        groups = []
+        for term, prefix in parse_query(query):
+            postings = [self._postings(number) for number in self._terms(term, prefix)]
+            if not postings:
+                return np.array([], dtype=np.uint32), np.array([], dtype=np.float32)
+            groups.append(postings)
+        if not groups:
+            return np.array([], dtype=np.uint32), np.array([], dtype=np.float32)
+
+        total = sum(len(docs) for postings in groups for docs, _ in postings)
+        if total > self.size * _DENSE_SHARE:
+            candidates, scores = self._score_dense(groups)
+        else:
+            candidates, scores = self._score_sparse(groups)
+        order = np.argsort(-scores, kind="stable")
+        return candidates[order], scores[order]
+
+    def _weights(self, docs, freqs, lengths):
+        # BM25 weight of a term in each document containing it
+        idf = math.log(1 + (self.size - len(docs) + 0.5) / (len(docs) + 0.5))
+        tf = freqs.astype(np.float32)
+        normalisation = BM25_K1 * (1 - BM25_B + BM25_B * lengths / max(self.average_length, 1.0))
+        return idf * tf * (BM25_K1 + 1) / (tf + normalisation)
+
+    def _score_sparse(self, groups):
+        # Intersects the postings, shortest first, then looks the candidates up in each
+        unions = [postings[0][0] if len(postings) == 1 else np.unique(np.concatenate([d for d, _ in postings]))
+                  for postings in groups]
+        unions.sort(key=len)
+        candidates = unions[0]
+        for docs in unions[1:]:
+            candidates = np.intersect1d(candidates, docs, assume_unique=True)
+        lengths = self._sections["doc_lengths"][candidates].astype(np.float32)
+        scores = np.zeros(len(candidates), dtype=np.float32)
+        for postings in groups:
+            for docs, freqs in postings:
+                positions = np.minimum(np.searchsorted(docs, candidates), len(docs) - 1)
+                found = docs[positions] == candidates
+                scores[found] += self._weights(docs, freqs[positions[found]], lengths[found])
+        return candidates, scores
+
+    def _score_dense(self, groups):
+        # Adds up scores and matched query terms in arrays over every document
+        lengths = self._sections["doc_lengths"]
+        scores = np.zeros(self.size, dtype=np.float32)
+        matched = np.zeros(self.size, dtype=np.uint8)
+        for postings in groups:
+            seen = np.zeros(self.size, dtype=bool)
+            for docs, freqs in postings:
+                scores[docs] += self._weights(docs, freqs, lengths[docs].astype(np.float32))
+                seen[docs] = True
+            matched += seen
+        candidates = np.flatnonzero(matched == len(groups)).astype(np.uint32)
+        return candidates, scores[candidates]
+
+    def property_ids(self):
+        """
+        Returns the property_id of every document.
+
+        Returns:
+            list: The IDs, by document number.
+        """
+        offsets = self._sections["doc_id_offsets"].tolist()
+        data = self._sections["doc_id_bytes"].tobytes()
+        return [data[offsets[i]:offsets[i + 1]].decode('utf-8') for i in range(self.size)]
+
+    def rows_in(self, listings):
+        """
+        Returns the row of every document in a ListingIndex, matched by property_id;
+        computed once per ListingIndex.
+
+        Parameters:
+            listings (ListingIndex): The index.
+
+        Returns:
+            np.ndarray: The row IDs by document number, -1 for listings not in it.
+        """
+        cached = self._rows
+        if cached is None or cached[0] is not listings:
+            rows_by_id = {property_id: row for row, property_id in enumerate(listings.columns["property_id"])}
+            rows = np.array([rows_by_id.get(property_id, -1) for property_id in self.property_ids()], dtype=np.intp)
+            cached = self._rows = (listings, rows)
+        return cached[1]
+
+    def matching_rows(self, query, listings):
+        """
+        Finds the listings of a ListingIndex containing every term of a query.
+
+        Parameters:
+            query (str): The query, see parse_query.
+            listings (ListingIndex): The index to find them in; documents are
+                matched to its rows by property_id, so the text index may be of
+                an earlier snapshot.
+
+        Returns:
+            np.ndarray: Row IDs of the ListingIndex, best match first.
+        """
+        docs, _ = self.search(query)
+        rows = self.rows_in(listings)[docs]
+        return rows[rows >= 0]
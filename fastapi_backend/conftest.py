@@ -0,0 +1,57 @@
+import os
+import sys
+import random
+
+import pytest
+
+# The crawler writes the files the backend reads; its modules build them for the tests
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data_collector"))
+
+DISTRICTS = ["Central", "central", "Mong Kok", "Sha Tin", "Quarry Bay", None]
+FLOOR_ZONES = ["low", "middle", "high", None]
+WORDS = [
+    "harbour", "harbourfront", "view", "seaview", "renovated", "quiet", "bright",
+    "pool", "gym", "mtr", "太古城", "海景", "近地鐵", "會所", "泳池",
+]
+
+def make_listings(count, seed=0, first_id=4200000):
+    """
+    Generates listings as the crawler stores them once normalised.
+
+    Parameters:
+        count (int): Number of listings.
+        seed (int): Seed of the random values.
+        first_id (int): property_id of the first listing; the others follow.
+
+    Returns:
+        list: The listing dicts; some fields are None in some listings.
+    """
+    rng = random.Random(seed)
+
+    def maybe(value, share=0.1):
+        return None if rng.random() < share else value
+
+    listings = []
+    for i in range(count):
+        located = rng.random() > 0.1
+        listings.append({
+            "property_id": str(first_id + i),
+            "title": " ".join(rng.sample(WORDS, 3)),
+            "description": maybe(" ".join(rng.choice(WORDS) for _ in range(rng.randint(0, 12)))),
+            "district": rng.choice(DISTRICTS),
+            "floor_zone": rng.choice(FLOOR_ZONES),
+            "estate_entry_month": maybe(f"20{rng.randint(10, 24)}-{rng.randint(1, 12):02d}", 0.5),
+            # Few distinct rents, so sorting has ties to keep in row order
+            "rent_hkd": maybe(float(rng.randrange(6000, 40000, 500))),
+            "saleable_area_sqft": maybe(float(rng.randint(150, 1500))),
+            "gross_area_sqft": maybe(float(rng.randint(200, 2000)), 0.3),
+            "floor_number": maybe(float(rng.randint(1, 60)), 0.3),
+            "building_age_years": maybe(float(rng.randint(0, 50)), 0.3),
+            "latitude": 22.20 + rng.random() * 0.25 if located else None,
+            "longitude": 114.05 + rng.random() * 0.25 if located else None,
+        })
+    return listings
+
+@pytest.fixture
+def listings():
+    return make_listings(400)
@@ -0,0 +1,106 @@
+import os
+import sys
+import time
+import argparse
+import platform
+import multiprocessing
+
+import numpy as np
+
+from app.snapshots import LISTINGS_STORAGE, SnapshotSource
+
+# How the workers of a run load the snapshots: memory-mapped compiled files, or parts
+MODES = {"compiled": True, "parts": False}
+
+def memory():
+    """
+    Reads the memory use of the current process, on Linux.
+
+    Rss counts every resident page, Pss divides shared pages between the processes
+    mapping them (so the Pss of all workers adds up to what they really use) and
+    Private is what no other process shares.
+
+    Returns:
+        dict: rss_kib, pss_kib and private_kib; empty where /proc is not available.
+    """
+    try:
+        with open("/proc/self/smaps_rollup") as f:
+            # The first line is the address range the totals cover
+            fields = dict(line.split(":", 1) for line in f.readlines()[1:])
+    except OSError:
+        return {}
+    kib = lambda name: int(fields.get(name, "0 kB").split()[0])
+    return {
+        "rss_kib": kib("Rss"),
+        "pss_kib": kib("Pss"),
+        "private_kib": kib("Private_Clean") + kib("Private_Dirty"),
+    }
+
+def _worker(storage, use_compiled, barrier, results):
+    # One backend worker starting up: the first load of every index
+    from app.reloader import IndexReloader
+
+    before = memory()
+    started = time.perf_counter()
+    reloader = IndexReloader(SnapshotSource(storage), use_compiled=use_compiled)
+    reloader.reload()
+    seconds = time.perf_counter() - started
+    # Memory is read once every worker has loaded, so shared pages are counted as shared
+    barrier.wait()
+    after = memory()
+    results.put({
+        "seconds": seconds,
+        "listings": reloader.index.size,
+        "geo_listings": reloader.geo.size,
+        **{name: after[name] - before.get(name, 0) for name in after},
+    })
+    barrier.wait()
+
+def run_mode(storage, use_compiled, workers):
+    """
+    Starts workers in fresh processes, all at once, each loading the indexes.
+
+    Parameters:
+        storage (str): Where the snapshots are.
+        use_compiled (bool): Whether workers memory-map compiled snapshots.
+        workers (int): Number of worker processes.
+
+    Returns:
+        list: The result of every worker: load seconds, listings loaded and the
+        growth of its memory use while loading.
+    """
+    context = multiprocessing.get_context("spawn")
+    barrier = context.Barrier(workers)
+    results = context.Queue()
+    processes = [context.Process(target=_worker, args=(storage, use_compiled, barrier, results)) for _ in range(workers)]
+    for process in processes:
+        process.start()
+    collected = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+    return collected
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark how long backend workers take to load the snapshots.")
+    parser.add_argument("--storage", default=LISTINGS_STORAGE, help="where the snapshots are: s3://<bucket> or a local directory")
+    parser.add_argument("--workers", type=int, default=4, help="worker processes started together, like uvicorn --workers")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per mode")
+    parser.add_argument("--modes", default=",".join(MODES), help="comma-separated modes to run: compiled, parts")
+    args = parser.parse_args(argv)
+
+    print(f"{args.storage}, {args.workers} workers, {args.repeat} runs, python {platform.python_version()}")
+    print(f"{'mode':10} {'listings':>9} {'geo':>9} {'p50 s':>8} {'max s':>8} {'Rss MiB':>9} {'Pss MiB':>9} {'private MiB':>12}")
+    for mode in args.modes.split(","):
+        runs = [run_mode(args.storage, MODES[mode], args.workers) for _ in range(args.repeat)]
+        seconds = [worker["seconds"] for run in runs for worker in run]
+        last = runs[-1]
+        # Memory of all workers together, in the last run
+        total = lambda name: round(sum(worker.get(name, 0) for worker in last) / 1024, 1)
+        print(f"{mode:10} {last[0]['listings']:>9} {last[0]['geo_listings']:>9} {np.median(seconds):>8.3f} {max(seconds):>8.3f}"
+              f" {total('rss_kib'):>9} {total('pss_kib'):>9} {total('private_kib'):>12}")
+    return 0
+
+if __name__ == '__main__':
+    # Time to first index of backend workers, and the memory they use together:
+    #   python startup_benchmark.py --storage ../data_collector/housing_data --workers 4
+    sys.exit(main())
@@ -0,0 +1,80 @@
+import math
+
+import numpy as np
+import pytest
+
+from compiled_snapshot import compile_snapshot
+from app.compiled import MISSING, CompiledSnapshot, StringColumn
+from app.listing_index import FIELDS, ListingIndex
+
+def test_string_column_stores_repeated_values_once():
+    column = StringColumn.from_values(["Central", None, "太古城", "Central", 5])
+
+    assert list(column) == ["Central", None, "太古城", "Central", "5"]
+    assert len(column) == 5
+    assert column[2] == "太古城"
+    assert column.ids[0] == column.ids[3]
+    assert column.ids[1] == MISSING
+    assert len(column.offsets) == 4
+
+def test_string_column_rows_share_the_table():
+    column = StringColumn.from_values(["a", None, "b", "c"])
+
+    taken = column[np.array([3, 1, 0])]
+    assert list(taken) == ["c", None, "a"]
+    assert taken.offsets is column.offsets
+    assert list(column[1:3]) == [None, "b"]
+
+def test_string_column_concatenate():
+    column = StringColumn.from_values(["x", None, "y"])
+    other = StringColumn.from_values(["y", "z", None])
+
+    # Columns of the same table keep it; others get one of the strings they use
+    same = StringColumn.concatenate([column[2:], column[:2]])
+    assert list(same) == ["y", "x", None]
+    assert same.offsets is column.offsets
+    joined = StringColumn.concatenate([column[np.array([2, 1])], other])
+    assert list(joined) == ["y", None, "y", "z", None]
+    assert len(joined.offsets) == 4
+
+def test_string_column_compacted():
+    column = StringColumn.from_values(["a", "b", None, "c", "d"])[np.array([3, 2, 3])]
+
+    compacted = column.compacted()
+    assert list(compacted) == ["c", None, "c"]
+    assert len(compacted.offsets) == 2
+    assert bytes(compacted.data) == b"c"
+
+def test_string_column_to_bytes():
+    column = StringColumn.from_values(["4200001", None, "太古", "", "42"])
+
+    assert column.to_bytes().tolist() == [b"4200001", b"", "太古".encode('utf-8'), b"", b"42"]
+    assert StringColumn.from_values([None, None]).to_bytes().tolist() == [b"", b""]
+    assert len(StringColumn.from_values([]).to_bytes()) == 0
+
+def test_compiled_snapshot_round_trip(tmp_path, listings):
+    path = tmp_path / "snapshot.bin"
+    path.write_bytes(compile_snapshot(listings))
+
+    snapshot = CompiledSnapshot(str(path))
+
+    assert snapshot.size == len(listings)
+    for field in FIELDS:
+        column = snapshot.columns[field]
+        values = [record[field] for record in listings]
+        if isinstance(column, StringColumn):
+            assert list(column) == values
+        else:
+            assert [None if math.isnan(v) else v for v in column.tolist()] == values
+    # The stored sort orders are those the backend would compute
+    compiled = ListingIndex.from_columns(snapshot.columns, snapshot.size, "2024-11-20", snapshot.orders)
+    parsed = ListingIndex(listings, "2024-11-20")
+    for sort in ("rent", "-rent", "area", "-area"):
+        assert compiled.search(sort=sort, limit=len(listings)) == parsed.search(sort=sort, limit=len(listings))
+
+def test_compiled_snapshot_rejects_other_files(tmp_path):
+    path = tmp_path / "text_index.bin"
+    path.write_bytes(b"HKTX" + bytes(64))
+
+    with pytest.raises(ValueError):
+        CompiledSnapshot(str(path))
@@ -0,0 +1,90 @@
+import numpy as np
+import pytest
+
+from app import geo_index
+from app.geo_index import GeoIndex, haversine_m, listing_dates
+from app.listing_index import ListingIndex
+
+POINTS = [(22.28, 114.15), (22.33, 114.17), (22.40, 114.25), (22.10, 113.90)]
+
+def _distances(records, lat, lng):
+    # Distance to every listing with coordinates, by property_id
+    located = [record for record in records if record["latitude"] is not None]
+    distances = haversine_m(lat, lng, np.array([r["latitude"] for r in located]), np.array([r["longitude"] for r in located]))
+    return dict(zip([record["property_id"] for record in located], distances.tolist()))
+
+@pytest.mark.parametrize("lat, lng", POINTS)
+@pytest.mark.parametrize("radius", [300, 2000, 8000])
+def test_within_matches_brute_force(listings, lat, lng, radius):
+    geo = GeoIndex().with_records(listings)
+    distances = _distances(listings, lat, lng)
+    expected = {property_id for property_id, d in distances.items() if d <= radius}
+
+    total, results = geo.within(lat, lng, radius, limit=len(listings))
+
+    assert total == len(expected)
+    assert {result["property_id"] for result in results} == expected
+    assert [result["distance_m"] for result in results] == sorted(result["distance_m"] for result in results)
+    assert len(geo.within(lat, lng, radius, limit=3)[1]) == min(3, total)
+
+@pytest.mark.parametrize("lat, lng", POINTS)
+def test_nearest_matches_brute_force(listings, lat, lng):
+    geo = GeoIndex().with_records(listings)
+    expected = sorted(_distances(listings, lat, lng).values())[:10]
+
+    results = geo.nearest(lat, lng, k=10)
+
+    assert [result["distance_m"] for result in results] == pytest.approx(expected, abs=0.1)
+    assert len(GeoIndex().with_records(listings[:3]).nearest(lat, lng, k=10)) == sum(
+        record["latitude"] is not None for record in listings[:3])
+
+def test_newer_snapshots_supersede_older_rows(listings):
+    moved, unlocated = listings[0], next(record for record in listings[1:] if record["latitude"] is not None)
+    geo = GeoIndex().with_listings(ListingIndex(listings, "2024-11-19"))
+    newer = [
+        {**moved, "latitude": 22.5, "longitude": 114.5, "title": "moved"},
+        {**unlocated, "latitude": None, "longitude": None},
+    ]
+
+    geo = geo.with_listings(ListingIndex(newer, "2024-11-20"))
+
+    assert len(geo.segments) == 2
+    results = geo.nearest(22.5, 114.5, k=1)
+    assert results[0]["property_id"] == moved["property_id"] and results[0]["title"] == "moved"
+    ids = [result["property_id"] for result in geo.within(22.3, 114.2, 100000, limit=len(listings))[1]]
+    assert ids.count(moved["property_id"]) == 1
+    assert unlocated["property_id"] not in ids
+
+def test_since_expires_older_snapshots(listings):
+    geo = GeoIndex()
+    for day, part in enumerate((listings[:100], listings[100:200], listings[200:300])):
+        geo = geo.with_listings(ListingIndex(part, f"2024-11-{20 + day}"))
+    located = lambda part: sum(record["latitude"] is not None for record in part)
+    assert geo.size == located(listings[:300])
+
+    assert geo.since("2024-11-20") is geo
+    recent = geo.since("2024-11-21")
+
+    assert recent.size == located(listings[100:300])
+    assert len(recent.segments) == 2
+    assert geo.size == located(listings[:300])
+    ids = {result["property_id"] for result in recent.within(22.3, 114.2, 100000, limit=len(listings))[1]}
+    assert ids.isdisjoint(record["property_id"] for record in listings[:100])
+
+def test_compaction_keeps_the_current_rows(listings, monkeypatch):
+    monkeypatch.setattr(geo_index, "COMPACT_AFTER", 2)
+    geo = GeoIndex()
+    for day in range(4):
+        part = listings[day * 100:(day + 1) * 100]
+        geo = geo.with_listings(ListingIndex(part, f"2024-11-{20 + day}"))
+
+    assert len(geo.segments) <= 2
+    total, results = geo.within(22.3, 114.2, 100000, limit=len(listings))
+    assert total == sum(record["latitude"] is not None for record in listings)
+    # Dates survive compaction, so the oldest day can still expire
+    assert geo.since("2024-11-21").size == sum(record["latitude"] is not None for record in listings[100:])
+
+def test_listing_dates():
+    dates = listing_dates(ListingIndex([{}, {}], "2024-11-20"))
+    assert dates.tolist() == [np.datetime64("2024-11-20")] * 2
+    assert np.isnat(listing_dates(ListingIndex([{}])))[0]
@@ -0,0 +1,106 @@
+import numpy as np
+import pytest
+
+from app.listing_index import SORT_FIELDS, ListingIndex
+
+QUERIES = [
+    {},
+    {"districts": ["central"]},
+    {"districts": ["Mong Kok", "sha tin", "Nowhere"]},
+    {"min_rent": 10000, "max_rent": 20000},
+    {"max_rent": 8000, "sort": "-area"},
+    {"min_area": 300, "max_area": 600, "sort": "-rent"},
+    {"districts": ["quarry bay"], "min_rent": 15000, "min_area": 500, "sort": "area"},
+    {"min_rent": 30000, "max_rent": 20000},
+]
+
+def _brute(records, districts=None, min_rent=None, max_rent=None, min_area=None, max_area=None, sort="rent"):
+    # Every filter on every record, then a stable sort with missing values last
+    def within(value, low, high):
+        if low is None and high is None:
+            return True
+        return value is not None and (low is None or value >= low) and (high is None or value <= high)
+
+    wanted = {name.lower() for name in districts or ()}
+    matches = [
+        record for record in records
+        if (not districts or (record["district"] or "").lower() in wanted)
+        and within(record["rent_hkd"], min_rent, max_rent)
+        and within(record["saleable_area_sqft"], min_area, max_area)
+    ]
+    field = SORT_FIELDS[sort.lstrip("-")]
+    sign = -1 if sort.startswith("-") else 1
+    matches.sort(key=lambda record: (record[field] is None, sign * (record[field] or 0)))
+    return [record["property_id"] for record in matches]
+
+@pytest.mark.parametrize("query", QUERIES)
+def test_search_matches_brute_force(listings, query):
+    index = ListingIndex(listings)
+    expected = _brute(listings, **query)
+
+    total, results = index.search(**query, limit=len(listings))
+
+    assert total == len(expected)
+    assert [result["property_id"] for result in results] == expected
+
+@pytest.mark.parametrize("query", QUERIES[:4])
+def test_pages_add_up_to_every_match(listings, query):
+    index = ListingIndex(listings)
+    expected = _brute(listings, **query)
+
+    pages = []
+    for offset in range(0, len(expected) + 7, 7):
+        total, results = index.search(**query, offset=offset, limit=7)
+        assert total == len(expected)
+        pages.extend(result["property_id"] for result in results)
+    assert pages == expected
+
+def test_rows_are_returned_with_none_for_missing_values():
+    index = ListingIndex([{"property_id": "1", "title": "Flat", "rent_hkd": 9000}, {"property_id": "2"}])
+
+    total, results = index.search(sort="rent")
+    assert total == 2
+    assert results[0]["rent_hkd"] == 9000.0 and results[0]["title"] == "Flat"
+    assert results[1] == {**{field: None for field in results[1]}, "property_id": "2"}
+
+def test_relevance_keeps_the_order_of_matches(listings):
+    index = ListingIndex(listings)
+    matches = np.array([7, 3, 250, 0, 42])
+
+    total, results = index.search(sort="relevance", matches=matches)
+    assert [result["property_id"] for result in results] == [listings[i]["property_id"] for i in matches]
+    total, results = index.search(min_rent=15000, sort="relevance", matches=matches)
+    kept = [i for i in matches if (listings[i]["rent_hkd"] or 0) >= 15000]
+    assert total == len(kept)
+    assert [result["property_id"] for result in results] == [listings[i]["property_id"] for i in kept]
+
+def test_invalid_sort_keys_are_rejected(listings):
+    index = ListingIndex(listings)
+
+    with pytest.raises(ValueError):
+        index.search(sort="price")
+    with pytest.raises(ValueError):
+        index.search(sort="relevance")
+
+def test_take_and_concatenate(listings):
+    index = ListingIndex(listings[:10], "2024-11-20")
+
+    taken = index.take(np.array([4, 2]))
+    assert [taken.row(i)["property_id"] for i in range(taken.size)] == [listings[4]["property_id"], listings[2]["property_id"]]
+    joined = ListingIndex.concatenate([taken, ListingIndex(listings[10:12])], "2024-11-21")
+    assert joined.snapshot == "2024-11-21"
+    assert [joined.row(i)["title"] for i in range(joined.size)] == [listings[i]["title"] for i in (4, 2, 10, 11)]
+
+def test_latest_keeps_the_newest_version_of_every_listing(listings):
+    older = ListingIndex(listings[:5], "2024-11-19")
+    newer = ListingIndex([{**listings[3], "rent_hkd": 1.0}, listings[5]], "2024-11-20")
+
+    latest = ListingIndex.latest([older, newer], "2024-11-20")
+
+    assert latest.snapshot == "2024-11-20"
+    rows = {latest.row(i)["property_id"]: latest.row(i) for i in range(latest.size)}
+    assert sorted(rows) == sorted(record["property_id"] for record in listings[:6])
+    assert rows[listings[3]["property_id"]]["rent_hkd"] == 1.0
+    total, results = latest.search(max_rent=1.0)
+    assert total == 1 and results[0]["property_id"] == listings[3]["property_id"]
+    assert ListingIndex.latest([]).size == 0
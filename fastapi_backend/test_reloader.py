@@ -0,0 +1,97 @@
+import pytest
+
+from compiled_snapshot import store_compiled_snapshot
+from snapshot_sink import SnapshotSink
+from storage import LocalStorage
+from text_index import store_text_index
+from app import reloader as reloader_module
+from app.reloader import IndexReloader
+from app.snapshots import SnapshotSource
+
+@pytest.fixture
+def storage(tmp_path):
+    return LocalStorage(str(tmp_path))
+
+def _day(storage, date, listings, text_index=True, compiled=False, history_days=2):
+    # Writes a daily snapshot as the crawler does, with the files built at the end of a crawl
+    sink = SnapshotSink(storage, f"snapshots/{date}/", formats=["jsonl"])
+    for property_id, title, rent in listings:
+        sink.add(property_id, {"title": title, "rent": f"HK$ {rent:,}", "district": "Quarry Bay"})
+    sink.flush()
+    storage.flush()
+    if text_index:
+        sink.annotate("text_index", store_text_index(storage, date, history_days=history_days))
+    if compiled:
+        sink.annotate("compiled", store_compiled_snapshot(storage, date))
+
+def _ids(listings, rows=None):
+    ids = listings.columns["property_id"]
+    return sorted(ids[int(row)] for row in (range(listings.size) if rows is None else rows))
+
+def test_listings_cover_the_history_window(storage, tmp_path, monkeypatch):
+    monkeypatch.setattr(reloader_module, "GEO_HISTORY_DAYS", 2)
+    _day(storage, "2024-11-19", [("1", "harbour view", 10000), ("2", "garden", 12000)])
+    _day(storage, "2024-11-20", [("2", "garden harbour", 11000), ("3", "quiet", 9000)])
+    reloader = IndexReloader(SnapshotSource(str(tmp_path)))
+
+    assert reloader.reload()
+
+    # Every snapshot only holds that day's listings; the newest version of each wins
+    assert reloader.index.snapshot == "2024-11-20"
+    total, results = reloader.index.search(sort="rent")
+    assert [(result["property_id"], result["rent_hkd"]) for result in results] == [("3", 9000.0), ("1", 10000.0), ("2", 11000.0)]
+    assert reloader.geo.size == 0
+    assert not reloader.reload()
+
+    # A new day pushes the oldest one out of the window
+    _day(storage, "2024-11-21", [("3", "quiet", 8500)], text_index=False)
+    assert reloader.reload()
+    assert reloader.index.snapshot == "2024-11-21"
+    assert _ids(reloader.index) == ["2", "3"]
+
+def test_text_search_uses_the_listings_of_its_index(storage, tmp_path, monkeypatch):
+    monkeypatch.setattr(reloader_module, "GEO_HISTORY_DAYS", 2)
+    _day(storage, "2024-11-19", [("1", "harbour view", 10000), ("2", "garden", 12000)])
+    _day(storage, "2024-11-20", [("2", "garden harbour", 11000), ("3", "quiet", 9000)])
+    reloader = IndexReloader(SnapshotSource(str(tmp_path)))
+    reloader.reload()
+
+    text, listings = reloader.text
+    assert listings is reloader.index
+    assert _ids(listings, text.matching_rows("harbour", listings)) == ["1", "2"]
+
+    # Until the new day has a text index, searches answer from the previous one
+    _day(storage, "2024-11-21", [("1", "sold", 10000)], text_index=False)
+    reloader.reload()
+    text, listings = reloader.text
+    assert listings.snapshot == "2024-11-20" and reloader.index.snapshot == "2024-11-21"
+    assert _ids(listings, text.matching_rows("harbour", listings)) == ["1", "2"]
+
+    SnapshotSink(storage, "snapshots/2024-11-21/").annotate("text_index", store_text_index(storage, "2024-11-21", history_days=2))
+    assert reloader.reload()
+    text, listings = reloader.text
+    assert listings is reloader.index
+    assert _ids(listings, text.matching_rows("harbour", listings)) == ["2"]
+
+def test_text_index_over_other_snapshots_is_not_used(storage, tmp_path, monkeypatch):
+    # The crawler's window is wider than the backend's
+    monkeypatch.setattr(reloader_module, "GEO_HISTORY_DAYS", 1)
+    _day(storage, "2024-11-19", [("1", "harbour view", 10000)])
+    _day(storage, "2024-11-20", [("2", "harbour", 11000)], history_days=2)
+    reloader = IndexReloader(SnapshotSource(str(tmp_path)))
+
+    reloader.reload()
+
+    assert _ids(reloader.index) == ["2"]
+    assert reloader.text is None
+
+def test_compiled_snapshots_load_like_the_parts(storage, tmp_path):
+    _day(storage, "2024-11-20", [(str(4200000 + i), f"flat {i}", 8000 + 500 * (i % 7)) for i in range(30)], compiled=True)
+
+    compiled = IndexReloader(SnapshotSource(str(tmp_path)))
+    compiled.reload()
+    parts = IndexReloader(SnapshotSource(str(tmp_path)), use_compiled=False)
+    parts.reload()
+
+    for sort in ("rent", "-rent"):
+        assert compiled.index.search(sort=sort, limit=30) == parts.index.search(sort=sort, limit=30)
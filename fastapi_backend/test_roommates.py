@@ -0,0 +1,117 @@
+import random
+
+import numpy as np
+import pytest
+from pydantic import ValidationError
+
+from app import roommates
+from app.geo_index import haversine_m
+from app.roommates import GENDERS, RoommateIndex, RoommateProfile, profile_features
+
+def _profiles(count, seed=0):
+    rng = random.Random(seed)
+    profiles = {}
+    for i in range(count):
+        low = rng.uniform(3000, 15000)
+        profiles[f"u{i}"] = RoommateProfile(
+            budget_min=low, budget_max=low * rng.uniform(1.1, 1.8),
+            lat=22.28 + rng.uniform(0, 0.15), lng=114.13 + rng.uniform(0, 0.15),
+            max_distance_km=rng.uniform(2, 15), bedtime=rng.uniform(0, 23.9), wake_time=rng.uniform(5, 11),
+            cleanliness=rng.randint(1, 5), noise=rng.randint(1, 5), guests=rng.randint(1, 5),
+            gender=rng.choice(GENDERS), accepts_genders=rng.sample(GENDERS, rng.randint(1, 3)),
+            smokes=rng.random() < 0.15, accepts_smokers=rng.random() < 0.5,
+            has_pets=rng.random() < 0.2, accepts_pets=rng.random() < 0.7,
+        )
+    return profiles
+
+def _index(profiles):
+    index = RoommateIndex(capacity=16)
+    for user_id, profile in profiles.items():
+        index.upsert(user_id, profile)
+    return index
+
+def _brute(profiles, user_id, k):
+    # Scores of every compatible profile, checking the constraints one by one
+    me = profiles[user_id]
+    scored = []
+    for other_id, other in profiles.items():
+        if other_id == user_id:
+            continue
+        if other.budget_min > me.budget_max or other.budget_max < me.budget_min:
+            continue
+        if me.gender not in other.accepts_genders or other.gender not in me.accepts_genders:
+            continue
+        if (other.smokes and not me.accepts_smokers) or (me.smokes and not other.accepts_smokers):
+            continue
+        if (other.has_pets and not me.accepts_pets) or (me.has_pets and not other.accepts_pets):
+            continue
+        distance = haversine_m(me.lat, me.lng, np.array([other.lat]), np.array([other.lng]))[0]
+        if distance > min(me.max_distance_km, other.max_distance_km) * 1000:
+            continue
+        difference = profile_features(other) - profile_features(me)
+        scored.append((1 / (1 + float(difference @ difference)), other_id))
+    scored.sort(key=lambda s: -s[0])
+    return scored[:k]
+
+@pytest.mark.parametrize("user_id", ["u0", "u17", "u123", "u599"])
+def test_top_k_matches_brute_force(user_id):
+    profiles = _profiles(600)
+    index = _index(profiles)
+    expected = _brute(profiles, user_id, 10)
+
+    results = index.top_k(user_id, 10)
+
+    assert [result["score"] for result in results] == pytest.approx([round(s, 4) for s, _ in expected], abs=1e-4)
+    assert {result["user_id"] for result in results} == {other_id for _, other_id in expected}
+    assert all(result["profile"] == profiles[result["user_id"]] for result in results)
+
+def test_removed_and_replaced_profiles():
+    profiles = _profiles(200)
+    index = _index(profiles)
+    for user_id in ("u1", "u2", "u3"):
+        assert index.remove(user_id)
+        del profiles[user_id]
+    assert not index.remove("u1")
+    # New profiles reuse the freed rows
+    for user_id, profile in _profiles(5, seed=1).items():
+        profiles[f"new-{user_id}"] = profile
+        index.upsert(f"new-{user_id}", profile)
+    profiles["u4"] = profiles["u5"]
+    index.upsert("u4", profiles["u5"])
+
+    assert len(index) == len(profiles)
+    assert index.get("u1") is None and index.get("u4") == profiles["u5"]
+    for user_id in ("u0", "u4", "new-u2"):
+        expected = _brute(profiles, user_id, 10)
+        results = index.top_k(user_id, 10)
+        # u4 and u5 tie, so only the scores are in a set order
+        assert [result["score"] for result in results] == pytest.approx([round(s, 4) for s, _ in expected], abs=1e-4)
+        assert {result["user_id"] for result in results} == {other_id for _, other_id in expected}
+    with pytest.raises(KeyError):
+        index.top_k("u1")
+
+def test_approximate_top_k(monkeypatch):
+    monkeypatch.setattr(roommates, "APPROX_MIN_USERS", 100)
+    profiles = _profiles(1500)
+    index = _index(profiles)
+
+    recall = []
+    for user_id in [f"u{i}" for i in range(0, 1500, 75)]:
+        exact = index.top_k(user_id, 10)
+        approximate = index.top_k(user_id, 10, approximate=True)
+        # Searching every cluster is exact
+        everything = index.top_k(user_id, 10, approximate=True, probes=len(index._centroids))
+        assert [result["user_id"] for result in everything] == [result["user_id"] for result in exact]
+        # Approximate matches are real matches, best first
+        valid = {other_id for _, other_id in _brute(profiles, user_id, len(profiles))}
+        assert {result["user_id"] for result in approximate} <= valid
+        assert [result["score"] for result in approximate] == sorted((result["score"] for result in approximate), reverse=True)
+        if exact:
+            recall.append(len({r["user_id"] for r in approximate} & {r["user_id"] for r in exact}) / len(exact))
+    assert np.mean(recall) > 0.8
+
+def test_profiles_are_validated():
+    with pytest.raises(ValidationError):
+        RoommateProfile(budget_min=9000, budget_max=8000, lat=22.3, lng=114.2)
+    with pytest.raises(ValidationError):
+        RoommateProfile(budget_min=5000, budget_max=8000, lat=22.3, lng=114.2, cleanliness=6)
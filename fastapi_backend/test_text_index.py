@@ -0,0 +1,117 @@
+import math
+from collections import Counter
+
+import numpy as np
+import pytest
+
+import text_index as collector_text_index
+from app import text_index
+from app.listing_index import ListingIndex
+from app.text_index import BM25_B, BM25_K1, MAX_PREFIX_TERMS, TextIndex, parse_query, tokenize
+
+QUERIES = ["harbour", "harb*", "sea view", "太古城", "太", "mtr 近地鐵", "ＭＴＲ", "pool 會所 gym", "zzz", "", "s*", "泳池 quiet*"]
+
+@pytest.fixture
+def index_path(tmp_path, listings):
+    path = tmp_path / "text_index.bin"
+    path.write_bytes(collector_text_index.build_text_index(listings))
+    return str(path)
+
+def _brute(listings, query):
+    # BM25 of every listing containing every query term, by property_id
+    documents = []
+    for record in listings:
+        counts = Counter()
+        for term in tokenize(record["title"] or ""):
+            counts[term] += collector_text_index.TITLE_WEIGHT
+        counts.update(tokenize(record["description"] or ""))
+        documents.append(counts)
+    frequencies = Counter(term for counts in documents for term in counts)
+    average = np.mean([sum(counts.values()) for counts in documents])
+
+    groups = []
+    for term, prefix in parse_query(query):
+        terms = sorted(t for t in frequencies if t.startswith(term)) if prefix else [term]
+        groups.append(sorted(terms, key=lambda t: -frequencies[t])[:MAX_PREFIX_TERMS])
+    scores = {}
+    for record, counts in zip(listings, documents):
+        if not groups or not all(any(t in counts for t in group) for group in groups):
+            continue
+        length = sum(counts.values())
+        score = 0.0
+        for t in (t for group in groups for t in group if t in counts):
+            idf = math.log(1 + (len(listings) - frequencies[t] + 0.5) / (frequencies[t] + 0.5))
+            score += idf * counts[t] * (BM25_K1 + 1) / (counts[t] + BM25_K1 * (1 - BM25_B + BM25_B * length / average))
+        scores[record["property_id"]] = score
+    return scores
+
+@pytest.mark.parametrize("query", QUERIES)
+@pytest.mark.parametrize("dense_share", [0.0, 1.0])
+def test_search_matches_brute_force_bm25(listings, index_path, query, dense_share, monkeypatch):
+    # Both the sparse and the dense scoring paths
+    monkeypatch.setattr(text_index, "_DENSE_SHARE", dense_share)
+    index = TextIndex(index_path)
+    ids = index.property_ids()
+    expected = _brute(listings, query)
+
+    docs, scores = index.search(query)
+
+    assert sorted(ids[doc] for doc in docs.tolist()) == sorted(expected)
+    assert scores.tolist() == pytest.approx([expected[ids[doc]] for doc in docs.tolist()], rel=1e-4)
+    assert all(np.diff(scores) <= 1e-6)
+
+def test_prefix_and_chinese_queries():
+    assert parse_query("harb* 太 太古城") == [("harb", True), ("太", True), ("太古", False), ("古城", False)]
+    assert tokenize("Ｈarbour 3房 太古城") == ["harbour", "3", "房", "太古", "古城"]
+    # Both modules split text the same way
+    text = "Bright 3-room flat 近地鐵, 海景 ＭＴＲ"
+    assert tokenize(text) == collector_text_index.tokenize(text)
+
+def test_prefix_matches_every_word_starting_with_it(tmp_path):
+    path = tmp_path / "text_index.bin"
+    path.write_bytes(collector_text_index.build_text_index([
+        {"property_id": "1", "title": "harbour view"},
+        {"property_id": "2", "title": "Harbourfront"},
+        {"property_id": "3", "title": "harbin"},
+        {"property_id": "4", "title": "garden 太古城"},
+    ]))
+    index = TextIndex(str(path))
+    ids = index.property_ids()
+    matches = lambda query: sorted(ids[doc] for doc in index.search(query)[0].tolist())
+
+    assert matches("harbour") == ["1"]
+    assert matches("harbour*") == ["1", "2"]
+    assert matches("harb*") == ["1", "2", "3"]
+    assert matches("太") == ["4"]
+    assert matches("古城 garden") == ["4"]
+    assert matches("harbour*  view") == ["1"]
+
+def test_newest_record_of_a_listing_is_indexed(tmp_path):
+    path = tmp_path / "text_index.bin"
+    path.write_bytes(collector_text_index.build_text_index([
+        {"property_id": "1", "title": "harbour"},
+        {"property_id": "1", "title": "garden"},
+    ]))
+    index = TextIndex(str(path))
+
+    assert index.size == 1
+    assert len(index.search("harbour")[0]) == 0
+    assert len(index.search("garden")[0]) == 1
+
+def test_matching_rows_maps_documents_to_listings(listings, index_path):
+    index = TextIndex(index_path)
+    # Listings in another order, without some of those indexed
+    subset = listings[::-2]
+    rows = index.matching_rows("harbour", ListingIndex(subset))
+
+    expected = _brute(listings, "harbour")
+    found = [subset[row]["property_id"] for row in rows.tolist()]
+    assert sorted(found) == sorted(set(expected) & {record["property_id"] for record in subset})
+    assert [expected[property_id] for property_id in found] == sorted((expected[p] for p in found), reverse=True)
+
+def test_other_files_are_rejected(tmp_path):
+    path = tmp_path / "snapshot.bin"
+    path.write_bytes(b"HKCS" + bytes(200))
+
+    with pytest.raises(ValueError):
+        TextIndex(str(path))